@@ -0,0 +1,331 @@
+"""
+Versioned answer keys and ideal answers.
+
+The correct option of each multiple choice question and the ideal answer of
+each text question are stored in the ``answer_keys`` and ``ideal_answers``
+tables, one row per version.  A correction adds a new version instead of
+changing a row, so every answer can record which version it was scored
+against (``Answer.answer_key_version``).
+
+:func:`load` reads the latest version of every question at startup into
+an in-process registry, so scoring does not query these tables.  Empty
+tables are first seeded with version 1 from ``DEFAULT_MC_ANSWER_KEYS`` and
+the ``ideal_answers`` module.  Loading also rebuilds the ``prompts``
+registry and the pre-scoring IDF weights from the ideal answers.
+
+A version added by another process (``manage.py answer-key set``) is picked
+up within ANSWER_KEYS_REFRESH_SECONDS: at most that often, the registry
+compares the highest row ids of both tables with the ones it loaded, one
+cheap query, and reloads when they differ.
+
+When a key is corrected, :func:`rescore_mc` re-scores every stored multiple
+choice answer of the affected questions with one set-based UPDATE and then
+recomputes the completed candidates' aggregates with another; no model is
+involved.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import database, models, scores
+
+
+# Answer key for multiple choice questions, seeded as version 1.
+# Keys correspond to question IDs and values are the correct option letter.
+DEFAULT_MC_ANSWER_KEYS: Dict[int, str] = {
+    1: 'B',
+    2: 'B',
+    3: 'B',
+    4: 'B',
+    5: 'C',
+    6: 'B',
+    7: 'B',
+    8: 'B',
+    9: 'A',
+    10: 'A',
+}
+
+# Seconds between checks for versions added by other processes (0 = never).
+ANSWER_KEYS_REFRESH_SECONDS = float(os.getenv('ANSWER_KEYS_REFRESH_SECONDS', '30'))
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+FEEDBACK_CORRECT = "Câu trả lời chính xác"
+FEEDBACK_WRONG = "Đáp án đúng là {correct}"
+
+_lock = threading.Lock()
+# question_id -> (correct option, version)
+_mc_keys: Dict[int, tuple] = {}
+# question_id -> {'question', 'ideal_answer', 'version'}
+_ideal_answers: Dict[int, dict] = {}
+_loaded = False
+# Highest row ids of both tables when loaded (None for the built-in keys),
+# and when to next compare them with the database.
+_stamp: Optional[tuple] = None
+_next_check = 0.0
+
+
+class AnswerKeyError(ValueError):
+    """Raised for an invalid answer key or ideal answer."""
+
+
+def _latest(model):
+    """SELECT the rows of ``model`` with the highest version of each question."""
+    latest = (
+        select(model.question_id, func.max(model.version).label('version'))
+        .group_by(model.question_id)
+        .subquery()
+    )
+    return select(model).join(
+        latest, and_(model.question_id == latest.c.question_id, model.version == latest.c.version)
+    )
+
+
+def _current_stamp(db: Session) -> tuple:
+    return tuple(db.execute(select(
+        select(func.max(models.AnswerKey.id)).scalar_subquery(),
+        select(func.max(models.IdealAnswer.id)).scalar_subquery(),
+    )).one())
+
+
+def seed(db: Session) -> int:
+    """Store the built-in keys and ideal answers as version 1 in empty tables.  Returns rows added."""
+    from ideal_answers import ideal_answers
+
+    added = 0
+    if db.scalar(select(func.count()).select_from(models.AnswerKey)) == 0:
+        db.add_all(
+            models.AnswerKey(question_id=qid, version=1, correct_option=option)
+            for qid, option in DEFAULT_MC_ANSWER_KEYS.items()
+        )
+        added += len(DEFAULT_MC_ANSWER_KEYS)
+    if db.scalar(select(func.count()).select_from(models.IdealAnswer)) == 0:
+        db.add_all(
+            models.IdealAnswer(question_id=qid, version=1, question=entry['question'],
+                               ideal_answer=entry['ideal_answer'])
+            for qid, entry in ideal_answers.items()
+        )
+        added += len(ideal_answers)
+    if added:
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another process seeded the tables at the same time.
+            db.rollback()
+            added = 0
+    return added
+
+
+def load(db: Optional[Session] = None):
+    """(Re)load the latest keys and ideal answers from the database, seeding empty tables."""
+    global _mc_keys, _ideal_answers, _loaded, _stamp, _next_check
+    import prescoring, prompts
+
+    own_session = db is None
+    db = db or database.SessionLocal()
+    try:
+        seed(db)
+        stamp = _current_stamp(db)
+        mc_keys = {
+            row.question_id: (row.correct_option, row.version)
+            for row in db.scalars(_latest(models.AnswerKey))
+        }
+        ideal = {
+            row.question_id: {'question': row.question, 'ideal_answer': row.ideal_answer, 'version': row.version}
+            for row in db.scalars(_latest(models.IdealAnswer))
+        }
+    finally:
+        if own_session:
+            db.close()
+    with _lock:
+        _mc_keys, _ideal_answers, _loaded = mc_keys, ideal, True
+        _stamp, _next_check = stamp, time.monotonic() + ANSWER_KEYS_REFRESH_SECONDS
+    prompts.load(ideal)
+    prescoring.reset()
+
+
+def load_builtin():
+    """
+    Load the built-in keys and ideal answers as version 1, without the
+    database: for offline benchmarks, and when the database cannot be read.
+    """
+    global _mc_keys, _ideal_answers, _loaded, _stamp
+    import prescoring, prompts
+    from ideal_answers import ideal_answers
+
+    ideal = {qid: {**entry, 'version': 1} for qid, entry in ideal_answers.items()}
+    with _lock:
+        _mc_keys = {qid: (option, 1) for qid, option in DEFAULT_MC_ANSWER_KEYS.items()}
+        _ideal_answers, _loaded, _stamp = ideal, True, None
+    prompts.load(ideal)
+    prescoring.reset()
+
+
+def refresh() -> bool:
+    """Reload the registry if another process added a version since it was loaded.  Returns True if reloaded."""
+    db = database.SessionLocal()
+    try:
+        if _current_stamp(db) == _stamp:
+            return False
+        load(db)
+        return True
+    finally:
+        db.close()
+
+
+def _ensure_loaded():
+    global _next_check
+    if _loaded:
+        if _stamp is None or ANSWER_KEYS_REFRESH_SECONDS <= 0 or time.monotonic() < _next_check:
+            return
+        with _lock:
+            if time.monotonic() < _next_check:
+                return
+            _next_check = time.monotonic() + ANSWER_KEYS_REFRESH_SECONDS
+        try:
+            refresh()
+        except Exception as e:
+            print(f"Could not check the answer keys for new versions: {e}")
+        return
+    try:
+        load()
+    except Exception as e:
+        print(f"Could not load answer keys from the database, using the built-in ones: {e}")
+        load_builtin()
+
+
+def correct_option(question_id) -> Optional[str]:
+    """Return the correct option of a multiple choice question, or None if it has no key."""
+    _ensure_loaded()
+    key = _mc_keys.get(question_id)
+    return key[0] if key else None
+
+
+def key_version(question_id) -> Optional[int]:
+    """Return the version of a multiple choice question's current key, or None."""
+    return version_for('mc', question_id)
+
+
+def mc_answer_keys() -> Dict[int, dict]:
+    """All current multiple choice keys as {question_id: {'option', 'version'}}."""
+    _ensure_loaded()
+    return {qid: {'option': option, 'version': version} for qid, (option, version) in _mc_keys.items()}
+
+
+def ideal_answer(question_id) -> Optional[dict]:
+    """Return {'question', 'ideal_answer', 'version'} of a text question, or None."""
+    _ensure_loaded()
+    return _ideal_answers.get(question_id)
+
+
+def ideal_answers() -> Dict[int, dict]:
+    """All current ideal answers by question id."""
+    _ensure_loaded()
+    return dict(_ideal_answers)
+
+
+def version_for(qtype: str, question_id) -> Optional[int]:
+    """Version of the key (``mc``) or ideal answer (``text``) currently used for a question."""
+    _ensure_loaded()
+    if qtype == 'mc':
+        key = _mc_keys.get(question_id)
+        return key[1] if key else None
+    entry = _ideal_answers.get(question_id)
+    return entry['version'] if entry else None
+
+
+def _next_version(db: Session, model, question_id: int) -> int:
+    return (db.scalar(select(func.max(model.version)).where(model.question_id == question_id)) or 0) + 1
+
+
+def set_answer_key(db: Session, question_id: int, option: str) -> int:
+    """Store a new version of a question's answer key, reload the registry and return the version."""
+    option = (option or '').strip().upper()
+    if option not in OPTIONS:
+        raise AnswerKeyError(f"Option must be one of {', '.join(OPTIONS)}")
+    seed(db)
+    version = _next_version(db, models.AnswerKey, question_id)
+    db.add(models.AnswerKey(question_id=question_id, version=version, correct_option=option))
+    db.commit()
+    load(db)
+    return version
+
+
+def set_ideal_answer(db: Session, question_id: int, ideal: str, question: Optional[str] = None) -> int:
+    """
+    Store a new version of a question's ideal answer (and, optionally, its
+    text), reload the registry and return the version.
+    """
+    if not (ideal or '').strip():
+        raise AnswerKeyError("The ideal answer must not be empty")
+    seed(db)
+    if question is None:
+        current = db.scalars(
+            _latest(models.IdealAnswer).where(models.IdealAnswer.question_id == question_id)
+        ).first()
+        if current is None:
+            raise AnswerKeyError(f"Question {question_id} has no ideal answer yet; give its text")
+        question = current.question
+    version = _next_version(db, models.IdealAnswer, question_id)
+    db.add(models.IdealAnswer(question_id=question_id, version=version, question=question, ideal_answer=ideal))
+    db.commit()
+    load(db)
+    return version
+
+
+def rescore_mc(db: Session, question_ids: Optional[Iterable[int]] = None, only_stale: bool = True) -> dict:
+    """
+    Re-score stored multiple choice answers against the current keys.
+
+    Every answer to the selected questions (default: all with a key) is
+    updated by one UPDATE whose score, feedback and key version are CASE
+    expressions over the question id; with ``only_stale``, answers already
+    scored with the current version are left alone.  The aggregates of the
+    completed candidates who answered those questions are then recomputed in
+    one more UPDATE; candidates still being evaluated get theirs when they
+    finish.  Commits and returns the number of answers and candidates
+    updated.
+    """
+    _ensure_loaded()
+    keys = dict(_mc_keys)
+    if question_ids is not None:
+        wanted = set(question_ids)
+        missing = wanted - set(keys)
+        if missing:
+            raise AnswerKeyError(f"No answer key for question(s) {', '.join(map(str, sorted(missing)))}")
+        keys = {qid: key for qid, key in keys.items() if qid in wanted}
+    if not keys:
+        return {'answers': 0, 'candidates': 0}
+
+    answer = models.Answer
+    correct = case({qid: option for qid, (option, _) in keys.items()}, value=answer.question_id)
+    version = case({qid: v for qid, (_, v) in keys.items()}, value=answer.question_id)
+    wrong_feedback = case(
+        {qid: FEEDBACK_WRONG.format(correct=option) for qid, (option, _) in keys.items()}, value=answer.question_id
+    )
+    is_correct = func.coalesce(answer.selected, '') == correct
+    selection = and_(answer.type == 'mc', answer.question_id.in_(keys))
+    stmt = update(answer).where(selection)
+    if only_stale:
+        stmt = stmt.where(or_(answer.answer_key_version.is_(None), answer.answer_key_version != version))
+    answers = db.execute(
+        stmt.values(
+            evaluation_score=case((is_correct, 1.0), else_=0.0),
+            evaluation_feedback=case((is_correct, FEEDBACK_CORRECT), else_=wrong_feedback),
+            evaluation_status='completed',
+            evaluation_stage='answer_key',
+            evaluation_latency_ms=0.0,
+            evaluation_prompt_tokens=0,
+            evaluation_completion_tokens=0,
+            answer_key_version=version,
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    candidates = scores.update_scores_where(db, select(answer.candidate_id).where(selection)) if answers else 0
+    db.commit()
+    return {'answers': answers, 'candidates': candidates}
@@ -2,23 +2,155 @@
 Background task processing for candidate evaluation.
 
 This module handles the asynchronous evaluation of candidate answers
-to prevent blocking the main request thread.
+to prevent blocking the main request thread.  Evaluations run on a
+fixed-size worker pool with a bounded backlog so that a burst of
+submissions cannot spawn an unbounded number of threads.
+
+Results are written answer by answer as they come in, so an evaluation
+that fails late keeps what was already scored, and a retried job only
+evaluates the answers that are not scored yet.
+
+Each submission is also recorded as a durable job (see ``job_queue``).  In
+the default ``inline`` mode the API process evaluates its own submissions
+and a dispatcher thread picks up any other queued jobs; in ``worker`` mode
+the API only enqueues and standalone ``python -m worker`` processes do the
+evaluation.
 """
 
 import asyncio
+import os
 import threading
-from typing import List, Dict
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import bindparam, case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import models, database, evaluation
-from ideal_answers import ideal_answers
+import models, database, evaluation, job_queue, metrics, scores, status_cache, status_events
+
+
+# Number of evaluations that may run concurrently, and how many more may
+# wait in the queue before new submissions are rejected.
+EVALUATION_MAX_WORKERS = int(os.getenv('EVALUATION_MAX_WORKERS', '4'))
+EVALUATION_QUEUE_SIZE = int(os.getenv('EVALUATION_QUEUE_SIZE', '100'))
+
+# Maximum number of seconds to wait for queued evaluations on shutdown.
+EVALUATION_DRAIN_TIMEOUT = float(os.getenv('EVALUATION_DRAIN_TIMEOUT', '120'))
+
+# 'inline' evaluates in the API process; 'worker' leaves queued jobs to
+# standalone ``python -m worker`` processes.
+EVALUATION_MODE = os.getenv('EVALUATION_MODE', 'inline')
+
+# Dispatcher settings: seconds between polls of an empty queue and the
+# largest number of jobs claimed in one round trip.
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', '10'))
+
+# Seconds between sweeps for jobs whose lease expired on their last attempt.
+JOB_SWEEP_INTERVAL = float(os.getenv('JOB_SWEEP_INTERVAL', '30'))
+
+
+class EvaluationQueueFull(Exception):
+    """Raised when the evaluation executor cannot accept more work."""
+
+
+class EvaluationExecutor:
+    """
+    Fixed-size thread pool with a bounded backlog for candidate evaluations.
+
+    At most ``max_workers`` evaluations run at once and at most
+    ``max_queue_size`` more wait for a free worker.  Submitting beyond that
+    raises :class:`EvaluationQueueFull` instead of spawning more threads.
+    """
+
+    def __init__(self, max_workers: int, max_queue_size: int):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._closed = False
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="evaluation"
+        )
+
+    @property
+    def pending(self) -> int:
+        """Number of evaluations currently running or waiting to run."""
+        return self._pending
+
+    def is_full(self) -> bool:
+        return self._closed or self._pending >= self.capacity
+
+    def submit(self, fn, *args) -> Future:
+        """Queue ``fn(*args)`` or raise :class:`EvaluationQueueFull`."""
+        if self._closed or not self._slots.acquire(blocking=False):
+            raise EvaluationQueueFull("Evaluation queue is full")
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._pool.submit(fn, *args)
+        except RuntimeError:
+            # The pool was shut down between the check above and now.
+            self._release()
+            raise EvaluationQueueFull("Evaluation executor is shutting down")
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def shutdown(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stop accepting work and wait for queued evaluations to finish.
+
+        Returns True if the backlog drained within ``timeout`` seconds.
+        """
+        self._closed = True
+        drainer = threading.Thread(target=self._pool.shutdown, kwargs={"wait": True})
+        drainer.start()
+        drainer.join(timeout)
+        return not drainer.is_alive()
+
+
+executor = EvaluationExecutor(EVALUATION_MAX_WORKERS, EVALUATION_QUEUE_SIZE)
+metrics.EVALUATIONS_PENDING.set_function(lambda: executor.pending)
+
+# Lease owner identity of this API process.
+WORKER_ID = job_queue.make_worker_id("api")
+
+
+def announce_status(candidate_id: int, status: str, completed: Optional[int] = None, total: Optional[int] = None):
+    """
+    Record a committed status transition or progress step: write it through
+    to the status cache and publish it to status stream subscribers.
+    """
+    status_cache.put(candidate_id, status, completed, total)
+    progress = {'completed': completed or 0, 'total': total} if total is not None else {}
+    status_events.publish(candidate_id, status, **progress)
 
 
-def evaluate_candidate_background(candidate_id: int, answers_data: List[Dict]):
+def evaluate_candidate_background(candidate_id: int, answers_data: List[Dict]) -> bool:
     """
     Background task to evaluate candidate answers.
     
     This function runs in a separate thread to avoid blocking the main request.
+    ``answers_data`` are the answers still to be evaluated: multiple choice
+    answers are scored at submission, and a retry only gets the answers a
+    previous attempt did not score.  Each result is committed as soon as it
+    is known, together with the candidate's progress, so a slow or failing
+    answer late in the evaluation does not lose the others.
+
+    Returns True if every answer of the candidate is now evaluated.
+    'processing' and each progress step are announced to the status cache
+    and stream subscribers; the final status is announced by
+    :func:`run_evaluation_job` once the job outcome (including a retry) is
+    known.  Stage timings and the outcome are recorded in ``metrics``.
     """
+    started = time.perf_counter()
     try:
         # Get database session
         db = database.SessionLocal()
@@ -26,29 +158,60 @@ def evaluate_candidate_background(candidate_id: int, answers_data: List[Dict]):
         try:
             # Update candidate status to processing
             candidate = db.query(models.Candidate).filter(models.Candidate.id == candidate_id).first()
+            evaluated, total = answer_progress(db, candidate_id)
             if candidate:
+                # From submission to now, including any earlier failed attempts
+                metrics.observe_stage(
+                    metrics.STAGE_QUEUE_WAIT, (datetime.utcnow() - candidate.created_at).total_seconds()
+                )
                 candidate.evaluation_status = 'processing'
+                candidate.answers_evaluated = evaluated
+                candidate.answers_total = total
                 db.commit()
-            
+            announce_status(candidate_id, 'processing', evaluated, total)
+
+            written = set()
+            write_seconds = 0.0
+
+            def on_results(items: List[Tuple[int, Dict]]):
+                # Called on the evaluation's event loop as answers are scored.
+                # A failed write is not raised into the loop, where it would
+                # abandon the answers still being graded; those results are
+                # written again with the final status below.
+                nonlocal evaluated, write_seconds
+                write_started = time.perf_counter()
+                progress = evaluated + sum(1 for _, r in items if r.get('status', 'completed') == 'completed')
+                try:
+                    write_answer_results(db, candidate_id, [(answers_data[i], r) for i, r in items], progress)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    print(f"Could not store results of candidate {candidate_id} yet: {e}")
+                    return
+                finally:
+                    write_seconds += time.perf_counter() - write_started
+                written.update(i for i, _ in items)
+                evaluated = progress
+                announce_status(candidate_id, 'processing', evaluated, total)
+
             # Evaluate answers
-            evaluation_results = evaluation.evaluate_candidate_answers(answers_data)
+            evaluation_results = evaluation.evaluate_candidate_answers(answers_data, on_results=on_results)
             
-            # Update answers with evaluation results
-            for i, (ans_data, eval_data) in enumerate(zip(answers_data, evaluation_results)):
-                answer = db.query(models.Answer).filter(
-                    models.Answer.candidate_id == candidate_id,
-                    models.Answer.question_id == ans_data['id']
-                ).first()
-                
-                if answer:
-                    answer.evaluation_score = eval_data['score']
-                    answer.evaluation_feedback = eval_data['feedback']
-                    answer.evaluation_status = 'completed'
-            
-            # Update candidate status to completed
-            if candidate:
-                candidate.evaluation_status = 'completed'
-                db.commit()
+            # Keep the answers that did get scored even if some failed
+            succeeded = all(r.get('status', 'completed') == 'completed' for r in evaluation_results)
+            unwritten = [
+                (answers_data[i], r) for i, r in enumerate(evaluation_results) if i not in written
+            ]
+            started_write = time.perf_counter()
+            if unwritten:
+                evaluated += sum(1 for _, r in unwritten if r.get('status', 'completed') == 'completed')
+                write_answer_results(db, candidate_id, unwritten, evaluated)
+            finish_candidate(db, candidate_id, 'completed' if succeeded else 'failed')
+            db.commit()
+            metrics.observe_stage(metrics.STAGE_DB_WRITE, write_seconds + time.perf_counter() - started_write)
+            metrics.observe_stage(metrics.STAGE_TOTAL, time.perf_counter() - started)
+            metrics.observe_candidate('completed' if succeeded else 'failed')
+            return succeeded
                 
         finally:
             db.close()
@@ -64,16 +227,345 @@ def evaluate_candidate_background(candidate_id: int, answers_data: List[Dict]):
         finally:
             db.close()
         print(f"Error in background evaluation for candidate {candidate_id}: {e}")
+        metrics.observe_candidate('error')
+        return False
+
+
+def answer_progress(db: Session, candidate_id: int) -> Tuple[int, int]:
+    """Return (answers evaluated, all answers) of a candidate."""
+    answer = models.Answer
+    evaluated, total = db.execute(
+        select(
+            func.coalesce(func.sum(case((answer.evaluation_status == 'completed', 1), else_=0)), 0),
+            func.count(),
+        ).where(answer.candidate_id == candidate_id)
+    ).one()
+    return int(evaluated), int(total)
+
 
+def stored_progress(db: Session, candidate_id: int) -> Tuple[Optional[int], Optional[int]]:
+    """Return the (answers_evaluated, answers_total) stored on the candidate row."""
+    row = db.execute(
+        select(models.Candidate.answers_evaluated, models.Candidate.answers_total)
+        .where(models.Candidate.id == candidate_id)
+    ).first()
+    return tuple(row) if row is not None else (None, None)
 
-def start_background_evaluation(candidate_id: int, answers_data: List[Dict]):
+
+# One UPDATE statement executed with a parameter list (executemany).  The
+# (candidate_id, question_id) index makes each row lookup an index seek.
+_ANSWER_WRITE_BACK = (
+    update(models.Answer.__table__)
+    .where(
+        models.Answer.__table__.c.candidate_id == bindparam('b_candidate_id'),
+        models.Answer.__table__.c.question_id == bindparam('b_question_id'),
+    )
+    .values(
+        evaluation_score=bindparam('b_score'),
+        evaluation_feedback=bindparam('b_feedback'),
+        evaluation_status=bindparam('b_status'),
+        evaluation_stage=bindparam('b_stage'),
+        evaluation_latency_ms=bindparam('b_latency_ms'),
+        evaluation_prompt_tokens=bindparam('b_prompt_tokens'),
+        evaluation_completion_tokens=bindparam('b_completion_tokens'),
+        answer_key_version=bindparam('b_key_version'),
+    )
+)
+
+
+def _write_back_params(candidate_id: int, pairs) -> List[Dict]:
+    return [
+        {
+            'b_candidate_id': candidate_id,
+            'b_question_id': ans_data['id'],
+            'b_score': eval_data['score'],
+            'b_feedback': eval_data['feedback'],
+            'b_status': eval_data.get('status', 'completed'),
+            'b_stage': eval_data.get('stage'),
+            'b_latency_ms': eval_data.get('latency_ms'),
+            'b_prompt_tokens': eval_data.get('prompt_tokens'),
+            'b_completion_tokens': eval_data.get('completion_tokens'),
+            'b_key_version': eval_data.get('key_version'),
+        }
+        for ans_data, eval_data in pairs
+    ]
+
+
+def write_answer_results(db: Session, candidate_id: int, pairs: List[Tuple[Dict, Dict]],
+                         answers_evaluated: int):
+    """
+    Write the results of some of a candidate's answers, given as
+    (answer, result) pairs, and the candidate's ``answers_evaluated`` count.
+    One executemany UPDATE for the answers; nothing is committed.
+    """
+    params = _write_back_params(candidate_id, pairs)
+    if params:
+        db.execute(_ANSWER_WRITE_BACK, params)
+    db.execute(
+        update(models.Candidate)
+        .where(models.Candidate.id == candidate_id)
+        .values(answers_evaluated=answers_evaluated)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def finish_candidate(db: Session, candidate_id: int, candidate_status: str):
     """
-    Start background evaluation in a separate thread.
+    Store a candidate's final status, and its aggregate scores if every
+    answer was evaluated.  A candidate that is not completed gets none, so
+    it is not ranked on a partial score.  Nothing is committed.
     """
-    thread = threading.Thread(
-        target=evaluate_candidate_background,
-        args=(candidate_id, answers_data),
-        daemon=True
+    db.execute(
+        update(models.Candidate)
+        .where(models.Candidate.id == candidate_id)
+        .values(evaluation_status=candidate_status)
+        .execution_options(synchronize_session=False)
     )
-    thread.start()
-    return thread 
\ No newline at end of file
+    if candidate_status == 'completed':
+        scores.update_candidate_scores(db, candidate_id, completed_at=datetime.utcnow())
+    else:
+        scores.clear_candidate_scores(db, candidate_id)
+
+
+def load_answers_data(db: Session, candidate_id: int, unevaluated_only: bool = True) -> List[Dict]:
+    """
+    Rebuild the submitted answer payload of a candidate from the database:
+    by default only the answers that are not evaluated yet (pending, or
+    failed in an earlier attempt).
+    """
+    query = db.query(models.Answer).filter(models.Answer.candidate_id == candidate_id)
+    if unevaluated_only:
+        query = query.filter(models.Answer.evaluation_status.is_distinct_from('completed'))
+    answers = query.order_by(models.Answer.id).all()
+    return [
+        {
+            'type': answer.type,
+            'id': answer.question_id,
+            'question': answer.question,
+            'selected': answer.selected,
+            'answer': answer.answer_text,
+        }
+        for answer in answers
+    ]
+
+
+class LeaseRenewer:
+    """
+    Renews a job's lease every ``interval`` seconds (default: a third of
+    ``job_queue.JOB_LEASE_SECONDS``) on a background thread, so that a long
+    evaluation, e.g. one waiting out rate-limit backoff, keeps its job.
+    Use as a context manager around the evaluation.
+    """
+
+    def __init__(self, lease: job_queue.Lease, interval: Optional[float] = None):
+        self.lease = lease
+        self.interval = interval if interval is not None else job_queue.JOB_LEASE_SECONDS / 3
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{lease.job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = database.SessionLocal()
+            try:
+                if not job_queue.renew(db, self.lease):
+                    self.lost = True
+                    print(f"Lease on evaluation job {self.lease.job_id} was lost")
+                    return
+            except Exception as e:
+                # Try again at the next interval; the lease is still valid
+                # until it expires.
+                print(f"Could not renew the lease on evaluation job {self.lease.job_id}: {e}")
+            finally:
+                db.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_evaluation_job(lease: job_queue.Lease, answers_data: Optional[List[Dict]] = None) -> bool:
+    """
+    Evaluate a leased job and record its outcome in the job table.
+
+    The lease is renewed while the evaluation runs.  If it was lost anyway
+    (the job was taken over by another worker), the outcome is left to the
+    new lease holder.
+    """
+    candidate_id = lease.candidate_id
+    if answers_data is None:
+        db = database.SessionLocal()
+        try:
+            answers_data = load_answers_data(db, candidate_id)
+        finally:
+            db.close()
+
+    with LeaseRenewer(lease):
+        succeeded = evaluate_candidate_background(candidate_id, answers_data)
+
+    db = database.SessionLocal()
+    try:
+        if succeeded:
+            job_queue.complete(db, lease)
+            announce_status(candidate_id, 'completed', *stored_progress(db, candidate_id))
+        else:
+            # A retry evaluates only the answers still unscored.
+            retry = job_queue.fail(db, lease, "evaluation failed")
+            announce_status(candidate_id, 'pending' if retry else 'failed', *stored_progress(db, candidate_id))
+    except job_queue.LeaseLost as e:
+        print(f"Not recording the outcome of candidate {candidate_id}: {e}")
+    finally:
+        db.close()
+    return succeeded
+
+
+class JobDispatcher:
+    """
+    Polls the job table and feeds claimed jobs to an :class:`EvaluationExecutor`.
+
+    Only as many jobs as there are idle workers are claimed, so a claimed
+    job never sits in a local queue while its lease runs out.  Every
+    ``sweep_interval`` seconds it also fails the jobs whose worker died on
+    their last attempt (see :func:`fail_expired_jobs`).
+    """
+
+    def __init__(self, executor: EvaluationExecutor, worker_id: str,
+                 batch_size: int = JOB_BATCH_SIZE, poll_interval: float = JOB_POLL_INTERVAL,
+                 sweep_interval: float = JOB_SWEEP_INTERVAL):
+        self.executor = executor
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        """Claim and submit one batch of jobs.  Returns the number submitted."""
+        idle = self.executor.max_workers - self.executor.pending
+        if idle <= 0:
+            return 0
+        db = database.SessionLocal()
+        try:
+            claimed = job_queue.claim_batch(db, self.worker_id, min(self.batch_size, idle))
+            submitted = 0
+            for lease in claimed:
+                try:
+                    self.executor.submit(run_evaluation_job, lease)
+                    submitted += 1
+                except EvaluationQueueFull:
+                    job_queue.release(db, lease)
+            return submitted
+        finally:
+            db.close()
+
+    def run(self):
+        """Poll until :meth:`stop` is called."""
+        next_sweep = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                try:
+                    fail_expired_jobs()
+                except Exception as e:
+                    print(f"Error while failing expired evaluation jobs: {e}")
+            try:
+                submitted = self.run_once()
+            except Exception as e:
+                print(f"Error while dispatching evaluation jobs: {e}")
+                submitted = 0
+            self._stop.wait(0.1 if submitted else self.poll_interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+dispatcher = JobDispatcher(executor, WORKER_ID)
+
+
+def fail_expired_jobs() -> List[int]:
+    """
+    Fail the jobs whose lease expired on their last attempt, together with
+    their candidates, and announce the end state.  Returns the candidate ids.
+    """
+    db = database.SessionLocal()
+    try:
+        candidate_ids = job_queue.fail_expired(db)
+        for candidate_id in candidate_ids:
+            finish_candidate(db, candidate_id, 'failed')
+        db.commit()
+        for candidate_id in candidate_ids:
+            print(f"Evaluation of candidate {candidate_id} failed: its lease expired on the last attempt")
+            announce_status(candidate_id, 'failed', *stored_progress(db, candidate_id))
+        return candidate_ids
+    finally:
+        db.close()
+
+
+def recover_jobs() -> int:
+    """Requeue evaluations orphaned by a previous process.  See ``job_queue.recover_orphans``."""
+    db = database.SessionLocal()
+    try:
+        return job_queue.recover_orphans(db)
+    finally:
+        db.close()
+
+
+async def abacklog_full(db: AsyncSession) -> bool:
+    """Return True when new submissions should be rejected for backpressure."""
+    if EVALUATION_MODE == 'inline':
+        return executor.is_full()
+    return await db.scalar(job_queue.queued_count_query()) >= EVALUATION_QUEUE_SIZE
+
+
+def start_background_evaluation(candidate_id: int, answers_data: List[Dict]) -> Optional[Future]:
+    """
+    Start evaluating a freshly enqueued candidate on the local executor.
+
+    The candidate's job must already be committed.  In ``worker`` mode, or
+    when the local executor is busy, the job is left queued for a dispatcher
+    or worker process to pick up and None is returned.  This never touches
+    the database itself, so it is safe to call from async request handlers;
+    the job is claimed on the worker thread.
+    """
+    if EVALUATION_MODE != 'inline':
+        return None
+    try:
+        return executor.submit(_claim_and_run, candidate_id, answers_data)
+    except EvaluationQueueFull:
+        return None
+
+
+def _claim_and_run(candidate_id: int, answers_data: List[Dict]) -> bool:
+    db = database.SessionLocal()
+    try:
+        lease = job_queue.claim_candidate(db, candidate_id, WORKER_ID)
+    finally:
+        db.close()
+    if lease is None:
+        # Already taken by a dispatcher or worker.
+        return False
+    return run_evaluation_job(lease, answers_data)
+
+
+def startup_background_evaluation():
+    """Recover orphaned jobs and, in inline mode, start the job dispatcher."""
+    recover_jobs()
+    if EVALUATION_MODE == 'inline':
+        dispatcher.start()
+
+
+def shutdown_background_evaluation(timeout: Optional[float] = EVALUATION_DRAIN_TIMEOUT) -> bool:
+    """Stop claiming jobs and drain the evaluation executor, waiting up to ``timeout`` seconds."""
+    dispatcher.stop()
+    return executor.shutdown(timeout) 
\ No newline at end of file
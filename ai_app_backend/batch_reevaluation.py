@@ -0,0 +1,456 @@
+"""
+Offline re-evaluation of stored text answers through the OpenAI Batch API.
+
+When the rubric (the ideal answers in ``answer_keys``, the grading prompt) or the model
+changes, historical answers are re-scored here instead of through the
+per-submission background path.  Batch requests cost half as much as
+synchronous ones, and trivial answers are settled locally without any
+request (see ``prescoring``).  The work happens in a directory, in three
+steps that can each be re-run after an interruption:
+
+  1. prepare: stream the text answers from the database in chunks
+     (``yield_per``, never the whole table in memory) and write them as
+     Batch API request files: JSONL, one chat completion per line, one file
+     per model and at most ``BATCH_MAX_REQUESTS`` lines per file.  Answers
+     settled locally go to ``local-results.jsonl``;
+  2. submit: upload each request file and create a batch.  The ``local``
+     runner instead executes the requests with the regular chat client and
+     writes output files in the Batch API format; pointed at
+     ``benchmarks.fake_openai_server`` it stands in for the Batch API in
+     tests;
+  3. ingest: download the outputs of finished batches and apply results in
+     chunks: one executemany UPDATE of the answers and one UPDATE of the
+     affected candidates' aggregates per chunk, followed by a checkpoint
+     (``checkpoint.json``) so that an interrupted ingest resumes where it
+     stopped.  Applying a chunk twice is harmless.  Each answer records the
+     ideal answer version it was prepared with (kept in the manifest).
+     Failed requests and replies that cannot be parsed into a grade are
+     counted (``failed``, of which ``unparsed``) and not applied.
+
+Environment variables:
+  - BATCH_MAX_REQUESTS: request lines per batch file (default 50000, the
+    Batch API limit).
+  - BATCH_CHUNK_SIZE: answers read or results applied per chunk (default 1000).
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from sqlalchemy import bindparam, case, select, update
+from sqlalchemy.orm import Session
+
+import models, answer_keys, evaluation, llm_clients, prescoring, prompts, rate_limiter, scores
+
+
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '50000'))
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '1000'))
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_COMPLETION_WINDOW = '24h'
+# Batch API price relative to synchronous requests.
+BATCH_PRICE_FACTOR = 0.5
+
+MANIFEST = 'manifest.json'
+CHECKPOINT = 'checkpoint.json'
+LOCAL_RESULTS = 'local-results.jsonl'
+
+KIND_STRUCTURED = 'structured'
+KIND_SHORT = 'short'
+
+_ROLES = {'system': 'system', 'human': 'user', 'ai': 'assistant'}
+_MESSAGE_CLASSES = {'system': SystemMessage, 'user': HumanMessage, 'assistant': AIMessage}
+
+
+def _answer_rescore(ideal_versions: Dict[int, int]):
+    """
+    Executemany UPDATE applying results by answer id; the ideal answer
+    version comes from ``ideal_versions`` by question id.
+    """
+    answers = models.Answer.__table__
+    return (
+        update(answers)
+        .where(answers.c.id == bindparam('b_id'))
+        .values(
+            evaluation_score=bindparam('b_score'),
+            evaluation_feedback=bindparam('b_feedback'),
+            evaluation_status='completed',
+            evaluation_stage=bindparam('b_stage'),
+            # Batch results have no per-answer latency
+            evaluation_latency_ms=None,
+            evaluation_prompt_tokens=bindparam('b_prompt_tokens'),
+            evaluation_completion_tokens=bindparam('b_completion_tokens'),
+            answer_key_version=case(ideal_versions, value=answers.c.question_id) if ideal_versions else None,
+        )
+    )
+
+
+class BatchError(RuntimeError):
+    """Raised when a work directory is missing or in the wrong state for a step."""
+
+
+def _read_json(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: dict):
+    # Write then rename, so an interruption never leaves a truncated file.
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def load_manifest(workdir: str) -> dict:
+    path = os.path.join(workdir, MANIFEST)
+    if not os.path.exists(path):
+        raise BatchError(f"{workdir} has no {MANIFEST}; run 'prepare' first")
+    return _read_json(path)
+
+
+def _custom_id(candidate_id: int, answer_id: int, kind: str) -> str:
+    return f"{candidate_id}-{answer_id}-{kind}"
+
+
+def _parse_custom_id(custom_id: str):
+    candidate_id, answer_id, kind = custom_id.split('-', 2)
+    return int(candidate_id), int(answer_id), kind
+
+
+def _openai_messages(messages: list) -> List[dict]:
+    return [{'role': _ROLES[m.type], 'content': m.content} for m in messages]
+
+
+def _request_line(custom_id: str, model: str, messages: list) -> dict:
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': {'model': model, 'temperature': 0, 'messages': _openai_messages(messages)},
+    }
+
+
+class _RequestFiles:
+    """Request file writers, one file per model, rotated every ``max_requests`` lines."""
+
+    def __init__(self, workdir: str, max_requests: int):
+        self.workdir = workdir
+        self.max_requests = max_requests
+        self.files: List[dict] = []
+        self._open: Dict[str, tuple] = {}
+
+    def write(self, model: str, line: dict):
+        entry, handle = self._open.get(model, (None, None))
+        if entry is None or entry['requests'] >= self.max_requests:
+            if handle:
+                handle.close()
+            name = f"requests-{model}-{sum(1 for f in self.files if f['model'] == model) + 1}.jsonl"
+            entry = {'file': name, 'model': model, 'requests': 0}
+            handle = open(os.path.join(self.workdir, name), 'w', encoding='utf-8')
+            self.files.append(entry)
+            self._open[model] = (entry, handle)
+        handle.write(json.dumps(line, ensure_ascii=False) + '\n')
+        entry['requests'] += 1
+
+    def close(self):
+        for _, handle in self._open.values():
+            handle.close()
+        self._open.clear()
+
+
+def _answers_query(question_ids: Optional[Iterable[int]], candidate_status: Optional[str]):
+    ans, cand = models.Answer, models.Candidate
+    stmt = (
+        select(ans.id, ans.candidate_id, ans.question_id, ans.question, ans.answer_text)
+        .join(cand, cand.id == ans.candidate_id)
+        .where(ans.type == 'text')
+        .order_by(ans.id)
+    )
+    if candidate_status:
+        stmt = stmt.where(cand.evaluation_status == candidate_status)
+    if question_ids:
+        stmt = stmt.where(ans.question_id.in_(list(question_ids)))
+    return stmt
+
+
+def prepare(db: Session, workdir: str, question_ids: Optional[Iterable[int]] = None,
+            candidate_status: Optional[str] = 'completed', chunk_size: int = BATCH_CHUNK_SIZE,
+            max_requests: int = BATCH_MAX_REQUESTS) -> dict:
+    """
+    Write the batch request files for the selected text answers into ``workdir``.
+
+    Answers with an ideal answer are graded with the structured prompt of
+    the ``prompts`` registry, the others with the fallback grader.  Returns
+    a summary including the estimated cost relative to grading every
+    answer with synchronous requests.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    if os.path.exists(os.path.join(workdir, MANIFEST)):
+        raise BatchError(f"{workdir} is already prepared; use a new directory")
+    # The latest ideal answers, and with them the prompt registry.
+    answer_keys.load(db)
+
+    files = _RequestFiles(workdir, max_requests)
+    answers = settled = estimated_tokens = 0
+    stmt = _answers_query(question_ids, candidate_status).execution_options(yield_per=chunk_size)
+    try:
+        with open(os.path.join(workdir, LOCAL_RESULTS), 'w', encoding='utf-8') as local:
+            for row in db.execute(stmt):
+                answers += 1
+                entry = prompts.get(row.question_id)
+                question = entry.question if entry else row.question
+                answer_text = row.answer_text or ''
+                result = prescoring.prescore(question, answer_text, entry.ideal_answer if entry else '')
+                if result is not None:
+                    settled += 1
+                    local.write(json.dumps({
+                        'custom_id': _custom_id(row.candidate_id, row.id, KIND_SHORT),
+                        'score': result[0], 'feedback': result[1], 'stage': evaluation.STAGE_PRESCORE,
+                    }, ensure_ascii=False) + '\n')
+                    continue
+                if entry is not None:
+                    model, kind, messages = evaluation.STRUCTURED_MODEL_NAME, KIND_STRUCTURED, entry.messages(answer_text)
+                else:
+                    model, kind = evaluation.FALLBACK_MODEL_NAME, KIND_SHORT
+                    messages = prompts.short_answer_messages(question, answer_text)
+                estimated_tokens += rate_limiter.estimate_tokens(messages)
+                files.write(model, _request_line(_custom_id(row.candidate_id, row.id, kind), model, messages))
+    finally:
+        files.close()
+
+    requests = answers - settled
+    manifest = {
+        'created_at': datetime.utcnow().isoformat(),
+        'prompt_version': evaluation.PROMPT_VERSION,
+        'ideal_answer_versions': {
+            str(question_id): entry['version'] for question_id, entry in answer_keys.ideal_answers().items()
+        },
+        'question_ids': sorted(question_ids) if question_ids else None,
+        'candidate_status': candidate_status,
+        'answers': answers,
+        'settled_locally': settled,
+        'requests': requests,
+        'estimated_tokens': estimated_tokens,
+        'request_files': files.files,
+    }
+    _write_json(os.path.join(workdir, MANIFEST), manifest)
+    return {
+        'answers': answers,
+        'settled_locally': settled,
+        'requests': requests,
+        'request_files': len(files.files),
+        'estimated_tokens': estimated_tokens,
+        'relative_cost': round(BATCH_PRICE_FACTOR * requests / answers, 3) if answers else 0.0,
+    }
+
+
+def _read_lines(path: str, chunk: int) -> Iterator[List[str]]:
+    with open(path, encoding='utf-8') as f:
+        lines = []
+        for line in f:
+            if line.strip():
+                lines.append(line)
+            if len(lines) >= chunk:
+                yield lines
+                lines = []
+        if lines:
+            yield lines
+
+
+async def _run_local_request(line: dict, semaphore: asyncio.Semaphore) -> dict:
+    body = line['body']
+    messages = [_MESSAGE_CLASSES[m['role']](content=m['content']) for m in body['messages']]
+    async with semaphore:
+        try:
+            response = await rate_limiter.ainvoke(llm_clients.chat_model(body['model']), messages)
+        except Exception as e:
+            return {'id': None, 'custom_id': line['custom_id'], 'response': None,
+                    'error': {'code': type(e).__name__, 'message': str(e)}}
+    usage = response.usage_metadata or {}
+    return {
+        'id': None,
+        'custom_id': line['custom_id'],
+        'response': {
+            'status_code': 200,
+            'body': {
+                'model': body['model'],
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': response.content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': usage.get('input_tokens', 0),
+                          'completion_tokens': usage.get('output_tokens', 0),
+                          'total_tokens': usage.get('total_tokens', 0)},
+            },
+        },
+        'error': None,
+    }
+
+
+def run_local(input_path: str, output_path: str, concurrency: int = 8):
+    """
+    Execute a request file with the regular chat client and write a Batch
+    API style output file.  Requests go through the rate limiter like
+    online grading; the output is renamed into place once complete.
+    """
+    async def run_chunk(lines: List[str]) -> List[dict]:
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        return await asyncio.gather(*(_run_local_request(json.loads(line), semaphore) for line in lines))
+
+    partial = output_path + '.part'
+    with open(partial, 'w', encoding='utf-8') as out:
+        for lines in _read_lines(input_path, max(concurrency, 1) * 4):
+            for result in llm_clients.run(run_chunk(lines)):
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+    os.replace(partial, output_path)
+
+
+def submit(workdir: str, runner: str = 'openai', concurrency: int = 8) -> dict:
+    """
+    Submit every request file not submitted yet.  Returns counts of files
+    submitted now and before.
+    """
+    manifest = load_manifest(workdir)
+    submitted = skipped = 0
+    for entry in manifest['request_files']:
+        if entry.get('batch_id') or entry.get('output_file'):
+            skipped += 1
+            continue
+        path = os.path.join(workdir, entry['file'])
+        if runner == 'local':
+            output = 'output-' + entry['file'][len('requests-'):]
+            run_local(path, os.path.join(workdir, output), concurrency)
+            entry.update(runner='local', status='completed', output_file=output)
+        else:
+            client = llm_clients.openai_client()
+            with open(path, 'rb') as f:
+                uploaded = client.files.create(file=f, purpose='batch')
+            batch = client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW,
+                metadata={'source': 'batch_reevaluation', 'prompt_version': manifest['prompt_version']},
+            )
+            entry.update(runner='openai', batch_id=batch.id, status=batch.status)
+        submitted += 1
+        # Saved after every file so a re-run never submits a file twice.
+        _write_json(os.path.join(workdir, MANIFEST), manifest)
+    return {'submitted': submitted, 'already_submitted': skipped}
+
+
+def collect(workdir: str) -> dict:
+    """Download the output (and error) files of finished batches.  Returns status counts."""
+    manifest = load_manifest(workdir)
+    statuses: Dict[str, int] = {}
+    changed = False
+    for entry in manifest['request_files']:
+        if entry.get('batch_id') and not entry.get('output_file'):
+            client = llm_clients.openai_client()
+            batch = client.batches.retrieve(entry['batch_id'])
+            entry['status'] = batch.status
+            if batch.status in ('completed', 'expired', 'cancelled', 'failed'):
+                stem = entry['file'][len('requests-'):]
+                # Expired and cancelled batches keep the results they finished.
+                if batch.output_file_id:
+                    client.files.content(batch.output_file_id).write_to_file(os.path.join(workdir, 'output-' + stem))
+                    entry['output_file'] = 'output-' + stem
+                if batch.error_file_id:
+                    client.files.content(batch.error_file_id).write_to_file(os.path.join(workdir, 'errors-' + stem))
+                    entry['error_file'] = 'errors-' + stem
+                if not entry.get('output_file'):
+                    entry['output_file'] = None
+            changed = True
+        status = entry.get('status', 'not_submitted')
+        statuses[status] = statuses.get(status, 0) + 1
+    if changed:
+        _write_json(os.path.join(workdir, MANIFEST), manifest)
+    return statuses
+
+
+class UnparsedReply(ValueError):
+    """Raised for a result whose reply cannot be parsed into a grade."""
+
+
+def _parse_result(line: dict) -> Optional[dict]:
+    """
+    Return the update parameters for one result line, or None if the request
+    failed.  Raises :class:`UnparsedReply` if the model's reply cannot be
+    parsed; like a failed request, it is not applied, so the answer keeps
+    its previous grade.
+    """
+    candidate_id, answer_id, kind = _parse_custom_id(line['custom_id'])
+    prompt_tokens = completion_tokens = 0
+    if 'score' in line:
+        score, feedback, stage = line['score'], line['feedback'], line.get('stage', evaluation.STAGE_PRESCORE)
+    else:
+        response = line.get('response') or {}
+        if line.get('error') or response.get('status_code') != 200:
+            return None
+        content = response['body']['choices'][0]['message']['content']
+        try:
+            if kind == KIND_STRUCTURED:
+                parsed = prompts.parser.parse(content)
+                score, feedback = float(parsed['score']), parsed['feedback']
+            else:
+                score, feedback = evaluation.parse_short_answer(content, strict=True)
+        except Exception as e:
+            raise UnparsedReply(f"Unparseable reply for answer {answer_id}: {e}")
+        stage = evaluation.STAGE_BATCH
+        usage = response['body'].get('usage') or {}
+        prompt_tokens, completion_tokens = usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+    return {'candidate_id': candidate_id, 'b_id': answer_id, 'b_score': score, 'b_feedback': feedback, 'b_stage': stage,
+            'b_prompt_tokens': prompt_tokens, 'b_completion_tokens': completion_tokens}
+
+
+def ingest(db: Session, workdir: str, chunk_size: int = BATCH_CHUNK_SIZE) -> dict:
+    """
+    Apply every available result to the answers and candidate aggregates.
+
+    Results are applied in chunks of ``chunk_size``, each in its own
+    transaction followed by a checkpoint, so the work done survives an
+    interruption.  Batches still running are left for a later run.
+    """
+    statuses = collect(workdir)
+    manifest = load_manifest(workdir)
+    checkpoint_path = os.path.join(workdir, CHECKPOINT)
+    checkpoint = _read_json(checkpoint_path) if os.path.exists(checkpoint_path) else {}
+    sources = [LOCAL_RESULTS] + [
+        name for entry in manifest['request_files']
+        for name in (entry.get('output_file'), entry.get('error_file')) if name
+    ]
+
+    rescore = _answer_rescore({
+        int(question_id): version for question_id, version in manifest.get('ideal_answer_versions', {}).items()
+    })
+    applied = failed = unparsed = 0
+    for source in sources:
+        done = checkpoint.get(source, 0)
+        seen = 0
+        for lines in _read_lines(os.path.join(workdir, source), chunk_size):
+            if seen + len(lines) <= done:
+                seen += len(lines)
+                continue
+            lines, seen = lines[max(done - seen, 0):], seen + len(lines)
+            params = []
+            for line in lines:
+                try:
+                    result = _parse_result(json.loads(line))
+                except UnparsedReply:
+                    result = None
+                    unparsed += 1
+                if result is None:
+                    failed += 1
+                else:
+                    params.append(result)
+            if params:
+                db.execute(rescore, params)
+                scores.update_scores(db, {p['candidate_id'] for p in params})
+            db.commit()
+            applied += len(params)
+            checkpoint[source] = seen
+            _write_json(checkpoint_path, checkpoint)
+
+    pending = sum(count for status, count in statuses.items() if status not in ('completed', 'expired', 'cancelled', 'failed'))
+    return {'applied': applied, 'failed': failed, 'unparsed': unparsed, 'pending_files': pending,
+            'batch_statuses': statuses}
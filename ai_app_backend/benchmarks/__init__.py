@@ -0,0 +1,7 @@
+"""
+Benchmarks for the evaluation backend.
+
+Run them from the ``ai_app_backend`` directory, e.g.
+``python -m benchmarks.grading_modes``.  They use a fake chat model unless
+told otherwise, so no OpenAI key or network access is needed.
+"""
@@ -0,0 +1,138 @@
+"""
+Per-candidate cost of writing evaluation results back to the database.
+
+For each table size, a temporary SQLite database is filled with that many
+answer rows (16 per candidate) and the results of a sample of candidates
+are written back with:
+
+  - legacy:          one SELECT ... .first() per answer, no composite index
+                     (the write-back used before the bulk UPDATE);
+  - legacy_indexed:  the same loop with the (candidate_id, question_id) index;
+  - bulk:            the production write path: ``write_answer_results``
+                     (one executemany UPDATE) and ``finish_candidate`` in
+                     one transaction, indexed.
+
+    python -m benchmarks.answer_writeback --rows 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import models
+import background_tasks
+
+
+ANSWERS_PER_CANDIDATE = 16
+
+
+def answers_payload():
+    return [
+        {'id': qid, 'type': 'mc' if qid <= 10 else 'text'}
+        for qid in range(1, ANSWERS_PER_CANDIDATE + 1)
+    ]
+
+
+def results_payload():
+    return [
+        {'score': 1.0, 'feedback': "Câu trả lời khá đầy đủ.", 'status': 'completed'}
+        for _ in range(ANSWERS_PER_CANDIDATE)
+    ]
+
+
+def populate(engine, rows: int):
+    candidates = rows // ANSWERS_PER_CANDIDATE
+    with engine.begin() as conn:
+        conn.execute(insert(models.Candidate), [
+            {'id': i, 'name': f"Candidate {i}", 'phone': "0900000000", 'evaluation_status': 'processing'}
+            for i in range(1, candidates + 1)
+        ])
+        chunk = []
+        for candidate_id in range(1, candidates + 1):
+            for qid in range(1, ANSWERS_PER_CANDIDATE + 1):
+                chunk.append({
+                    'candidate_id': candidate_id, 'question_id': qid, 'question': f"Question {qid}",
+                    'type': 'mc' if qid <= 10 else 'text', 'answer_text': "answer",
+                    'evaluation_status': 'pending',
+                })
+            if len(chunk) >= 50000:
+                conn.execute(insert(models.Answer), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(insert(models.Answer), chunk)
+    return candidates
+
+
+def legacy_write(db, candidate_id, answers_data, evaluation_results):
+    candidate = db.query(models.Candidate).filter(models.Candidate.id == candidate_id).first()
+    for ans_data, eval_data in zip(answers_data, evaluation_results):
+        answer = db.query(models.Answer).filter(
+            models.Answer.candidate_id == candidate_id,
+            models.Answer.question_id == ans_data['id']
+        ).first()
+        if answer:
+            answer.evaluation_score = eval_data['score']
+            answer.evaluation_feedback = eval_data['feedback']
+            answer.evaluation_status = 'completed'
+    candidate.evaluation_status = 'completed'
+    db.commit()
+
+
+def bulk_write(db, candidate_id, answers_data, evaluation_results):
+    pairs = list(zip(answers_data, evaluation_results))
+    background_tasks.write_answer_results(db, candidate_id, pairs, len(pairs))
+    background_tasks.finish_candidate(db, candidate_id, 'completed')
+    db.commit()
+
+
+def measure(Session, write, sample):
+    answers_data, evaluation_results = answers_payload(), results_payload()
+    timings = []
+    for candidate_id in sample:
+        db = Session()
+        try:
+            started = time.perf_counter()
+            write(db, candidate_id, answers_data, evaluation_results)
+            timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            db.close()
+    return {"median_ms": round(statistics.median(timings), 3), "max_ms": round(max(timings), 3)}
+
+
+def run(rows: int, sample_size: int) -> dict:
+    index = next(i for i in models.Answer.__table__.indexes if i.name == "ix_answers_candidate_question")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        index.drop(bind=engine)
+        candidates = populate(engine, rows)
+        Session = sessionmaker(bind=engine, autoflush=False)
+        samples = random.Random(rows).sample(range(1, candidates + 1), min(sample_size * 3, candidates))
+        third = len(samples) // 3
+
+        report = {"rows": rows, "legacy": measure(Session, legacy_write, samples[:third])}
+        index.create(bind=engine)
+        report["legacy_indexed"] = measure(Session, legacy_write, samples[third:2 * third])
+        report["bulk"] = measure(Session, bulk_write, samples[2 * third:])
+        engine.dispose()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="answer table sizes to test")
+    parser.add_argument("--sample", type=int, default=20, help="candidates written per strategy")
+    args = parser.parse_args(argv)
+    print(json.dumps([run(rows, args.sample) for rows in args.rows], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Offline batch re-evaluation end to end.
+
+Fills a temporary SQLite database with ``--candidates`` completed
+candidates (10 multiple choice and 6 text answers each, ``--trivial-share``
+of the text answers blank or "không biết"), then runs the three steps of
+``batch_reevaluation`` with the local runner against
+``benchmarks.fake_openai_server``:
+
+  - prepare: seconds and peak Python memory (tracemalloc) while streaming
+    the answers into request files;
+  - submit:  seconds for the local runner to execute the requests;
+  - ingest:  seconds and peak memory while applying the results, and a
+    second ingest to show that a re-run applies nothing twice.
+
+Also reports requests sent against answers re-scored and the estimated
+cost relative to synchronous per-answer grading.  The rate limiter is
+disabled.
+
+    python -m benchmarks.batch_reevaluation --candidates 500
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+_directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'batch.db')}"
+os.environ["LLM_RATE_LIMIT_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from sqlalchemy import func, insert, select
+
+import batch_reevaluation
+import database
+import llm_clients
+import models
+from ideal_answers import ideal_answers
+from benchmarks.fake_openai_server import FakeOpenAIServer
+
+ORDINARY_ANSWER = "Em sẽ lắng nghe khách, giữ bình tĩnh và tư vấn sản phẩm phù hợp với nhu cầu."
+
+
+def populate(candidates: int, trivial_share: float, rng: random.Random):
+    database.ensure_schema(models.Base.metadata)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Candidate), [
+            {'id': i, 'name': f"Candidate {i}", 'phone': "0900000000", 'evaluation_status': 'completed'}
+            for i in range(1, candidates + 1)
+        ])
+        rows = []
+        for candidate_id in range(1, candidates + 1):
+            for qid in range(1, 11):
+                rows.append({'candidate_id': candidate_id, 'question_id': qid, 'question': f"Câu hỏi {qid}",
+                             'type': 'mc', 'selected': 'B', 'answer_text': None, 'evaluation_score': 1.0,
+                             'evaluation_status': 'completed'})
+            for qid, entry in sorted(ideal_answers.items()):
+                text = rng.choice(["", "không biết"]) if rng.random() < trivial_share else ORDINARY_ANSWER
+                rows.append({'candidate_id': candidate_id, 'question_id': qid, 'question': entry['question'],
+                             'type': 'text', 'selected': None, 'answer_text': text, 'evaluation_score': 0.5,
+                             'evaluation_status': 'completed'})
+            if len(rows) >= 20000:
+                conn.execute(insert(models.Answer), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(models.Answer), rows)
+
+
+def measured(step):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = step()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": round(elapsed, 2), "peak_memory_mb": round(peak / 2 ** 20, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=500)
+    parser.add_argument("--trivial-share", type=float, default=0.2, help="share of blank/'không biết' answers")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight with the local runner")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake server seconds per completion")
+    args = parser.parse_args(argv)
+
+    populate(args.candidates, args.trivial_share, random.Random(args.candidates))
+    workdir = os.path.join(_directory.name, "batch")
+    report = {"candidates": args.candidates}
+    db = database.SessionLocal()
+    try:
+        summary, report["prepare"] = measured(lambda: batch_reevaluation.prepare(db, workdir))
+        report["prepare"].update(summary)
+        with FakeOpenAIServer(latency=args.latency) as server:
+            llm_clients.OPENAI_BASE_URL = server.base_url
+            started = time.perf_counter()
+            batch_reevaluation.submit(workdir, runner="local", concurrency=args.concurrency)
+            report["submit"] = {"seconds": round(time.perf_counter() - started, 2),
+                                "requests_sent": server.stats()["requests"]}
+        summary, report["ingest"] = measured(lambda: batch_reevaluation.ingest(db, workdir))
+        report["ingest"].update({key: summary[key] for key in ("applied", "failed", "unparsed")})
+        report["ingest_rerun_applied"] = batch_reevaluation.ingest(db, workdir)["applied"]
+        stages = db.execute(
+            select(models.Answer.evaluation_stage, func.count())
+            .where(models.Answer.type == 'text')
+            .group_by(models.Answer.evaluation_stage)
+        ).all()
+        report["text_answer_stages"] = {stage: count for stage, count in stages}
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
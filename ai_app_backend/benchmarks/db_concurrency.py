@@ -0,0 +1,141 @@
+"""
+Mixed writer/reader load against the database layer.
+
+Writer threads insert submissions (a candidate and 16 answers per
+transaction, like POST /candidates) while reader threads look up candidate
+statuses (like GET /candidates/{id}/status).  Each configuration runs for
+``--seconds`` and reports throughput, p95 latency and the number of
+"database is locked" (or other) errors.
+
+Configurations:
+  - legacy: the previous engine, default journal mode and pool;
+  - tuned:  ``database.build_engine`` with WAL, synchronous=NORMAL,
+            busy_timeout, cache_size and mmap_size.
+
+Pass ``--url`` to run the tuned configuration against another database,
+e.g. PostgreSQL.
+
+    python -m benchmarks.db_concurrency --writers 8 --readers 16 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, select
+
+import database
+import models
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def run(engine, writers: int, readers: int, seconds: float) -> dict:
+    database.ensure_schema(models.Base.metadata, bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Candidate), [
+            {'name': "seed", 'phone': "0900000000", 'evaluation_status': 'pending'} for _ in range(100)
+        ])
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {
+        'write': {'ops': 0, 'errors': 0, 'latencies': []},
+        'read': {'ops': 0, 'errors': 0, 'latencies': []},
+    }
+
+    def record(kind, started, error=None):
+        with lock:
+            entry = stats[kind]
+            if error:
+                entry['errors'] += 1
+            else:
+                entry['ops'] += 1
+                entry['latencies'].append((time.perf_counter() - started) * 1000)
+
+    def writer():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    candidate_id = conn.scalar(
+                        insert(models.Candidate)
+                        .values(name="load", phone="0900000000", evaluation_status='pending')
+                        .returning(models.Candidate.id)
+                    )
+                    conn.execute(insert(models.Answer), [
+                        {'candidate_id': candidate_id, 'question_id': qid, 'question': "q",
+                         'type': 'mc' if qid <= 10 else 'text', 'answer_text': "answer",
+                         'evaluation_status': 'pending'}
+                        for qid in range(1, 17)
+                    ])
+                record('write', started)
+            except Exception as e:
+                record('write', started, e)
+
+    def reader():
+        rng = random.Random()
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        select(models.Candidate.evaluation_status)
+                        .where(models.Candidate.id == rng.randint(1, 100))
+                    ).first()
+                record('read', started)
+            except Exception as e:
+                record('read', started, e)
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {
+        kind: {
+            'ops_per_second': round(entry['ops'] / seconds, 1),
+            'p95_ms': round(percentile(entry['latencies'], 0.95), 2),
+            'errors': entry['errors'],
+        }
+        for kind, entry in stats.items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--url", help="database URL for the tuned run (default: temporary SQLite file)")
+    args = parser.parse_args(argv)
+
+    report = {"writers": args.writers, "readers": args.readers, "seconds": args.seconds}
+    if args.url:
+        report["tuned"] = run(database.build_engine(args.url), args.writers, args.readers, args.seconds)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            legacy_url = f"sqlite:///{os.path.join(directory, 'legacy.db')}"
+            tuned_url = f"sqlite:///{os.path.join(directory, 'tuned.db')}"
+            legacy = create_engine(legacy_url, connect_args={"check_same_thread": False})
+            report["legacy"] = run(legacy, args.writers, args.readers, args.seconds)
+            report["tuned"] = run(database.build_engine(tuned_url), args.writers, args.readers, args.seconds)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Memory and time of exporting every candidate with their answers.
+
+For each table size, a temporary SQLite database is filled with that many
+completed candidates (16 answers each) and the whole table is exported
+with:
+
+  - list:   what an export through ``GET /candidates`` costs — every
+            candidate and answer loaded with ``.all()``, validated into
+            ``CandidateOut`` and serialized;
+  - csv / jsonl / xlsx: ``exports.stream`` at answer level, consumed chunk
+            by chunk as ``StreamingResponse`` would.
+
+Reports seconds, peak Python memory (tracemalloc) and output size.  The
+streaming peaks should stay flat as the table grows.
+
+    python -m benchmarks.export_memory --candidates 1000 10000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+
+import database
+import exports
+import models
+import queries
+import schemas
+
+
+ANSWERS_PER_CANDIDATE = 16
+
+
+def populate(engine, candidates: int):
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Candidate), [
+            {'id': i, 'name': f"Candidate {i}", 'phone': "0900000000", 'evaluation_status': 'completed',
+             'mc_correct_count': 7, 'text_score_sum': 8.0, 'overall_score': 0.66}
+            for i in range(1, candidates + 1)
+        ])
+        chunk = []
+        for candidate_id in range(1, candidates + 1):
+            for qid in range(1, ANSWERS_PER_CANDIDATE + 1):
+                mc = qid <= 10
+                chunk.append({
+                    'candidate_id': candidate_id, 'question_id': qid, 'question': f"Câu hỏi số {qid}",
+                    'type': 'mc' if mc else 'text', 'selected': 'B' if mc else None,
+                    'answer_text': None if mc else "Em sẽ lắng nghe khách và tư vấn sản phẩm phù hợp.",
+                    'evaluation_score': 1.0,
+                    'evaluation_feedback': None if mc else "Câu trả lời khá đầy đủ, cần cụ thể hơn.",
+                    'evaluation_status': 'completed', 'evaluation_stage': 'answer_key' if mc else 'llm',
+                })
+            if len(chunk) >= 50000:
+                conn.execute(insert(models.Answer), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(insert(models.Answer), chunk)
+
+
+def export_list(engine) -> int:
+    db = database.SessionLocal(bind=engine)
+    try:
+        rows = db.execute(queries.candidate_page(with_answers=True)).all()
+        payload = [schemas.CandidateOut.model_validate(candidate).model_dump(mode='json') for candidate, _ in rows]
+        return len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+    finally:
+        db.close()
+
+
+def export_stream(engine, fmt: str) -> int:
+    return sum(len(chunk) for chunk in exports.stream(fmt, 'answers', engine=engine))
+
+
+def measure(export) -> dict:
+    # Timed and traced in separate runs: tracemalloc slows allocation-heavy
+    # code (openpyxl in particular) several times over.
+    started = time.perf_counter()
+    size = export()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    export()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(elapsed, 2), "peak_memory_mb": round(peak / 2 ** 20, 2),
+            "output_mb": round(size / 2 ** 20, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args(argv)
+
+    formats = [fmt for fmt in exports.FORMATS if fmt != 'xlsx']
+    try:
+        exports.check_format('xlsx')
+        formats.append('xlsx')
+    except exports.ExportError:
+        pass
+
+    report = {}
+    for candidates in args.candidates:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = database.build_engine(f"sqlite:///{os.path.join(directory, 'export.db')}")
+            populate(engine, candidates)
+            result = {"list": measure(lambda: export_list(engine))}
+            for fmt in formats:
+                result[fmt] = measure(lambda: export_stream(engine, fmt))
+            engine.dispose()
+        report[str(candidates)] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Deterministic stand-in for ChatOpenAI used by the benchmarks.
+
+The fake recognises the prompts built by ``evaluation`` and answers them in
+the format each one asks for, after sleeping for a simulated latency of
+``base_latency + per_token_latency * prompt_tokens`` seconds (varied by up
+to ``latency_jitter`` of itself).
+
+It can also:
+
+  - replay recorded responses: with ``recording`` (see :func:`load_recording`
+    and :class:`ResponseRecorder`) a prompt seen during recording gets the
+    recorded reply and token usage;
+  - inject failures: ``error_rate`` of the calls fail with ``error_kind``,
+    an OpenAI 429 ('rate_limit'), 500 ('server'), timeout ('timeout') or a
+    reply that is not valid JSON ('malformed').
+
+Jitter and failures are drawn from a generator seeded with ``seed``, the
+prompt and how many times that prompt was seen, so a run is reproducible
+regardless of the order concurrent calls arrive in.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import openai
+from pydantic import PrivateAttr
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+_ITEM_RE = re.compile(r"^Mục (\d+)$", re.MULTILINE)
+
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    # Loaded once: tiktoken may try to download the encoding, which blocks
+    # for seconds at a time on a machine without network access.
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+ERROR_KINDS = ('rate_limit', 'server', 'timeout', 'malformed')
+
+_FAKE_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def prompt_text(messages) -> str:
+    return "\n".join(str(getattr(m, 'content', m)) for m in messages)
+
+
+def prompt_key(prompt: str) -> str:
+    """Key of a prompt in a recording."""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def load_recording(path: str) -> Dict[str, dict]:
+    """Load a JSONL recording written by :class:`ResponseRecorder`."""
+    recording = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                recording[entry['key']] = entry
+    return recording
+
+
+def injected_error(kind: str) -> Exception:
+    if kind == 'rate_limit':
+        response = httpx.Response(429, request=_FAKE_REQUEST)
+        return openai.RateLimitError("Rate limit reached (injected)", response=response, body=None)
+    if kind == 'server':
+        response = httpx.Response(500, request=_FAKE_REQUEST)
+        return openai.InternalServerError("Server error (injected)", response=response, body=None)
+    if kind == 'timeout':
+        return openai.APITimeoutError(request=_FAKE_REQUEST)
+    raise ValueError(f"Unknown error kind {kind!r}")
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or approximate if it is unavailable."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(len(text) // 4, 1)
+    return len(encoding.encode(text))
+
+
+class FakeGradingChatModel(BaseChatModel):
+    """Chat model that returns well-formed grading replies without a network call."""
+
+    base_latency: float = 0.5
+    per_token_latency: float = 0.0005
+    latency_jitter: float = 0.0
+    score: int = 1
+    error_rate: float = 0.0
+    error_kind: str = 'rate_limit'
+    seed: int = 0
+    recording: Optional[Dict[str, dict]] = None
+    calls: int = 0
+    errors: int = 0
+    replayed: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _seen: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-grading"
+
+    def _draw(self, key: str) -> random.Random:
+        with self._lock:
+            occurrence = self._seen.get(key, 0)
+            self._seen[key] = occurrence + 1
+        return random.Random(f"{self.seed}:{key}:{occurrence}")
+
+    def _synthetic_body(self, prompt: str) -> str:
+        items = _ITEM_RE.findall(prompt)
+        if items:
+            body = json.dumps(
+                [{"item": int(i), "score": self.score, "feedback": "Câu trả lời khá đầy đủ."} for i in items],
+                ensure_ascii=False,
+            )
+        elif "```json" in prompt:
+            body = "```json\n" + json.dumps(
+                {"score": str(self.score), "feedback": "Câu trả lời khá đầy đủ."}, ensure_ascii=False
+            ) + "\n```"
+        else:
+            body = json.dumps({"score": self.score, "feedback": "Câu trả lời khá đầy đủ."}, ensure_ascii=False)
+        return body
+
+    def _reply(self, messages: List[BaseMessage]) -> tuple:
+        """Return (message or exception, simulated delay) for one call."""
+        prompt = prompt_text(messages)
+        key = prompt_key(prompt)
+        rng = self._draw(key)
+        recorded = self.recording.get(key) if self.recording else None
+        if recorded is not None:
+            body = recorded['content']
+            prompt_tokens = recorded['usage']['input_tokens']
+            completion_tokens = recorded['usage']['output_tokens']
+        else:
+            body = self._synthetic_body(prompt)
+            prompt_tokens = count_tokens(prompt)
+            completion_tokens = count_tokens(body)
+        delay = self.base_latency + self.per_token_latency * prompt_tokens
+        if self.latency_jitter:
+            delay *= 1 + self.latency_jitter * (2 * rng.random() - 1)
+        failed = rng.random() < self.error_rate
+        with self._lock:
+            self.calls += 1
+            self.replayed += recorded is not None
+            self.errors += failed
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        if failed:
+            if self.error_kind != 'malformed':
+                return injected_error(self.error_kind), delay
+            body = "Xin lỗi, tôi không thể chấm điểm câu trả lời này."
+        message = AIMessage(
+            content=body,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+        return message, delay
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message, delay = self._reply(messages)
+        time.sleep(delay)
+        if isinstance(message, Exception):
+            raise message
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message, delay = self._reply(messages)
+        await asyncio.sleep(delay)
+        if isinstance(message, Exception):
+            raise message
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class ResponseRecorder:
+    """
+    Wraps a real chat model and appends every reply to a JSONL recording
+    that :func:`load_recording` and ``FakeGradingChatModel(recording=...)``
+    replay.
+    """
+
+    def __init__(self, model, path: str):
+        self.model = model
+        self.model_name = getattr(model, 'model_name', None)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _record(self, messages, response):
+        prompt = prompt_text(messages)
+        usage = response.usage_metadata or {}
+        entry = {
+            'key': prompt_key(prompt),
+            'model': self.model_name,
+            'content': response.content,
+            'usage': {'input_tokens': usage.get('input_tokens', 0), 'output_tokens': usage.get('output_tokens', 0)},
+        }
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def invoke(self, messages, **kwargs):
+        response = self.model.invoke(messages, **kwargs)
+        self._record(messages, response)
+        return response
+
+    async def ainvoke(self, messages, **kwargs):
+        response = await self.model.ainvoke(messages, **kwargs)
+        self._record(messages, response)
+        return response
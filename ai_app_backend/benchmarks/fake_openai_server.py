@@ -0,0 +1,172 @@
+"""
+Local OpenAI-compatible server for tests and benchmarks.
+
+Implements ``POST /v1/chat/completions`` with the grading replies of
+``benchmarks.fake_llm`` after a simulated latency, and records the client
+address of every request so that connection reuse can be measured:
+``GET /stats`` returns the number of requests and of distinct client
+connections (host, port) seen.
+
+With ``max_concurrent`` and/or ``rpm`` set, requests beyond those limits
+are answered like OpenAI does when throttling: 429 with a ``Retry-After``
+header (counted as ``throttled``).
+
+Point the backend at it with ``OPENAI_BASE_URL=http://127.0.0.1:<port>/v1``.
+
+    python -m benchmarks.fake_openai_server --port 8900 --latency 0.2 --max-concurrent 8
+"""
+
+import argparse
+import asyncio
+import collections
+import threading
+import time
+import uuid
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fake_llm import FakeGradingChatModel
+
+
+def create_app(latency: float = 0.2, max_concurrent: int = 0, rpm: int = 0, retry_after: float = 1.0) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    model = FakeGradingChatModel(base_latency=latency, per_token_latency=0.0)
+    app.state.connections = {}
+    app.state.requests = 0
+    app.state.throttled = 0
+    in_flight = 0
+    recent = collections.deque()
+
+    def throttled() -> bool:
+        now = time.monotonic()
+        while recent and recent[0] <= now - 60:
+            recent.popleft()
+        if (max_concurrent and in_flight >= max_concurrent) or (rpm and len(recent) >= rpm):
+            return True
+        recent.append(now)
+        return False
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        nonlocal in_flight
+        body = await request.json()
+        peer = (request.client.host, request.client.port) if request.client else ("?", 0)
+        app.state.connections[peer] = app.state.connections.get(peer, 0) + 1
+        app.state.requests += 1
+        if throttled():
+            app.state.throttled += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+                content={"error": {"message": "Rate limit reached for requests", "type": "requests",
+                                   "param": None, "code": "rate_limit_exceeded"}},
+            )
+
+        in_flight += 1
+        try:
+            prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+            message, delay = model._reply([HumanMessage(content=prompt)])
+            await asyncio.sleep(delay)
+        finally:
+            in_flight -= 1
+        usage = message.usage_metadata
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": message.content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": usage["input_tokens"],
+                "completion_tokens": usage["output_tokens"],
+                "total_tokens": usage["total_tokens"],
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests, "connections": len(app.state.connections),
+                "throttled": app.state.throttled}
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        app.state.connections = {}
+        app.state.requests = 0
+        app.state.throttled = 0
+        return {"ok": True}
+
+    return app
+
+
+class FakeOpenAIServer:
+    """Runs :func:`create_app` with uvicorn on a background thread."""
+
+    def __init__(self, port: int = 0, latency: float = 0.2, max_concurrent: int = 0, rpm: int = 0,
+                 retry_after: float = 1.0):
+        self.app = create_app(latency, max_concurrent, rpm, retry_after)
+        config = uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning",
+                                timeout_keep_alive=60)
+        self.server = uvicorn.Server(config)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.servers[0].sockets[0].getsockname()[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("fake OpenAI server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stats(self) -> dict:
+        return {"requests": self.app.state.requests, "connections": len(self.app.state.connections),
+                "throttled": self.app.state.throttled}
+
+    def reset_stats(self):
+        self.app.state.connections = {}
+        self.app.state.requests = 0
+        self.app.state.throttled = 0
+
+    def stop(self):
+        self.server.should_exit = True
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per completion")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="answer 429 above this many requests in flight")
+    parser.add_argument("--rpm", type=int, default=0, help="answer 429 above this many requests per minute")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of 429 responses")
+    args = parser.parse_args(argv)
+    app = create_app(args.latency, args.max_concurrent, args.rpm, args.retry_after)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, timeout_keep_alive=60)
+
+
+if __name__ == "__main__":
+    main()
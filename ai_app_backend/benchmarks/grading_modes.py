@@ -0,0 +1,98 @@
+"""
+Compare per-answer and combined grading of a submission's text answers.
+
+Reports prompt tokens, model calls and wall-clock time per candidate for:
+
+  - per_answer: the current ``evaluate_answer`` path, one request per answer;
+  - combined:   ``evaluate_answers_combined``, one request per submission.
+
+By default a fake chat model with simulated latency is used.  Pass
+``--live`` to call OpenAI with the model configured in ``evaluation``
+(requires OPENAI_API_KEY).
+
+    python -m benchmarks.grading_modes --candidates 5
+"""
+
+import argparse
+import json
+import os
+import time
+
+# Measure the grading modes themselves, not the client-side rate limits.
+os.environ.setdefault("LLM_RATE_LIMIT_ENABLED", "false")
+
+import answer_keys
+import evaluation
+import llm_clients
+import prompts
+from ideal_answers import ideal_answers
+from benchmarks.fake_llm import FakeGradingChatModel, count_tokens
+
+
+SAMPLE_ANSWER = (
+    "Em sẽ lắng nghe khách, giữ thái độ vui vẻ và tư vấn sản phẩm phù hợp, "
+    "nếu chưa rõ thì em hỏi lại quản lý."
+)
+
+
+def build_items():
+    return [
+        (entry["question"], entry["ideal_answer"], SAMPLE_ANSWER)
+        for _, entry in sorted(ideal_answers.items())
+    ]
+
+
+def run_per_answer(items, candidates):
+    started = time.perf_counter()
+    for _ in range(candidates):
+        for question, ideal_answer, candidate_answer in items:
+            evaluation.evaluate_answer(question, ideal_answer, candidate_answer)
+    elapsed = time.perf_counter() - started
+    prompt_tokens = sum(
+        count_tokens(prompts.for_question(q, i).render(c))
+        for q, i, c in items
+    )
+    return {"calls": len(items), "prompt_tokens": prompt_tokens, "seconds": elapsed / candidates}
+
+
+def run_combined(items, candidates, model):
+    started = time.perf_counter()
+    for _ in range(candidates):
+        evaluation.evaluate_answers_combined(items, model)
+    elapsed = time.perf_counter() - started
+    prompt_tokens = count_tokens(evaluation.build_combined_prompt(items))
+    return {"calls": 1, "prompt_tokens": prompt_tokens, "seconds": elapsed / candidates}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=3, help="number of submissions to grade per mode")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model base latency in seconds")
+    parser.add_argument("--per-token-latency", type=float, default=0.0005,
+                        help="fake model latency per prompt token in seconds")
+    parser.add_argument("--live", action="store_true", help="call OpenAI instead of the fake model")
+    args = parser.parse_args(argv)
+    answer_keys.load_builtin()
+
+    if args.live:
+        model = evaluation.structured_model()
+    else:
+        model = FakeGradingChatModel(base_latency=args.latency, per_token_latency=args.per_token_latency)
+        llm_clients.set_override(lambda model_name: model)
+
+    items = build_items()
+    report = {
+        "model": "live" if args.live else "fake",
+        "candidates": args.candidates,
+        "text_answers_per_candidate": len(items),
+        "per_answer": run_per_answer(items, args.candidates),
+        "combined": run_combined(items, args.candidates, model),
+    }
+    per_answer, combined = report["per_answer"], report["combined"]
+    report["prompt_token_ratio"] = round(combined["prompt_tokens"] / per_answer["prompt_tokens"], 3)
+    report["speedup"] = round(per_answer["seconds"] / combined["seconds"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cost of the duplicate-submission lookup as the candidates table grows.
+
+For each table size, a temporary SQLite database is filled with that many
+candidates, each with an Idempotency-Key and a submission hash, and
+``idempotency.original_query`` is run for keys and hashes that exist (a
+retry) and that do not (a new submission):
+
+  - indexed:   with the unique ``idempotency_key`` and the
+               ``(submission_hash, created_at)`` indexes of the model;
+  - unindexed: with those indexes dropped, i.e. a table scan per lookup.
+
+Reports the mean lookup time in microseconds and SQLite's query plan.  The
+indexed times should stay flat as the table grows.
+
+    python -m benchmarks.idempotency_lookup --candidates 10000 100000 1000000
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+import database
+import idempotency
+import models
+
+
+INDEXES = ("uq_candidates_idempotency_key", "ix_candidates_submission_hash_created")
+
+
+def populate(engine, candidates: int):
+    models.Base.metadata.create_all(engine)
+    # All inside the deduplication window.
+    start = datetime.utcnow() - timedelta(minutes=1)
+    with engine.begin() as conn:
+        for first in range(1, candidates + 1, 50000):
+            conn.execute(insert(models.Candidate), [
+                {'id': i, 'name': f"Candidate {i}", 'phone': f"09{i:08d}", 'evaluation_status': 'completed',
+                 'created_at': start + timedelta(microseconds=i), 'idempotency_key': f"key-{i}",
+                 'submission_hash': hashlib.sha256(str(i).encode()).hexdigest()}
+                for i in range(first, min(first + 50000, candidates + 1))
+            ])
+
+
+def lookups(candidates: int, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    for n in range(count):
+        i = rng.randint(1, candidates)
+        if n % 2:
+            i += candidates  # a new submission: no match
+        if n % 4 < 2:
+            yield f"key-{i}", None
+        else:
+            yield None, hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def measure(engine, candidates: int, count: int) -> dict:
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        found = 0
+        for key, digest in lookups(candidates, count):
+            found += conn.execute(idempotency.original_query(key, digest)).first() is not None
+        elapsed = time.perf_counter() - started
+        plans = {}
+        for name, (key, digest) in (("key", ("key-1", None)), ("hash", (None, "0" * 64))):
+            sql = str(idempotency.original_query(key, digest).compile(engine, compile_kwargs={"literal_binds": True}))
+            plans[name] = " / ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+    return {"mean_us": round(elapsed / count * 1e6, 1), "found": found, "lookups": count, "plan": plans}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    report = {}
+    for candidates in args.candidates:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = database.build_engine(f"sqlite:///{os.path.join(directory, 'idempotency.db')}")
+            populate(engine, candidates)
+            result = {"indexed": measure(engine, candidates, args.lookups)}
+            with engine.begin() as conn:
+                for name in INDEXES:
+                    conn.execute(text(f"DROP INDEX {name}"))
+            # New connections, so no statement prepared against the indexes is reused.
+            engine.dispose()
+            # A table scan per lookup: fewer of them are enough.
+            result["unindexed"] = measure(engine, candidates, max(args.lookups // 100, 10))
+            engine.dispose()
+        report[str(candidates)] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Connection reuse of LLM calls across a batch of candidates.
+
+Starts ``benchmarks.fake_openai_server`` and evaluates ``--candidates``
+submissions on ``--workers`` threads (like the evaluation pool) in two
+ways:
+
+  - per_call: the previous behaviour, a new ChatOpenAI for every call and
+    a new event loop (``asyncio.run``) for every candidate;
+  - pooled:   ``llm_clients``, shared models with keep-alive pools on each
+    worker thread's persistent loop.
+
+Reports requests, distinct TCP connections seen by the server, failed
+answers and wall-clock time.  The grading cache and the rate limiter are
+disabled.
+
+    python -m benchmarks.llm_connection_reuse --candidates 50 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["EVALUATION_CACHE_ENABLED"] = "false"
+os.environ["LLM_RATE_LIMIT_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_openai import ChatOpenAI
+
+import answer_keys
+import evaluation
+import llm_clients
+from ideal_answers import ideal_answers
+from benchmarks.fake_openai_server import FakeOpenAIServer
+
+
+def submission():
+    answers = [
+        {"type": "mc", "id": qid, "question": f"Câu hỏi {qid}", "selected": "B"}
+        for qid in range(1, 11)
+    ]
+    answers += [
+        {"type": "text", "id": qid, "question": entry["question"],
+         "answer": "Em sẽ lắng nghe khách và tư vấn sản phẩm phù hợp."}
+        for qid, entry in sorted(ideal_answers.items())
+    ]
+    return answers
+
+
+def run(server: FakeOpenAIServer, mode: str, candidates: int, workers: int) -> dict:
+    answers = submission()
+    if mode == "per_call":
+        llm_clients.set_override(
+            lambda model_name: ChatOpenAI(model=model_name, temperature=0, base_url=server.base_url)
+        )
+        evaluate = lambda: asyncio.run(evaluation.aevaluate_candidate_answers(answers))
+    else:
+        llm_clients.set_override(None)
+        llm_clients.reset()
+        llm_clients.OPENAI_BASE_URL = server.base_url
+        evaluate = lambda: evaluation.evaluate_candidate_answers(answers)
+
+    server.reset_stats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(lambda _: evaluate(), range(candidates)))
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results for r in result if r["status"] == "failed")
+    stats = server.stats()
+    return {
+        "seconds": round(elapsed, 2),
+        "requests": stats["requests"],
+        "connections": stats["connections"],
+        "requests_per_connection": round(stats["requests"] / max(stats["connections"], 1), 1),
+        "failed_answers": failed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4, help="evaluation threads")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server seconds per completion")
+    args = parser.parse_args(argv)
+    answer_keys.load_builtin()
+
+    report = {"candidates": args.candidates, "workers": args.workers}
+    with FakeOpenAIServer(latency=args.latency) as server:
+        for mode in ("per_call", "pooled"):
+            report[mode] = run(server, mode, args.candidates, args.workers)
+    llm_clients.set_override(None)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
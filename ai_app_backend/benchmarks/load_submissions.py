@@ -0,0 +1,138 @@
+"""
+Load test for POST /candidates.
+
+Sends ``--requests`` submissions with ``--concurrency`` in flight at a time
+and reports requests per second and p50/p95/p99 latency as JSON.
+
+By default a local uvicorn server is started on a temporary SQLite database
+with ``EVALUATION_MODE=worker``, so submissions are only stored and queued
+and no LLM calls are made.  Pass ``--url`` to target a running server
+instead.
+
+    python -m benchmarks.load_submissions --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def submission_payload(number: int) -> dict:
+    answers = [
+        {"type": "mc", "id": qid, "question": f"Câu hỏi trắc nghiệm {qid}", "selected": "B"}
+        for qid in range(1, 11)
+    ]
+    answers += [
+        {"type": "text", "id": qid, "question": f"Câu hỏi tự luận {qid}",
+         "answer": "Em sẽ lắng nghe khách và tư vấn sản phẩm phù hợp."}
+        for qid in range(11, 17)
+    ]
+    return {"name": f"Ứng viên {number}", "phone": f"09{number:08d}", "answers": answers}
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def run_load(url: str, total: int, concurrency: int) -> dict:
+    latencies, statuses = [], {}
+    counter = iter(range(total))
+
+    async def client_loop(client: httpx.AsyncClient):
+        for number in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/candidates", json=submission_payload(number))
+                code = str(response.status_code)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "status_codes": statuses,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(directory: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["EVALUATION_MODE"] = "worker"
+    env["EVALUATION_QUEUE_SIZE"] = str(10 ** 9)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(BACKEND_DIR),
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=directory, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server; default starts a local one")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        report = asyncio.run(run_load(args.url.rstrip("/"), args.requests, args.concurrency))
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            port = free_port()
+            server = start_server(directory, port, args.workers)
+            try:
+                report = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.requests, args.concurrency))
+            finally:
+                server.terminate()
+                server.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Cost of re-scoring every stored multiple choice answer after a key change.
+
+For each table size, a temporary SQLite database is filled with that many
+candidates, each with the ten multiple choice answers, scored against the
+seeded keys.  One key is then corrected (``answer_keys.set_answer_key``)
+and the answers are re-scored with:
+
+  - per_answer: the answers streamed in chunks, scored one by one with
+    ``evaluation.evaluate_multiple_choice``, written back with an
+    executemany UPDATE per chunk, then the aggregates of the candidates;
+  - set_based:  ``answer_keys.rescore_mc`` — one UPDATE of the answers with
+    CASE expressions over the question id and one UPDATE of the aggregates.
+
+Both are run over every question (the cost of a full rescore) and
+``set_based`` also over the corrected question's stale answers only.
+Reports seconds and answers per second, and checks that both produce the
+same total score.
+
+    python -m benchmarks.mc_rescoring --candidates 10000 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import answer_keys
+import database
+import evaluation
+import models
+import scores
+
+
+CHUNK_SIZE = 5000
+# The question whose key is corrected, and its new key.
+CORRECTED_QUESTION, CORRECTED_OPTION = 5, 'B'
+
+_ANSWER_UPDATE = (
+    update(models.Answer.__table__)
+    .where(models.Answer.__table__.c.id == bindparam('b_id'))
+    .values(
+        evaluation_score=bindparam('b_score'),
+        evaluation_feedback=bindparam('b_feedback'),
+        evaluation_status='completed',
+        evaluation_stage=evaluation.STAGE_ANSWER_KEY,
+        answer_key_version=bindparam('b_key_version'),
+    )
+)
+
+
+def populate(engine, candidates: int, seed: int = 1):
+    rng = random.Random(seed)
+    keys = answer_keys.DEFAULT_MC_ANSWER_KEYS
+    with engine.begin() as conn:
+        for first in range(1, candidates + 1, 10000):
+            last = min(first + 10000, candidates + 1)
+            conn.execute(insert(models.Candidate), [
+                {'id': i, 'name': f"Candidate {i}", 'phone': f"09{i:08d}", 'evaluation_status': 'completed'}
+                for i in range(first, last)
+            ])
+            rows = []
+            for candidate_id in range(first, last):
+                for qid, correct in keys.items():
+                    selected = rng.choice(answer_keys.OPTIONS)
+                    rows.append({
+                        'candidate_id': candidate_id, 'question_id': qid, 'question': f"Question {qid}",
+                        'type': 'mc', 'selected': selected, 'evaluation_status': 'completed',
+                        'evaluation_score': 1.0 if selected == correct else 0.0,
+                        'evaluation_stage': evaluation.STAGE_ANSWER_KEY, 'answer_key_version': 1,
+                    })
+            conn.execute(insert(models.Answer), rows)
+    with Session(engine) as db:
+        scores.backfill(db, only_missing=False)
+
+
+def rescore_per_answer(db: Session) -> int:
+    answer = models.Answer
+    stmt = (
+        select(answer.id, answer.candidate_id, answer.question_id, answer.selected)
+        .where(answer.type == 'mc')
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    updated = 0
+    candidate_ids = set()
+    for rows in db.execute(stmt).partitions():
+        params = []
+        for row in rows:
+            score, feedback = evaluation.evaluate_multiple_choice(row.question_id, row.selected or '')
+            params.append({'b_id': row.id, 'b_score': score, 'b_feedback': feedback,
+                           'b_key_version': answer_keys.key_version(row.question_id)})
+            candidate_ids.add(row.candidate_id)
+        db.connection().execute(_ANSWER_UPDATE, params)
+        updated += len(params)
+    candidate_ids = sorted(candidate_ids)
+    for first in range(0, len(candidate_ids), CHUNK_SIZE):
+        scores.update_scores(db, candidate_ids[first:first + CHUNK_SIZE])
+    db.commit()
+    return updated
+
+
+def total_score(db: Session) -> float:
+    return db.scalar(select(func.sum(models.Candidate.overall_score)))
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def report(seconds: float, answers: int, total: float) -> dict:
+    return {"seconds": round(seconds, 3), "answers": answers,
+            "answers_per_second": round(answers / seconds) if seconds else None, "total_score": total}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args(argv)
+
+    results = {}
+    for candidates in args.candidates:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = database.build_engine(f"sqlite:///{os.path.join(directory, 'rescoring.db')}")
+            models.Base.metadata.create_all(engine)
+            with Session(engine) as db:
+                answer_keys.load(db)
+                populate(engine, candidates)
+                answer_keys.set_answer_key(db, CORRECTED_QUESTION, CORRECTED_OPTION)
+
+                seconds, updated = timed(answer_keys.rescore_mc, db, [CORRECTED_QUESTION])
+                stale = report(seconds, updated['answers'], total_score(db))
+                seconds, updated = timed(rescore_per_answer, db)
+                per_answer = report(seconds, updated, total_score(db))
+                seconds, updated = timed(answer_keys.rescore_mc, db, only_stale=False)
+                set_based = report(seconds, updated['answers'], total_score(db))
+            engine.dispose()
+        results[str(candidates)] = {
+            "per_answer": per_answer,
+            "set_based": set_based,
+            "set_based_stale_only": stale,
+            "speedup": round(per_answer["seconds"] / set_based["seconds"], 1) if set_based["seconds"] else None,
+            "same_scores": per_answer["total_score"] == set_based["total_score"] == stale["total_score"],
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
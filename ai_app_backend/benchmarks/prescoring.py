@@ -0,0 +1,105 @@
+"""
+LLM calls avoided by local pre-scoring.
+
+Evaluates ``--candidates`` submissions whose text answers are a seeded mix
+of blank answers, "không biết", one-word answers, copies of the question
+and ordinary answers (``--trivial-share`` of them trivial), once without
+and once with ``prescoring``, using the fake chat model with per-answer
+grading.  Reports model calls, the share of text answers settled locally,
+the time per pre-scored answer and wall-clock time.  The grading cache and
+the rate limiter are disabled.
+
+    python -m benchmarks.prescoring --candidates 50 --trivial-share 0.3
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+os.environ["EVALUATION_CACHE_ENABLED"] = "false"
+os.environ["LLM_RATE_LIMIT_ENABLED"] = "false"
+
+import answer_keys
+import evaluation
+import llm_clients
+import prescoring
+from ideal_answers import ideal_answers
+from benchmarks.fake_llm import FakeGradingChatModel
+
+ORDINARY_ANSWERS = [
+    "Em sẽ lắng nghe khách và tư vấn sản phẩm phù hợp với nhu cầu.",
+    "Em giữ bình tĩnh, xin lỗi khách và nhờ quản lý hỗ trợ nếu cần.",
+    "Em sẽ quan sát đồng nghiệp, ghi chép và hỏi khi chưa hiểu.",
+    "Em gợi ý mẫu khác trong tầm giá hoặc cho khách đặt cọc giữ hàng.",
+]
+
+
+def trivial_answer(rng: random.Random, question: str) -> str:
+    return rng.choice(["", "không biết", "Em không biết ạ", "Dạ", question])
+
+
+def submission(rng: random.Random, trivial_share: float):
+    answers = [
+        {"type": "mc", "id": qid, "question": f"Câu hỏi {qid}", "selected": "B"}
+        for qid in range(1, 11)
+    ]
+    for qid, entry in sorted(ideal_answers.items()):
+        text = (trivial_answer(rng, entry["question"]) if rng.random() < trivial_share
+                else rng.choice(ORDINARY_ANSWERS))
+        answers.append({"type": "text", "id": qid, "question": entry["question"], "answer": text})
+    return answers
+
+
+def run(submissions, enabled: bool, latency: float) -> dict:
+    model = FakeGradingChatModel(base_latency=latency, per_token_latency=0.0)
+    llm_clients.set_override(lambda model_name: model)
+    prescoring.PRESCORING_ENABLED = enabled
+    stages = {}
+    started = time.perf_counter()
+    for answers in submissions:
+        for result in evaluation.evaluate_candidate_answers(answers):
+            stages[result["stage"]] = stages.get(result["stage"], 0) + 1
+    elapsed = time.perf_counter() - started
+    text_answers = sum(1 for answers in submissions for a in answers if a["type"] == "text")
+    return {
+        "seconds": round(elapsed, 2),
+        "model_calls": model.calls,
+        "text_answers": text_answers,
+        "stages": stages,
+        "llm_calls_avoided_share": round(stages.get("prescore", 0) / text_answers, 4),
+    }
+
+
+def prescore_cost(submissions) -> float:
+    """Microseconds per text answer spent in prescoring.prescore."""
+    prescoring.PRESCORING_ENABLED = True
+    texts = [a for answers in submissions for a in answers if a["type"] == "text"]
+    started = time.perf_counter()
+    for a in texts:
+        prescoring.prescore(a["question"], a["answer"], ideal_answers[a["id"]]["ideal_answer"])
+    return round((time.perf_counter() - started) / len(texts) * 1e6, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--trivial-share", type=float, default=0.3, help="share of trivial text answers")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model seconds per call")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    answer_keys.load_builtin()
+
+    rng = random.Random(args.seed)
+    submissions = [submission(rng, args.trivial_share) for _ in range(args.candidates)]
+    report = {"candidates": args.candidates, "trivial_share": args.trivial_share}
+    report["llm_only"] = run(submissions, False, args.latency)
+    report["prescored"] = run(submissions, True, args.latency)
+    report["prescore_microseconds_per_answer"] = prescore_cost(submissions)
+    llm_clients.set_override(None)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Per-answer cost of building grading prompts.
+
+Compares, for every question with an ideal answer:
+
+  - template: the previous construction, a ``PromptTemplate`` rendered per
+    answer (format instructions included) and the fallback grader's system
+    prompt rebuilt per call;
+  - registry: ``prompts``, the pre-rendered per-question prefix followed by
+    the answer, and the shared system message.
+
+Reports microseconds per answer and the share of a prompt that is a prefix
+common to every answer to the same question (what provider-side prompt
+caching can reuse).  No model is called.
+
+    python -m benchmarks.prompt_construction --iterations 2000
+"""
+
+import argparse
+import json
+import os
+import time
+
+from langchain.prompts import PromptTemplate
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import prompts
+from ideal_answers import ideal_answers
+
+# The per-answer prompt as it was defined in evaluation.py before the registry.
+LEGACY_PROMPT = PromptTemplate(
+    input_variables=["question", "ideal_answer", "candidate_answer"],
+    template="""
+        Bạn là một trợ lý nhân sự chuyên đánh giá câu trả lời phỏng vấn cho vị trí chăm sóc khách hàng tại cửa hàng trang sức bạc.
+
+        Câu hỏi: {question}
+
+        Câu trả lời mẫu (tốt nhất): {ideal_answer}
+
+        Câu trả lời của ứng viên: {candidate_answer}
+
+        Hãy chấm điểm câu trả lời của ứng viên từ 0 đến 2, dựa trên mức độ phù hợp, đầy đủ và chuyên nghiệp.
+        Sau đó, đưa ra **nhận xét ngắn gọn bằng tiếng Việt** giúp ứng viên hiểu mình đã làm tốt gì và cần cải thiện gì.
+
+        Phản hồi của bạn phải đúng định dạng JSON sau:
+        {format_instructions}
+    """,
+    partial_variables={"format_instructions": prompts.parser.get_format_instructions()},
+)
+
+
+def legacy_short_answer_messages(question: str, answer: str) -> list:
+    system_prompt = (
+        "Bạn là trợ lý nhân sự đánh giá câu trả lời phỏng vấn. "
+        "Chấm điểm câu trả lời của ứng viên từ 0 đến 2 dựa trên mức độ đầy đủ, phù hợp "
+        "và thái độ chuyên nghiệp cho vị trí chăm sóc khách hàng và bán hàng tại cửa hàng trang sức vàng bạc."
+    )
+    user_prompt = (
+        f"Câu hỏi: {question}\n"
+        f"Câu trả lời của ứng viên: {answer}\n"
+        "Hãy trả về kết quả ở dạng JSON với hai trường 'score' (một số nguyên 0–2) và 'feedback' (hai câu nhận xét ngắn)."
+    )
+    return [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
+
+
+def build_template(qid: int, answer: str) -> list:
+    entry = ideal_answers[qid]
+    text = LEGACY_PROMPT.format_prompt(
+        question=entry["question"], ideal_answer=entry["ideal_answer"], candidate_answer=answer
+    ).to_messages()
+    return [text, legacy_short_answer_messages(entry["question"], answer)]
+
+
+def build_registry(qid: int, answer: str) -> list:
+    return [prompts.get(qid).messages(answer), prompts.short_answer_messages(ideal_answers[qid]["question"], answer)]
+
+
+def per_answer_microseconds(build, iterations: int) -> float:
+    question_ids = sorted(ideal_answers)
+    started = time.perf_counter()
+    for i in range(iterations):
+        for qid in question_ids:
+            build(qid, f"Em sẽ lắng nghe khách và tư vấn sản phẩm phù hợp ({i}).")
+    return round((time.perf_counter() - started) / (iterations * len(question_ids)) * 1e6, 2)
+
+
+def shared_prefix_share(render) -> float:
+    """Average share of a per-answer prompt shared by two different answers to the same question."""
+    shares = []
+    for qid in sorted(ideal_answers):
+        a, b = render(qid, "Câu trả lời thứ nhất."), render(qid, "Một câu trả lời khác.")
+        common = len(os.path.commonprefix([a, b]))
+        shares.append(common / len(a))
+    return round(sum(shares) / len(shares), 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="passes over all questions")
+    args = parser.parse_args(argv)
+
+    prompts.load(ideal_answers)
+    report = {
+        "questions": len(ideal_answers),
+        "template": {
+            "microseconds_per_answer": per_answer_microseconds(build_template, args.iterations),
+            "shared_prefix_share": shared_prefix_share(lambda qid, answer: LEGACY_PROMPT.format(
+                question=ideal_answers[qid]["question"], ideal_answer=ideal_answers[qid]["ideal_answer"],
+                candidate_answer=answer)),
+        },
+        "registry": {
+            "microseconds_per_answer": per_answer_microseconds(build_registry, args.iterations),
+            "shared_prefix_share": shared_prefix_share(lambda qid, answer: prompts.get(qid).render(answer)),
+        },
+    }
+    report["speedup"] = round(
+        report["template"]["microseconds_per_answer"] / report["registry"]["microseconds_per_answer"], 1
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Regression check: the employer list endpoint must issue a fixed number of
+SQL statements regardless of how many candidates it returns.
+
+Seeds a temporary SQLite database with an increasing number of candidates
+(each with a full set of answers), calls ``GET /candidates`` and counts the
+statements executed.  Prints the counts as JSON and exits with status 1 if
+they grow with the number of candidates.
+
+    python -m benchmarks.query_count
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("EMPLOYER_TOKEN", "benchmark-token")
+os.environ.setdefault("EVALUATION_MODE", "worker")
+# A file, not an in-memory database: the endpoints read through the async
+# engine while seeding goes through the sync one.
+_directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'query_count.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from sqlalchemy import event
+
+import database
+import models
+import main as app_main
+from fastapi.testclient import TestClient
+
+
+ANSWERS_PER_CANDIDATE = 16
+
+
+def seed(total: int):
+    db = database.SessionLocal()
+    try:
+        existing = db.query(models.Candidate).count()
+        for i in range(existing, total):
+            candidate = models.Candidate(name=f"Candidate {i}", phone="0900000000", evaluation_status='completed')
+            db.add(candidate)
+            db.flush()
+            for qid in range(1, ANSWERS_PER_CANDIDATE + 1):
+                db.add(models.Answer(
+                    candidate_id=candidate.id, question_id=qid, question=f"Question {qid}",
+                    type='mc' if qid <= 10 else 'text', selected='B', answer_text="answer",
+                    evaluation_score=1.0, evaluation_feedback="ok", evaluation_status='completed',
+                ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def count_statements(client: TestClient, params: dict) -> int:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = (database.engine, database.async_engine.sync_engine)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(
+            "/candidates", params=params,
+            headers={"Authorization": f"Bearer {os.environ['EMPLOYER_TOKEN']}"},
+        )
+        response.raise_for_status()
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+def main():
+    sizes = [1, 10, 100]
+    cases = {
+        "full": {},
+        "summary": {"fields": "summary"},
+        "paginated": {"limit": 500, "sort": "-total_score"},
+    }
+    report = {name: {} for name in cases}
+    with TestClient(app_main.app) as client:
+        for size in sizes:
+            seed(size)
+            for name, params in cases.items():
+                report[name][size] = count_statements(client, params)
+
+    print(json.dumps(report, indent=2))
+    regressions = [name for name, counts in report.items() if len(set(counts.values())) != 1]
+    if regressions:
+        print(f"Statement count grows with the number of candidates for: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
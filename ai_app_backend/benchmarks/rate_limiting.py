@@ -0,0 +1,92 @@
+"""
+Behaviour of evaluation under OpenAI throttling.
+
+Starts ``benchmarks.fake_openai_server`` with a cap on requests in flight
+(``--server-max-concurrent``; requests above it get 429 with Retry-After)
+and evaluates ``--candidates`` submissions on ``--workers`` threads:
+
+  - unlimited: ``rate_limiter`` disabled and the OpenAI client's own two
+    retries, i.e. the previous behaviour;
+  - limited:   ``rate_limiter`` with adaptive concurrency and backoff, and
+               request/token budgets if ``--rpm``/``--tpm`` are given.
+
+Reports requests sent, 429s received, failed answers, wall-clock time and,
+for the limited run, the limiter's final state.  The grading cache is
+disabled.
+
+    python -m benchmarks.rate_limiting --candidates 20 --workers 4
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ["EVALUATION_CACHE_ENABLED"] = "false"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import answer_keys
+import evaluation
+import llm_clients
+import rate_limiter
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.llm_connection_reuse import submission
+
+
+def run(server: FakeOpenAIServer, mode: str, candidates: int, workers: int, rpm: int, tpm: int) -> dict:
+    answers = submission()
+    llm_clients.reset()
+    llm_clients.OPENAI_BASE_URL = server.base_url
+    if mode == "unlimited":
+        llm_clients.LLM_MAX_RETRIES = 2
+        rate_limiter.limiter = rate_limiter.RateLimiter(enabled=False)
+    else:
+        llm_clients.LLM_MAX_RETRIES = 0
+        rate_limiter.limiter = rate_limiter.RateLimiter(rpm=rpm, tpm=tpm)
+
+    server.reset_stats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        results = list(pool.map(lambda _: evaluation.evaluate_candidate_answers(answers), range(candidates)))
+    elapsed = time.perf_counter() - started
+    stats = server.stats()
+    report = {
+        "seconds": round(elapsed, 2),
+        "requests": stats["requests"],
+        "throttled": stats["throttled"],
+        "failed_answers": sum(1 for result in results for r in result if r["status"] == "failed"),
+        "failed_candidates": sum(1 for result in results if any(r["status"] == "failed" for r in result)),
+    }
+    if mode == "limited":
+        limiter = rate_limiter.stats()
+        report["limiter"] = {key: limiter[key] for key in (
+            "calls", "retries", "gave_up", "concurrency_limit", "concurrency_decreases", "wait_seconds"
+        )}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4, help="evaluation threads")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake server seconds per completion")
+    parser.add_argument("--server-max-concurrent", type=int, default=8,
+                        help="requests in flight the fake server accepts before answering 429")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After of the fake server's 429s")
+    parser.add_argument("--rpm", type=int, default=0, help="limiter request budget per minute (0: none)")
+    parser.add_argument("--tpm", type=int, default=0, help="limiter token budget per minute (0: none)")
+    args = parser.parse_args(argv)
+    answer_keys.load_builtin()
+
+    report = {"candidates": args.candidates, "workers": args.workers,
+              "server_max_concurrent": args.server_max_concurrent}
+    with FakeOpenAIServer(latency=args.latency, max_concurrent=args.server_max_concurrent,
+                          retry_after=args.retry_after) as server:
+        for mode in ("unlimited", "limited"):
+            report[mode] = run(server, mode, args.candidates, args.workers, args.rpm, args.tpm)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cost of polling GET /candidates/{id}/status.
+
+Creates ``--candidates`` submissions in a temporary SQLite database and
+polls each one ``--polls`` times through the ASGI app (no network), in
+three ways:
+
+  - uncached:  the status cache is emptied before every request, i.e. the
+               previous behaviour of one database read per poll;
+  - cached:    statuses come from the status cache;
+  - etag:      the client sends If-None-Match and gets 304 with no body.
+
+Reports requests per second and SQL statements per request for each.
+
+    python -m benchmarks.status_polling --candidates 200 --polls 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'status_polling.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["EVALUATION_MODE"] = "worker"
+
+import httpx
+from sqlalchemy import event, insert
+
+import database
+import models
+import status_cache
+import main as app_main
+
+
+async def run_mode(client: httpx.AsyncClient, candidate_ids, polls: int, mode: str) -> dict:
+    statements = []
+
+    def record(*args):
+        statements.append(1)
+
+    engines = (database.engine, database.async_engine.sync_engine)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    etags, codes = {}, {}
+    started = time.perf_counter()
+    try:
+        for _ in range(polls):
+            for candidate_id in candidate_ids:
+                if mode == "uncached":
+                    status_cache.cache.clear_local()
+                headers = {"If-None-Match": etags[candidate_id]} if mode == "etag" and candidate_id in etags else {}
+                response = await client.get(f"/candidates/{candidate_id}/status", headers=headers)
+                etags[candidate_id] = response.headers.get("etag")
+                codes[response.status_code] = codes.get(response.status_code, 0) + 1
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+    elapsed = time.perf_counter() - started
+    requests = polls * len(candidate_ids)
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "sql_statements_per_request": round(len(statements) / requests, 3),
+        "status_codes": codes,
+    }
+
+
+async def run(candidates: int, polls: int) -> dict:
+    database.ensure_schema(models.Base.metadata)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Candidate), [
+            {'id': i, 'name': f"Candidate {i}", 'phone': "0900000000", 'evaluation_status': 'processing'}
+            for i in range(1, candidates + 1)
+        ])
+    candidate_ids = list(range(1, candidates + 1))
+    transport = httpx.ASGITransport(app=app_main.app)
+    report = {"candidates": candidates, "polls": polls}
+    async with httpx.AsyncClient(transport=transport, base_url="http://status") as client:
+        for mode in ("uncached", "cached", "etag"):
+            status_cache.cache.clear_local()
+            report[mode] = await run_mode(client, candidate_ids, polls, mode)
+    await database.async_engine.dispose()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=10)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args.candidates, args.polls)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Cost of following evaluation status with many concurrent subscribers.
+
+Subscribes ``--subscribers`` clients to candidates in a temporary SQLite
+database and measures:
+
+  - push: evaluation threads publish processing/progress/completed events
+    through ``status_events``; reports delivery latency and the number of
+    SQL statements (none are expected);
+  - poll fallback: status changes written by "another process" are picked
+    up by the shared poller; reports statements per poll tick, which stays
+    at one per ``POLL_CHUNK_SIZE`` subscribed candidates;
+  - polling clients: what the same subscribers cost when each polls
+    ``/candidates/{id}/status`` once per tick (one statement per client).
+
+    python -m benchmarks.status_stream --subscribers 5000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'status_stream.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["STATUS_EVENTS_POLL_INTERVAL"] = "0"  # ticks are driven below
+
+from sqlalchemy import event, insert, update
+
+import database
+import models
+import status_events
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class StatementCounter:
+    def __init__(self, *engines):
+        self.engines = engines
+        self.count = 0
+
+    def _record(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._record)
+
+
+async def run(subscribers: int, progress_events: int) -> dict:
+    database.ensure_schema(models.Base.metadata)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Candidate), [
+            {'id': i, 'name': f"Candidate {i}", 'phone': "0900000000", 'evaluation_status': 'pending'}
+            for i in range(1, subscribers + 1)
+        ])
+
+    broker = status_events.broker
+    subscriptions = [broker.subscribe(i) for i in range(1, subscribers + 1)]
+    for subscription in subscriptions:
+        broker.remember(subscription.candidate_id, 'pending')
+    engines = (database.engine, database.async_engine.sync_engine)
+
+    # Push: publish from a few threads, as evaluation workers do.
+    latencies = []
+
+    async def consume(subscription):
+        while True:
+            item = await subscription.get()
+            latencies.append((time.perf_counter() - item['sent']) * 1000)
+            if item['status'] == 'completed':
+                return
+
+    def evaluate(candidate_ids):
+        for candidate_id in candidate_ids:
+            for done in range(progress_events):
+                broker.publish(candidate_id, 'processing', completed=done, total=progress_events,
+                               sent=time.perf_counter())
+            broker.publish(candidate_id, 'completed', sent=time.perf_counter())
+
+    with StatementCounter(*engines) as counter:
+        started = time.perf_counter()
+        consumers = asyncio.gather(*(consume(s) for s in subscriptions))
+        ids = [s.candidate_id for s in subscriptions]
+        threads = [threading.Thread(target=evaluate, args=(ids[n::4],)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        await consumers
+        for thread in threads:
+            thread.join()
+        push_seconds = time.perf_counter() - started
+    push = {
+        "events": len(latencies),
+        "seconds": round(push_seconds, 3),
+        "latency_ms": {"p50": round(percentile(latencies, 0.5), 3), "p99": round(percentile(latencies, 0.99), 3)},
+        "sql_statements": counter.count,
+    }
+
+    # Poll fallback: statuses change in the database behind the broker's back.
+    for subscription in subscriptions:
+        broker.remember(subscription.candidate_id, 'pending')
+    with database.engine.begin() as conn:
+        conn.execute(update(models.Candidate).values(evaluation_status='processing'))
+    with StatementCounter(*engines) as counter:
+        queries = await broker.poll_once()
+    delivered = sum(s.queue.qsize() for s in subscriptions)
+    poll = {"statements_per_tick": counter.count, "queries_reported": queries, "events_delivered": delivered}
+
+    for subscription in subscriptions:
+        broker.unsubscribe(subscription)
+    await database.async_engine.dispose()
+    return {
+        "subscribers": subscribers,
+        "push": push,
+        "poll_fallback": poll,
+        "polling_clients": {"statements_per_tick": subscribers},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--progress-events", type=int, default=6, help="progress events per candidate")
+    args = parser.parse_args(argv)
+    report = asyncio.run(run(args.subscribers, args.progress_events))
+    print(json.dumps(report, indent=2))
+    if report["push"]["sql_statements"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
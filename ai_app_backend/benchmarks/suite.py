@@ -0,0 +1,471 @@
+"""
+Offline benchmark suite for the evaluation pipeline.
+
+Runs synthetic candidate datasets (``--submissions``, e.g. 100 to 100000)
+through up to three scenarios, all against the deterministic fake chat
+model of ``benchmarks.fake_llm`` and a temporary SQLite database:
+
+  - evaluate:   ``evaluation.evaluate_candidate_answers`` on ``--workers``
+                threads, as the background pool calls it;
+  - background: submissions stored and queued as by ``POST /candidates``,
+                then claimed and run through ``background_tasks`` (status
+                updates, evaluation and result write-back);
+  - http:       ``POST /candidates`` through the ASGI app with
+                ``--http-concurrency`` requests in flight, until every
+                evaluation has been written back.
+
+For each scenario and size the report gives throughput, p50/p95/p99/max
+latency (per evaluation; per request and end to end for http), peak Python
+memory (tracemalloc), answer stages and statuses and the fake model's
+calls, injected errors and tokens, as JSON.  A report written with
+``--output`` can be passed to a later run with ``--compare`` to get
+current/baseline ratios.
+
+The fake model's latency (``--latency``, ``--jitter``) and failures
+(``--error-rate``, ``--error-kind``) are configurable and reproducible with
+``--seed``.  ``--replay FILE`` answers with responses recorded from the real
+model by ``--record FILE`` (which needs OPENAI_API_KEY and only runs the
+evaluate scenario).  Injected 429/5xx/timeouts are retried by the rate
+limiter with a short backoff and no request or token budget, unless
+``--no-retries``.  The grading cache is off unless ``--cache``.
+
+    python -m benchmarks.suite --submissions 100 1000 --output baseline.json
+    python -m benchmarks.suite --submissions 100 1000 --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+_directory = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory.name, 'suite.db')}"
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("EVALUATION_CACHE_ENABLED", "false")
+if "--cache" in sys.argv:
+    os.environ["EVALUATION_CACHE_ENABLED"] = "true"
+
+import httpx
+from sqlalchemy import func, insert, select
+
+import background_tasks
+import database
+import evaluation
+import job_queue
+import llm_clients
+import models
+import rate_limiter
+from ideal_answers import ideal_answers
+from benchmarks.fake_llm import ERROR_KINDS, FakeGradingChatModel, ResponseRecorder, load_recording
+from benchmarks.load_submissions import percentile
+
+SCENARIOS = ('evaluate', 'background', 'http')
+
+# Fragments combined into text answers, so that answers differ between
+# candidates the way real ones do.
+OPENINGS = ["Em sẽ", "Dạ em sẽ", "Theo em, mình nên", "Nếu gặp trường hợp này em sẽ"]
+ACTIONS = [
+    "lắng nghe khách và tư vấn sản phẩm phù hợp với nhu cầu",
+    "giữ bình tĩnh, xin lỗi khách và nhờ quản lý hỗ trợ khi cần",
+    "quan sát đồng nghiệp, ghi chép lại và hỏi khi chưa hiểu",
+    "gợi ý mẫu khác trong tầm giá hoặc cho khách đặt cọc giữ hàng",
+    "tìm hiểu lý do, rút kinh nghiệm và cố gắng hơn vào ngày hôm sau",
+]
+CLOSINGS = ["", " để khách hài lòng.", " và luôn giữ thái độ vui vẻ.", " ạ."]
+TRIVIAL = ["", "không biết", "Em không biết ạ", "Dạ"]
+
+
+def submission(number: int, seed: int, trivial_share: float) -> dict:
+    """Synthetic submission ``number`` of the dataset seeded with ``seed``."""
+    rng = random.Random(f"{seed}:{number}")
+    answers = [
+        {"type": "mc", "id": qid, "question": f"Câu hỏi trắc nghiệm {qid}", "selected": rng.choice("ABCD")}
+        for qid in range(1, 11)
+    ]
+    for qid, entry in sorted(ideal_answers.items()):
+        if rng.random() < trivial_share:
+            text = rng.choice(TRIVIAL)
+        else:
+            text = f"{rng.choice(OPENINGS)} {rng.choice(ACTIONS)}{rng.choice(CLOSINGS)}"
+        answers.append({"type": "text", "id": qid, "question": entry["question"], "answer": text})
+    return {"name": f"Ứng viên {number}", "phone": f"09{number:08d}", "answers": answers}
+
+
+def dataset(size: int, seed: int, trivial_share: float):
+    """Yield the submissions lazily, so the dataset itself takes no memory."""
+    for number in range(size):
+        yield submission(number, seed, trivial_share)
+
+
+def latency_summary(values) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+def reset_database():
+    models.Base.metadata.drop_all(database.engine)
+    database.ensure_schema(models.Base.metadata)
+
+
+def store_submissions(submissions) -> list:
+    """
+    Store candidates, answers and jobs as ``POST /candidates`` does (multiple
+    choice answers scored on the way in), in bulk.  Returns the ids.
+    """
+    ids = []
+    with database.engine.begin() as conn:
+        for payload in submissions:
+            rows = []
+            for a in payload["answers"]:
+                result = evaluation.score_locally(a, prescore=False) if a['type'] == 'mc' else None
+                rows.append({
+                    'question_id': a['id'], 'question': a['question'], 'type': a['type'],
+                    'selected': a.get('selected'), 'answer_text': a.get('answer'),
+                    'evaluation_status': result['status'] if result else 'pending',
+                    'evaluation_score': result['score'] if result else None,
+                    'evaluation_feedback': result['feedback'] if result else None,
+                    'evaluation_stage': result['stage'] if result else None,
+                    'answer_key_version': result['key_version'] if result else None,
+                })
+            candidate_id = conn.execute(
+                insert(models.Candidate)
+                .values(name=payload["name"], phone=payload["phone"], evaluation_status='pending',
+                        answers_evaluated=sum(row['evaluation_status'] == 'completed' for row in rows),
+                        answers_total=len(rows))
+                .returning(models.Candidate.id)
+            ).scalar_one()
+            for row in rows:
+                row['candidate_id'] = candidate_id
+            conn.execute(insert(models.Answer), rows)
+            ids.append(candidate_id)
+        conn.execute(insert(models.EvaluationJob), [
+            {'candidate_id': candidate_id, 'status': 'queued'} for candidate_id in ids
+        ])
+    return ids
+
+
+def stored_outcomes() -> dict:
+    with database.SessionLocal() as db:
+        candidates = dict(db.execute(
+            select(models.Candidate.evaluation_status, func.count()).group_by(models.Candidate.evaluation_status)
+        ).all())
+        stages = db.execute(
+            select(models.Answer.evaluation_stage, models.Answer.evaluation_status, func.count())
+            .group_by(models.Answer.evaluation_stage, models.Answer.evaluation_status)
+        ).all()
+    return {
+        "candidates": candidates,
+        "answers": {f"{stage}/{status}": count for stage, status, count in stages},
+    }
+
+
+def run_bounded(pool: ThreadPoolExecutor, fn, items, in_flight: int) -> list:
+    """Run ``fn(item)`` for every item with at most ``in_flight`` queued; return the results."""
+    results, pending = [], set()
+    for item in items:
+        if len(pending) >= in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            results.extend(f.result() for f in done)
+        pending.add(pool.submit(fn, item))
+    results.extend(f.result() for f in wait(pending)[0])
+    return results
+
+
+def drain(executor: background_tasks.EvaluationExecutor):
+    """Wait until no job is queued and nothing runs on ``executor``."""
+    while True:
+        with database.SessionLocal() as db:
+            remaining = job_queue.queued_count(db)
+        if remaining == 0 and executor.pending == 0:
+            return
+        time.sleep(0.01)
+
+
+def scenario_evaluate(size: int, args) -> dict:
+    stages = {}
+    lock = threading.Lock()
+
+    def evaluate(payload):
+        started = time.perf_counter()
+        results = evaluation.evaluate_candidate_answers(payload["answers"])
+        seconds = time.perf_counter() - started
+        with lock:
+            for r in results:
+                key = f"{r['stage']}/{r['status']}"
+                stages[key] = stages.get(key, 0) + 1
+        return seconds
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.workers, thread_name_prefix="evaluation") as pool:
+        durations = run_bounded(pool, evaluate, dataset(size, args.seed, args.trivial_share), args.workers * 2)
+    elapsed = time.perf_counter() - started
+    return {
+        "seconds": round(elapsed, 2),
+        "throughput_per_second": round(size / elapsed, 2),
+        "evaluation_latency": latency_summary(durations),
+        "answers": stages,
+    }
+
+
+def scenario_background(size: int, args) -> dict:
+    reset_database()
+    store_submissions(dataset(size, args.seed, args.trivial_share))
+    executor = background_tasks.EvaluationExecutor(args.workers, args.workers)
+    worker_id = job_queue.make_worker_id("benchmark")
+    durations = []
+    lock = threading.Lock()
+
+    def timed_job(lease: job_queue.Lease):
+        started = time.perf_counter()
+        background_tasks.run_evaluation_job(lease)
+        with lock:
+            durations.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    # What JobDispatcher.run_once does, without its idle poll interval.
+    while True:
+        with database.SessionLocal() as db:
+            idle = executor.max_workers - executor.pending
+            claimed = job_queue.claim_batch(db, worker_id, idle) if idle > 0 else []
+        if not claimed:
+            with database.SessionLocal() as db:
+                remaining = job_queue.queued_count(db)
+            if remaining == 0 and executor.pending == 0:
+                break
+            time.sleep(0.005)
+            continue
+        for lease in claimed:
+            executor.submit(timed_job, lease)
+    elapsed = time.perf_counter() - started
+    executor.shutdown()
+    return {
+        "seconds": round(elapsed, 2),
+        "throughput_per_second": round(size / elapsed, 2),
+        "job_latency": latency_summary(durations),
+        **stored_outcomes(),
+    }
+
+
+async def _post_all(size: int, args, posted: dict) -> dict:
+    import main
+
+    request_seconds, rejected = [], 0
+    payloads = dataset(size, args.seed, args.trivial_share)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://suite") as client:
+        async def client_loop():
+            nonlocal rejected
+            for payload in payloads:
+                while True:
+                    started = time.perf_counter()
+                    wall = datetime.utcnow()
+                    response = await client.post("/candidates", json=payload)
+                    request_seconds.append(time.perf_counter() - started)
+                    if response.status_code != 503:
+                        break
+                    rejected += 1
+                    await asyncio.sleep(0.05)
+                response.raise_for_status()
+                posted[response.json()["id"]] = wall
+
+        await asyncio.gather(*(client_loop() for _ in range(args.http_concurrency)))
+    # Close the pooled async connections on this loop; aiosqlite keeps a
+    # thread per connection that would otherwise outlive it.
+    await database.async_engine.dispose()
+    return {"request_latency": latency_summary(request_seconds), "rejected_503": rejected}
+
+
+def scenario_http(size: int, args) -> dict:
+    reset_database()
+    # A fresh local pool for each run (the API submits to whatever
+    # ``background_tasks.executor`` is) and the dispatcher the app starts on
+    # startup, which picks up submissions the busy pool left queued.
+    executor = background_tasks.EvaluationExecutor(args.workers, max(args.workers * 4, 16))
+    background_tasks.executor = executor
+    dispatcher = background_tasks.JobDispatcher(executor, background_tasks.WORKER_ID, poll_interval=0.05)
+    dispatcher.start()
+    posted = {}
+    started = time.perf_counter()
+    report = asyncio.run(_post_all(size, args, posted))
+    drain(executor)
+    elapsed = time.perf_counter() - started
+    dispatcher.stop()
+    executor.shutdown()
+    with database.SessionLocal() as db:
+        finished = dict(db.execute(
+            select(models.Candidate.id, models.Candidate.completed_at).where(models.Candidate.completed_at.is_not(None))
+        ).all())
+    end_to_end = [(finished[cid] - wall).total_seconds() for cid, wall in posted.items() if cid in finished]
+    return {
+        "seconds": round(elapsed, 2),
+        "throughput_per_second": round(size / elapsed, 2),
+        **report,
+        "end_to_end_latency": latency_summary(end_to_end),
+        **stored_outcomes(),
+    }
+
+
+RUNNERS = {'evaluate': scenario_evaluate, 'background': scenario_background, 'http': scenario_http}
+
+
+def measured(runner, size: int, args) -> dict:
+    # A fresh model and limiter for each run, so that every run sees the same
+    # injected errors and starts from the same concurrency.
+    model = install_model(args)
+    install_limiter(args)
+    if args.tracemalloc:
+        tracemalloc.start()
+    result = runner(size, args)
+    if args.tracemalloc:
+        result["peak_memory_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+    if model is not None:
+        result["model"] = {
+            name: getattr(model, name)
+            for name in ('calls', 'errors', 'replayed', 'prompt_tokens', 'completion_tokens')
+        }
+    result["rate_limiter"] = rate_limiter.stats()
+    return result
+
+
+def install_model(args):
+    """Route every chat model to a new fake (or, with --record, to a recorder); return the fake."""
+    if args.record:
+        from langchain_openai import ChatOpenAI
+
+        real = {}
+        llm_clients.set_override(lambda name: real.setdefault(
+            name, ResponseRecorder(ChatOpenAI(model=name, temperature=0), args.record)
+        ))
+        return None
+    model = FakeGradingChatModel(
+        base_latency=args.latency, per_token_latency=0.0, latency_jitter=args.jitter,
+        error_rate=args.error_rate, error_kind=args.error_kind, seed=args.seed,
+        recording=load_recording(args.replay) if args.replay else None,
+    )
+    llm_clients.set_override(lambda name: model)
+    return model
+
+
+def install_limiter(args):
+    if args.no_retries:
+        rate_limiter.limiter = rate_limiter.RateLimiter(enabled=False)
+    else:
+        rate_limiter.limiter = rate_limiter.RateLimiter(
+            rpm=0, tpm=0, initial_concurrency=256, max_concurrency=1024,
+            backoff_base=0.01, backoff_max=0.1,
+        )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report: dict, baseline: dict) -> dict:
+    """current/baseline ratios of throughput, tail latency and memory for runs present in both."""
+    keys = {
+        "throughput_per_second": ("throughput_per_second",),
+        "p95_ms": ("evaluation_latency", "job_latency", "end_to_end_latency"),
+        "p99_ms": ("evaluation_latency", "job_latency", "end_to_end_latency"),
+        "peak_memory_mb": ("peak_memory_mb",),
+    }
+
+    def lookup(result, name):
+        for section in keys[name]:
+            value = result.get(section)
+            if isinstance(value, dict):
+                value = value.get(name)
+            if isinstance(value, (int, float)):
+                return value
+        return None
+
+    ratios = {}
+    for scenario, sizes in report["results"].items():
+        for size, result in sizes.items():
+            base = baseline.get("results", {}).get(scenario, {}).get(size)
+            if not base:
+                continue
+            entry = {}
+            for name in keys:
+                current, before = lookup(result, name), lookup(base, name)
+                if current is not None and before:
+                    entry[name] = round(current / before, 3)
+            ratios.setdefault(scenario, {})[size] = entry
+    return {"baseline_commit": baseline.get("commit"), "ratios": ratios}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, nargs="+", default=[100, 1000], help="dataset sizes")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--workers", type=int, default=background_tasks.EVALUATION_MAX_WORKERS,
+                        help="concurrent evaluations")
+    parser.add_argument("--http-concurrency", type=int, default=50, help="POST requests in flight (http)")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency varies by up to this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of model calls that fail")
+    parser.add_argument("--error-kind", choices=ERROR_KINDS, default="rate_limit")
+    parser.add_argument("--trivial-share", type=float, default=0.2, help="share of blank/'không biết' answers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--replay", help="JSONL recording to answer from")
+    parser.add_argument("--record", help="record real model replies to this JSONL file")
+    parser.add_argument("--no-retries", action="store_true", help="disable the rate limiter and its retries")
+    parser.add_argument("--cache", action="store_true", help="enable the grading cache")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="skip peak memory measurement (it slows allocation-heavy code)")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--compare", help="report written by an earlier run to compare against")
+    args = parser.parse_args(argv)
+    if args.record:
+        args.scenarios = ['evaluate']
+
+    database.ensure_schema(models.Base.metadata)
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": {},
+    }
+    for scenario in args.scenarios:
+        for size in args.submissions:
+            report["results"].setdefault(scenario, {})[str(size)] = measured(RUNNERS[scenario], size, args)
+    report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+    llm_clients.set_override(None)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,148 +7,479 @@ be supplied via the environment variable ``OPENAI_API_KEY`` before running
 the evaluation functions.
 """
 
+import asyncio
 import json
 import os
-from typing import Tuple, List, Dict
+import time
+from typing import Callable, Tuple, List, Optional
 from dotenv import load_dotenv
 
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
-from langchain.schema.runnable import RunnableMap
+from langchain_core.messages import HumanMessage
+
+import answer_keys, evaluation_cache, llm_clients, metrics, prescoring, prompts, rate_limiter
 
 # Load environment variables from .env file
 load_dotenv()
 
 
-# Answer key for multiple choice questions 1–20.
-# Keys correspond to question IDs and values are the correct option letter.
-MC_ANSWER_KEYS: Dict[int, str] = {
-    1: 'B',
-    2: 'B',
-    3: 'B',
-    4: 'B',
-    5: 'C',
-    6: 'B',
-    7: 'B',
-    8: 'B',
-    9: 'A',
-    10: 'A',
-}
+# Maximum number of text answers of one submission graded concurrently.
+EVALUATION_LLM_CONCURRENCY = int(os.getenv('EVALUATION_LLM_CONCURRENCY', '6'))
+
+# Models used for structured grading and for the plain fallback grader.
+STRUCTURED_MODEL_NAME = "gpt-4"
+FALLBACK_MODEL_NAME = "gpt-4o"
+
+# Bump these whenever the wording of the corresponding prompt changes so
+# that cached results from the old prompt are no longer used.
+PROMPT_VERSION = "per-answer-2"
+COMBINED_PROMPT_VERSION = "combined-1"
+
+# Step that produced an answer's score, stored in Answer.evaluation_stage:
+# the multiple choice key, the local pre-scorer, the grading cache, a model,
+# or a model through an offline batch re-evaluation (batch_reevaluation).
+STAGE_ANSWER_KEY = 'answer_key'
+STAGE_PRESCORE = 'prescore'
+STAGE_CACHE = 'cache'
+STAGE_LLM = 'llm'
+STAGE_BATCH = 'batch'
+STAGES = (STAGE_ANSWER_KEY, STAGE_PRESCORE, STAGE_CACHE, STAGE_LLM, STAGE_BATCH)
+
+# 'per_answer' sends one request per text answer; 'combined' grades all text
+# answers that have an ideal answer in a single request and falls back to
+# per-answer grading if the combined response cannot be parsed.
+EVALUATION_GRADING_MODE = os.getenv('EVALUATION_GRADING_MODE', 'per_answer')
 
 
 def evaluate_multiple_choice(question_id: int, selected: str) -> Tuple[float, str]:
     """Return a score (1.0 or 0.0) and simple feedback for a multiple choice answer."""
-    correct = MC_ANSWER_KEYS.get(question_id)
+    correct = answer_keys.correct_option(question_id)
     if not correct:
         # Unknown question: neutral evaluation
         return 0.0, "No evaluation available"
     if selected == correct:
-        return 1.0, "Câu trả lời chính xác"
-    return 0.0, f"Đáp án đúng là {correct}"
+        return 1.0, answer_keys.FEEDBACK_CORRECT
+    return 0.0, answer_keys.FEEDBACK_WRONG.format(correct=correct)
 
 
 def get_chat_model() -> ChatOpenAI:
-    """Initialize and return a ChatOpenAI model using the environment API key."""
+    """Return the shared fallback chat model (see ``llm_clients``)."""
     # This will raise if the API key is not set
-    model_name = "gpt-4o"
-    api_key = os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        raise RuntimeError(
-            'OPENAI_API_KEY environment variable is not set. Please set your OpenAI API key.'
-        )
-    # Instantiate the chat model.  temperature=0 yields deterministic outputs.
-    return ChatOpenAI(model_name=model_name, temperature=0)
+    return llm_clients.chat_model(FALLBACK_MODEL_NAME)
 
 
-def evaluate_short_answer(question: str, answer: str, chat: ChatOpenAI) -> Tuple[float, str]:
-    """
-    Evaluate a free‑form answer using ChatGPT via LangChain.
+def _invoke_llm(grader: str, model, messages):
+    """Call ``model`` through the rate limiter and record the call in ``metrics``."""
+    started = time.perf_counter()
+    try:
+        response = rate_limiter.invoke(model, messages)
+    except Exception as e:
+        metrics.observe_llm_call(grader, model, time.perf_counter() - started, error=e)
+        raise
+    metrics.observe_llm_call(grader, model, time.perf_counter() - started, response)
+    return response
 
-    The prompt instructs the model to score the answer on a 0–2 scale based on
-    relevance, completeness and professional tone, and to provide a brief
-    explanation.  It returns the score and feedback extracted from the model's
-    JSON response.  If parsing fails, the raw content is returned as feedback.
-    """
-    system_prompt = (
-        "Bạn là trợ lý nhân sự đánh giá câu trả lời phỏng vấn. "
-        "Chấm điểm câu trả lời của ứng viên từ 0 đến 2 dựa trên mức độ đầy đủ, phù hợp "
-        "và thái độ chuyên nghiệp cho vị trí chăm sóc khách hàng và bán hàng tại cửa hàng trang sức vàng bạc."
-    )
-    user_prompt = (
-        f"Câu hỏi: {question}\n"
-        f"Câu trả lời của ứng viên: {answer}\n"
-        "Hãy trả về kết quả ở dạng JSON với hai trường 'score' (một số nguyên 0–2) và 'feedback' (hai câu nhận xét ngắn)."
-    )
-    messages = [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
-    response = chat.invoke(messages)
-    content = response.content.strip()
+
+async def _ainvoke_llm(grader: str, model, messages):
+    """Async variant of :func:`_invoke_llm`."""
+    started = time.perf_counter()
+    try:
+        response = await rate_limiter.ainvoke(model, messages)
+    except Exception as e:
+        metrics.observe_llm_call(grader, model, time.perf_counter() - started, error=e)
+        raise
+    metrics.observe_llm_call(grader, model, time.perf_counter() - started, response)
+    return response
+
+
+def _parse_short_answer(content: str) -> Tuple[float, str, bool]:
+    """Parse the fallback grader's reply into (score, feedback, whether it was valid JSON)."""
+    content = content.strip()
     try:
         data = json.loads(content)
         score = float(data.get('score', 0))
         feedback = data.get('feedback', '')
-        return score, feedback
+        return score, feedback, True
     except Exception:
         # If the model didn't return valid JSON, try to extract a number and treat rest as feedback
         # Fallback: attempt to parse "score: X, feedback: Y" like string
         # Score default to 0
         score = 0.0
         feedback = content
-        return score, feedback
-
-
-# Step 1: Define schema
-schema = [
-    ResponseSchema(name="score", description="Score between 0 and 2"),
-    ResponseSchema(name="feedback", description="Short feedback on the answer"),
-]
-parser = StructuredOutputParser.from_response_schemas(schema)
-
-# Step 2: Create prompt
-prompt = PromptTemplate(
-    input_variables=["question", "ideal_answer", "candidate_answer"],
-    template="""
-        Bạn là một trợ lý nhân sự chuyên đánh giá câu trả lời phỏng vấn cho vị trí chăm sóc khách hàng tại cửa hàng trang sức bạc.
-
-        Câu hỏi: {question}
-
-        Câu trả lời mẫu (tốt nhất): {ideal_answer}
-
-        Câu trả lời của ứng viên: {candidate_answer}
-
-        Hãy chấm điểm câu trả lời của ứng viên từ 0 đến 2, dựa trên mức độ phù hợp, đầy đủ và chuyên nghiệp.  
-        Sau đó, đưa ra **nhận xét ngắn gọn bằng tiếng Việt** giúp ứng viên hiểu mình đã làm tốt gì và cần cải thiện gì.
-
-        Phản hồi của bạn phải đúng định dạng JSON sau:
-        {format_instructions}
-    """,
-    partial_variables={"format_instructions": parser.get_format_instructions()}
-)
-
-# Step 3: Define the model
-llm = ChatOpenAI(model="gpt-4", temperature=0)
-
-# Step 4: Create a chain using the Runnable interface
-chain = (
-    {"question": lambda x: x["question"],
-     "ideal_answer": lambda x: x["ideal_answer"],
-     "candidate_answer": lambda x: x["candidate_answer"]}
-    | prompt
-    | llm
-    | parser
-)
-
-# Step 5: Use `.invoke()` instead of `.run()`
-def evaluate_answer(question: str, ideal_answer: str, candidate_answer: str):
-    return chain.invoke({
-        "question": question,
-        "ideal_answer": ideal_answer,
-        "candidate_answer": candidate_answer
+        return score, feedback, False
+
+
+def parse_short_answer(content: str, strict: bool = False) -> Tuple[float, str]:
+    """
+    Parse the fallback grader's JSON reply into (score, feedback).  A reply
+    that is not valid JSON gives a score of 0 with the reply as feedback,
+    or, with ``strict``, raises ValueError.
+    """
+    score, feedback, parsed = _parse_short_answer(content)
+    if strict and not parsed:
+        raise ValueError("The grader's reply is not valid JSON")
+    return score, feedback
+
+
+def evaluate_short_answer(question: str, answer: str, chat: ChatOpenAI) -> Tuple[float, str]:
+    """
+    Evaluate a free‑form answer using ChatGPT via LangChain.
+
+    The prompt instructs the model to score the answer on a 0–2 scale based on
+    relevance, completeness and professional tone, and to provide a brief
+    explanation.  It returns the score and feedback extracted from the model's
+    JSON response.  If parsing fails, the raw content is returned as feedback.
+    """
+    response = _invoke_llm(metrics.GRADER_FALLBACK, chat, prompts.short_answer_messages(question, answer))
+    return parse_short_answer(response.content)
+
+
+async def aevaluate_short_answer(question: str, answer: str, chat: ChatOpenAI) -> Tuple[float, str, bool]:
+    """
+    Async variant of :func:`evaluate_short_answer`; also returns whether the
+    reply was valid JSON (if not, the score is 0 and the feedback the raw
+    reply).
+    """
+    response = await _ainvoke_llm(metrics.GRADER_FALLBACK, chat, prompts.short_answer_messages(question, answer))
+    return _parse_short_answer(response.content)
+
+
+# The model is created lazily by ``llm_clients`` on first use
+def structured_model() -> ChatOpenAI:
+    """Return the shared chat model used for structured grading."""
+    return llm_clients.chat_model(STRUCTURED_MODEL_NAME)
+
+
+def _question_prompt(question: str, ideal_answer: str, question_id=None) -> prompts.QuestionPrompt:
+    entry = prompts.get(question_id) if question_id is not None else None
+    return entry if entry is not None else prompts.for_question(question, ideal_answer)
+
+
+def evaluate_answer(question: str, ideal_answer: str, candidate_answer: str, question_id=None):
+    """
+    Grade an answer against the ideal answer with the structured prompt.
+
+    The prompt comes from the ``prompts`` registry (by ``question_id`` when
+    given); returns the parsed {'score', 'feedback'} dict.
+    """
+    entry = _question_prompt(question, ideal_answer, question_id)
+    response = _invoke_llm(metrics.GRADER_STRUCTURED, structured_model(), entry.messages(candidate_answer))
+    return entry.parser.parse(response.content)
+
+
+async def aevaluate_answer(question: str, ideal_answer: str, candidate_answer: str, question_id=None):
+    """Async variant of :func:`evaluate_answer`."""
+    entry = _question_prompt(question, ideal_answer, question_id)
+    response = await _ainvoke_llm(metrics.GRADER_STRUCTURED, structured_model(), entry.messages(candidate_answer))
+    return entry.parser.parse(response.content)
+
+
+# Prompt for grading every text answer of a submission in one request.  The
+# instructions and the format description are sent once instead of once per
+# answer.
+COMBINED_PROMPT = """
+Bạn là một trợ lý nhân sự chuyên đánh giá câu trả lời phỏng vấn cho vị trí chăm sóc khách hàng tại cửa hàng trang sức bạc.
+
+Dưới đây là {count} mục, mỗi mục gồm một câu hỏi, câu trả lời mẫu (tốt nhất) và câu trả lời của ứng viên.
+Hãy chấm điểm từng câu trả lời của ứng viên từ 0 đến 2, dựa trên mức độ phù hợp, đầy đủ và chuyên nghiệp.
+Với mỗi mục, đưa ra **nhận xét ngắn gọn bằng tiếng Việt** giúp ứng viên hiểu mình đã làm tốt gì và cần cải thiện gì.
+
+{items}
+
+Phản hồi của bạn phải là một mảng JSON có đúng {count} phần tử, mỗi phần tử ứng với một mục ở trên:
+```json
+[{{"item": <số thứ tự mục>, "score": <điểm từ 0 đến 2>, "feedback": "<nhận xét>"}}]
+```
+"""
+
+
+def build_combined_prompt(items: List[Tuple[str, str, str]]) -> str:
+    """Render the combined grading prompt for (question, ideal_answer, candidate_answer) triples."""
+    rendered = "\n\n".join(
+        f"Mục {number}\n"
+        f"Câu hỏi: {question}\n"
+        f"Câu trả lời mẫu (tốt nhất): {ideal_answer}\n"
+        f"Câu trả lời của ứng viên: {candidate_answer}"
+        for number, (question, ideal_answer, candidate_answer) in enumerate(items, start=1)
+    )
+    return COMBINED_PROMPT.format(count=len(items), items=rendered)
+
+
+def parse_combined_grades(content: str, count: int) -> List[Tuple[float, str]]:
+    """
+    Parse the model's reply to :func:`build_combined_prompt`.
+
+    Returns one (score, feedback) pair per item, in item order.  Raises
+    ValueError if the reply is not a JSON array covering every item.
+    """
+    start, end = content.find('['), content.rfind(']')
+    if start == -1 or end < start:
+        raise ValueError("Combined grading response contains no JSON array")
+    data = json.loads(content[start:end + 1])
+    grades = {}
+    for entry in data:
+        item = int(entry['item'])
+        if 1 <= item <= count:
+            grades[item] = (float(entry['score']), str(entry.get('feedback', '')))
+    missing = [item for item in range(1, count + 1) if item not in grades]
+    if missing:
+        raise ValueError(f"Combined grading response is missing items {missing}")
+    return [grades[item] for item in range(1, count + 1)]
+
+
+def evaluate_answers_combined(items: List[Tuple[str, str, str]], chat: ChatOpenAI) -> List[Tuple[float, str]]:
+    """Grade several (question, ideal_answer, candidate_answer) triples with one request."""
+    response = _invoke_llm(metrics.GRADER_COMBINED, chat, [HumanMessage(content=build_combined_prompt(items))])
+    return parse_combined_grades(response.content, len(items))
+
+
+async def aevaluate_answers_combined(items: List[Tuple[str, str, str]], chat: ChatOpenAI) -> List[Tuple[float, str]]:
+    """Async variant of :func:`evaluate_answers_combined`."""
+    response = await _ainvoke_llm(metrics.GRADER_COMBINED, chat, [HumanMessage(content=build_combined_prompt(items))])
+    return parse_combined_grades(response.content, len(items))
+
+
+def _prescore_text_answer(ans: dict) -> Optional[Tuple[float, str]]:
+    ideal = answer_keys.ideal_answer(ans.get('id'))
+    return prescoring.prescore(ans.get('question', ''), ans.get('answer'), ideal['ideal_answer'] if ideal else '')
+
+
+async def _aevaluate_text_answer(ans: dict) -> Tuple[float, str, str]:
+    """Grade a text answer with the model; returns (score, feedback, stage)."""
+    qid = ans.get('id')
+    answer_text = ans.get('answer') or ''
+    question_text = ans.get('question', '')
+
+    # Get ideal answer if available
+    ideal_answer = ""
+    ideal = answer_keys.ideal_answer(qid)
+    if ideal:
+        ideal_answer = ideal['ideal_answer']
+
+    # Use new structured evaluation with ideal answer
+    if ideal_answer:
+        # The key describes the prompt actually sent: the registry's question
+        # text, not the one the client submitted.
+        entry = _question_prompt(question_text, ideal_answer, qid)
+        key = evaluation_cache.make_key(
+            qid, entry.question, entry.ideal_answer, answer_text, PROMPT_VERSION, STRUCTURED_MODEL_NAME
+        )
+        cached = await evaluation_cache.aget(key)
+        if cached:
+            return (*cached, STAGE_CACHE)
+        try:
+            evaluation_result = await aevaluate_answer(
+                entry.question, entry.ideal_answer, answer_text, question_id=qid
+            )
+            score, feedback = float(evaluation_result['score']), evaluation_result['feedback']
+            await evaluation_cache.aput(key, score, feedback, PROMPT_VERSION, STRUCTURED_MODEL_NAME)
+            return score, feedback, STAGE_LLM
+        except Exception as e:
+            # Throttling and outages would hit the fallback model too and
+            # only double the calls; the job is retried later instead.
+            if rate_limiter.is_retryable(e):
+                raise
+            # Fallback to old method if structured evaluation fails
+            metrics.observe_fallback('structured_error')
+    else:
+        # Fallback to old method if no ideal answer available
+        metrics.observe_fallback('no_ideal_answer')
+    key = evaluation_cache.make_key(qid, question_text, '', answer_text, PROMPT_VERSION, FALLBACK_MODEL_NAME)
+    cached = await evaluation_cache.aget(key)
+    if cached:
+        return (*cached, STAGE_CACHE)
+    chat_model = get_chat_model()
+    score, feedback, parsed = await aevaluate_short_answer(question_text, answer_text, chat_model)
+    # An unparseable reply is not a grade worth serving again.
+    if parsed:
+        await evaluation_cache.aput(key, score, feedback, PROMPT_VERSION, FALLBACK_MODEL_NAME)
+    return score, feedback, STAGE_LLM
+
+
+def _with_usage(result: dict, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0) -> dict:
+    """Add latency and token counts to an answer result and record it in ``metrics``."""
+    result.update({
+        'latency_ms': round(seconds * 1000, 1),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
     })
+    metrics.observe_answer(result['stage'], result['status'], seconds)
+    return result
+
 
-def evaluate_candidate_answers(answers: List[dict]) -> List[dict]:
+def score_locally(ans: dict, prescore: bool = True) -> Optional[dict]:
+    """
+    Score an answer without the model, if possible.
+
+    Multiple choice answers are scored against the answer key, and the
+    result's 'key_version' is the version of that key (see ``answer_keys``);
+    text answers are pre-scored when ``prescore`` is set (see
+    :func:`prescoring.prescore`).
+    Returns the result (as in :func:`aevaluate_candidate_answers`), or None
+    for an answer that needs the model.
+    """
+    started = time.perf_counter()
+    qtype = ans.get('type')
+    if qtype == 'mc':
+        selected = ans.get('selected') or ''
+        score, feedback = evaluate_multiple_choice(ans.get('id'), selected)
+        result = {'score': score, 'feedback': feedback, 'status': 'completed', 'stage': STAGE_ANSWER_KEY,
+                  'key_version': answer_keys.key_version(ans.get('id'))}
+    elif qtype == 'text':
+        settled = _prescore_text_answer(ans) if prescore else None
+        if not settled:
+            return None
+        result = {'score': settled[0], 'feedback': settled[1], 'status': 'completed', 'stage': STAGE_PRESCORE}
+    else:
+        result = {'score': 0.0, 'feedback': "Unknown question type", 'status': 'completed',
+                  'stage': STAGE_ANSWER_KEY}
+    return _with_usage(result, time.perf_counter() - started)
+
+
+async def _agrade_combined(answers: List[dict], results: List[dict], pending: dict):
+    """
+    Try to grade the pending text answers that have an ideal answer in one
+    request.  On success their results are filled in and they are removed
+    from ``pending``; on failure everything is left for per-answer grading.
+    """
+    ideal_answers = answer_keys.ideal_answers()
+
+    def resolve(index: int, score: float, feedback: str, stage: str, seconds: float, tokens=(0, 0)):
+        results[index] = _with_usage(
+            {'score': score, 'feedback': feedback, 'status': 'completed', 'stage': stage}, seconds, *tokens
+        )
+        pending.pop(index).close()
+
+    indexes, items, keys = [], [], []
+    for index in list(pending):
+        ans = answers[index]
+        if ans.get('id') not in ideal_answers:
+            continue
+        started = time.perf_counter()
+        # The registry's question text, as in the per-answer prompt.
+        ideal = ideal_answers[ans['id']]
+        item = (ideal['question'], ideal['ideal_answer'], ans.get('answer') or '')
+        key = evaluation_cache.make_key(ans['id'], *item, COMBINED_PROMPT_VERSION, STRUCTURED_MODEL_NAME)
+        cached = await evaluation_cache.aget(key)
+        if cached:
+            resolve(index, *cached, STAGE_CACHE, time.perf_counter() - started)
+            continue
+        indexes.append(index)
+        items.append(item)
+        keys.append(key)
+    if len(indexes) < 2:
+        return
+    started = time.perf_counter()
+    try:
+        with metrics.track_usage() as usage:
+            grades = await aevaluate_answers_combined(items, structured_model())
+    except Exception as e:
+        print(f"Combined grading failed, falling back to per-answer grading: {e}")
+        metrics.observe_fallback('combined_error')
+        return
+    seconds = time.perf_counter() - started
+    # One request graded them all: its tokens are shared out evenly.
+    shares = [
+        (usage.prompt_tokens // len(indexes) + (n < usage.prompt_tokens % len(indexes)),
+         usage.completion_tokens // len(indexes) + (n < usage.completion_tokens % len(indexes)))
+        for n in range(len(indexes))
+    ]
+    for index, key, (score, feedback), tokens in zip(indexes, keys, grades, shares):
+        await evaluation_cache.aput(key, score, feedback, COMBINED_PROMPT_VERSION, STRUCTURED_MODEL_NAME)
+        resolve(index, score, feedback, STAGE_LLM, seconds, tokens)
+
+
+async def aevaluate_candidate_answers(
+    answers: List[dict],
+    max_concurrency: int = EVALUATION_LLM_CONCURRENCY,
+    grading_mode: str = EVALUATION_GRADING_MODE,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    on_results: Optional[Callable[[List[Tuple[int, dict]]], None]] = None,
+) -> List[dict]:
+    """
+    Evaluate a submission with all text answers graded concurrently.
+
+    Multiple choice answers are scored locally, and so are text answers that
+    :func:`prescoring.prescore` settles (blank, "không biết", ...); the other
+    text answers are sent to the model at most ``max_concurrency`` at a
+    time, or together in one request when ``grading_mode`` is 'combined'.
+    Results keep the order of ``answers``.  Each result has 'score',
+    'feedback', 'status' and 'stage', the step that produced the score (see
+    ``STAGES``); an answer whose evaluation raised gets status 'failed' (and
+    score None) without affecting the others.  Results also carry
+    'latency_ms' and the 'prompt_tokens'/'completion_tokens' the model
+    reported for that answer (0 when no model was called), and 'key_version',
+    the version of the answer key or ideal answer the answer was scored
+    against (None if the question has neither).
+
+    As answers get their result (the locally scored ones together, those
+    graded in a combined request together, then each graded text answer),
+    ``on_results`` is called with their ``(index, result)`` pairs and
+    ``on_progress(done, total)`` with the running count.  Both are called on
+    the event loop, so they should be quick.
+    """
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+    done = 0
+
+    def report(items: List[Tuple[int, dict]]):
+        nonlocal done
+        if not items:
+            return
+        done += len(items)
+        for index, result in items:
+            ans = answers[index]
+            if result['status'] == 'completed':
+                result.setdefault('key_version', answer_keys.version_for(ans.get('type'), ans.get('id')))
+        if on_results:
+            on_results(items)
+        if on_progress:
+            on_progress(done, len(answers))
+
+    async def evaluate_text(index: int, ans: dict) -> dict:
+        async with semaphore:
+            started = time.perf_counter()
+            # Each text answer runs in its own task, so the usage tracked
+            # here is that of this answer's model calls only.
+            with metrics.track_usage() as usage:
+                try:
+                    score, feedback, stage = await _aevaluate_text_answer(ans)
+                    result = {'score': score, 'feedback': feedback, 'status': 'completed', 'stage': stage}
+                except Exception as e:
+                    result = {'score': None, 'feedback': f"Không thể đánh giá câu trả lời: {e}", 'status': 'failed',
+                              'stage': STAGE_LLM}
+            _with_usage(result, time.perf_counter() - started, usage.prompt_tokens, usage.completion_tokens)
+        report([(index, result)])
+        return result
+
+    results: List[dict] = [None] * len(answers)
+    pending = {}
+    with metrics.stage(metrics.STAGE_LOCAL_SCORING):
+        for index, ans in enumerate(answers):
+            result = score_locally(ans)
+            if result is None:
+                pending[index] = evaluate_text(index, ans)
+            else:
+                results[index] = result
+
+    report([(index, result) for index, result in enumerate(results) if result is not None])
+    if grading_mode == 'combined' and pending:
+        before = set(pending)
+        with metrics.stage(metrics.STAGE_COMBINED_GRADING):
+            await _agrade_combined(answers, results, pending)
+        report([(index, results[index]) for index in sorted(before - set(pending))])
+    if pending:
+        with metrics.stage(metrics.STAGE_LLM_GRADING):
+            graded = await asyncio.gather(*pending.values())
+        for index, result in zip(pending, graded):
+            results[index] = result
+    return results
+
+
+def evaluate_candidate_answers(
+    answers: List[dict],
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    on_results: Optional[Callable[[List[Tuple[int, dict]]], None]] = None,
+) -> List[dict]:
     """
     Given a list of answer dicts from the API request, compute evaluation results.
 
@@ -159,45 +490,10 @@ def evaluate_candidate_answers(answers: List[dict]) -> List[dict]:
       - selected: selected letter (for multiple choice)
       - answer: text (for short answer)
 
-    Returns a list of evaluation results with fields 'score' and 'feedback'.
-    """
-    results: List[dict] = []
-    
-    # Import ideal answers
-    from ideal_answers import ideal_answers
-    
-    for ans in answers:
-        qid = ans.get('id')
-        qtype = ans.get('type')
-        
-        if qtype == 'mc':
-            selected = ans.get('selected') or ''
-            score, feedback = evaluate_multiple_choice(qid, selected)
-        elif qtype == 'text':
-            answer_text = ans.get('answer') or ''
-            question_text = ans.get('question', '')
-            
-            # Get ideal answer if available
-            ideal_answer = ""
-            if qid in ideal_answers:
-                ideal_answer = ideal_answers[qid]['ideal_answer']
-            
-            # Use new structured evaluation with ideal answer
-            if ideal_answer:
-                try:
-                    evaluation_result = evaluate_answer(question_text, ideal_answer, answer_text)
-                    score = evaluation_result['score']
-                    feedback = evaluation_result['feedback']
-                except Exception as e:
-                    # Fallback to old method if structured evaluation fails
-                    chat_model = get_chat_model()
-                    score, feedback = evaluate_short_answer(question_text, answer_text, chat_model)
-            else:
-                # Fallback to old method if no ideal answer available
-                chat_model = get_chat_model()
-                score, feedback = evaluate_short_answer(question_text, answer_text, chat_model)
-        else:
-            score, feedback = 0.0, "Unknown question type"
-            
-        results.append({'score': score, 'feedback': feedback})
-    return results
\ No newline at end of file
+    Returns a list of evaluation results with fields 'score', 'feedback',
+    'status' and 'stage', in the same order as ``answers``.  Text answers are evaluated
+    concurrently (see :func:`aevaluate_candidate_answers`) on the calling
+    thread's persistent event loop, so model connections are reused between
+    candidates; it must be called from a thread without a running event loop.
+    """
+    return llm_clients.run(aevaluate_candidate_answers(answers, on_progress=on_progress, on_results=on_results))
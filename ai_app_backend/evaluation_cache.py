@@ -0,0 +1,186 @@
+"""
+Persistent cache of LLM grading results.
+
+The models are called with ``temperature=0``, so the same question, ideal
+answer and candidate answer graded with the same prompt and model give the
+same result.  Blank answers, "không biết" and copy-pasted text are common,
+as are duplicate submissions, so caching these results saves both cost and
+latency.
+
+Entries live in the ``evaluation_cache`` table.  They expire after
+``EVALUATION_CACHE_TTL_SECONDS`` and the least recently used entries are
+evicted once the table holds more than ``EVALUATION_CACHE_MAX_ENTRIES``.
+
+A hit is a read only: its hit count and last use are kept in memory and
+written in one batch with the next store (see :func:`flush_hits`), so the
+grading loop never commits on a hit.  :func:`aget` and :func:`aput` run the
+lookups on a worker thread for use from the event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import bindparam, delete, func, select, update
+
+import models, database
+
+
+EVALUATION_CACHE_ENABLED = os.getenv('EVALUATION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+EVALUATION_CACHE_MAX_ENTRIES = int(os.getenv('EVALUATION_CACHE_MAX_ENTRIES', '50000'))
+EVALUATION_CACHE_TTL_SECONDS = int(os.getenv('EVALUATION_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+
+# Eviction runs once every this many stores rather than on every write.
+EVICTION_INTERVAL = 100
+
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+# key -> (hits not yet written, time of the last one)
+_pending_hits = {}
+
+_HIT_UPDATE = (
+    update(models.EvaluationCacheEntry.__table__)
+    .where(models.EvaluationCacheEntry.__table__.c.key == bindparam('b_key'))
+    .values(
+        hit_count=models.EvaluationCacheEntry.__table__.c.hit_count + bindparam('b_hits'),
+        last_used_at=bindparam('b_last_used_at'),
+    )
+)
+
+
+def normalize(text: Optional[str]) -> str:
+    """Normalize text for hashing: Unicode NFC, lower case, collapsed whitespace."""
+    text = unicodedata.normalize('NFC', text or '')
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def make_key(question_id, question: str, ideal_answer: str, candidate_answer: str,
+             prompt_version: str, model: str) -> str:
+    """Return the cache key for one grading request."""
+    payload = json.dumps(
+        [question_id, normalize(question), normalize(ideal_answer), normalize(candidate_answer),
+         prompt_version, model],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _count(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def get(key: str) -> Optional[Tuple[float, str]]:
+    """Return the cached (score, feedback) for ``key``, or None on a miss."""
+    if not EVALUATION_CACHE_ENABLED:
+        return None
+    db = database.SessionLocal()
+    try:
+        entry = db.get(models.EvaluationCacheEntry, key)
+        now = datetime.utcnow()
+        if entry is None or entry.created_at < now - timedelta(seconds=EVALUATION_CACHE_TTL_SECONDS):
+            _count('misses')
+            return None
+        with _lock:
+            _counters['hits'] += 1
+            hits, _ = _pending_hits.get(key, (0, None))
+            _pending_hits[key] = (hits + 1, now)
+        return entry.score, entry.feedback
+    finally:
+        db.close()
+
+
+async def aget(key: str) -> Optional[Tuple[float, str]]:
+    """Async variant of :func:`get`, run on a worker thread."""
+    if not EVALUATION_CACHE_ENABLED:
+        return None
+    return await asyncio.to_thread(get, key)
+
+
+def put(key: str, score: float, feedback: str, prompt_version: str, model: str):
+    """Store a grading result, replacing any previous entry for ``key``."""
+    if not EVALUATION_CACHE_ENABLED:
+        return
+    db = database.SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.merge(models.EvaluationCacheEntry(
+            key=key, model=model, prompt_version=prompt_version, score=score,
+            feedback=feedback, hit_count=0, created_at=now, last_used_at=now,
+        ))
+        db.commit()
+        flush_hits(db)
+        with _lock:
+            _counters['stores'] += 1
+            due = _counters['stores'] % EVICTION_INTERVAL == 0
+        if due:
+            evict(db)
+    finally:
+        db.close()
+
+
+async def aput(key: str, score: float, feedback: str, prompt_version: str, model: str):
+    """Async variant of :func:`put`, run on a worker thread."""
+    if not EVALUATION_CACHE_ENABLED:
+        return
+    await asyncio.to_thread(put, key, score, feedback, prompt_version, model)
+
+
+def flush_hits(db) -> int:
+    """Write the hit counts and last-use times recorded since the last flush.  Returns entries updated."""
+    with _lock:
+        pending = list(_pending_hits.items())
+        _pending_hits.clear()
+    if not pending:
+        return 0
+    try:
+        db.execute(_HIT_UPDATE, [
+            {'b_key': key, 'b_hits': hits, 'b_last_used_at': last_used_at}
+            for key, (hits, last_used_at) in pending
+        ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        # Kept for the next flush; only the LRU order depends on them.
+        with _lock:
+            for key, (hits, last_used_at) in pending:
+                newer_hits, newer = _pending_hits.get(key, (0, last_used_at))
+                _pending_hits[key] = (hits + newer_hits, max(newer, last_used_at))
+        print(f"Could not record evaluation cache hits: {e}")
+        return 0
+    return len(pending)
+
+
+def evict(db, max_entries: int = None, ttl_seconds: int = None) -> int:
+    """Delete expired entries and trim the table to ``max_entries`` by LRU."""
+    flush_hits(db)
+    entry = models.EvaluationCacheEntry
+    max_entries = EVALUATION_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    ttl_seconds = EVALUATION_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+
+    removed = db.execute(
+        delete(entry).where(entry.created_at < datetime.utcnow() - timedelta(seconds=ttl_seconds))
+    ).rowcount
+    excess = db.scalar(select(func.count()).select_from(entry)) - max_entries
+    if excess > 0:
+        oldest = select(entry.key).order_by(entry.last_used_at).limit(excess)
+        removed += db.execute(delete(entry).where(entry.key.in_(oldest))).rowcount
+    db.commit()
+    _count('evictions', removed)
+    return removed
+
+
+def stats() -> dict:
+    """Return hit/miss counters for this process."""
+    with _lock:
+        counters = dict(_counters)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else 0.0
+    counters['enabled'] = EVALUATION_CACHE_ENABLED
+    return counters
@@ -0,0 +1,242 @@
+"""
+Streaming export of candidates and their evaluations.
+
+Rows are read with ``yield_per`` (a server-side cursor where the driver has
+one) and encoded chunk by chunk, so memory use does not grow with the size
+of the table.  Only the selected columns are fetched, as plain rows, without
+building ORM objects or Pydantic models.
+
+Two row levels are supported:
+
+  - ``candidates``: one row per candidate with the stored aggregate scores;
+  - ``answers``: one row per answer, with the candidate columns repeated.
+
+Formats are CSV (UTF-8 with a BOM so Excel reads Vietnamese text
+correctly), JSON Lines and XLSX.  XLSX needs the optional ``openpyxl``
+package; the workbook is built in write-only mode in a temporary file and
+then streamed from disk.
+
+Environment variables:
+  - EXPORT_CHUNK_SIZE: rows fetched per round trip and encoded per chunk
+    (default 1000).
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+
+import database
+import models
+import queries
+
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+
+FORMATS = ('csv', 'jsonl', 'xlsx')
+ROW_LEVELS = ('candidates', 'answers')
+MEDIA_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+_cand = models.Candidate
+_answer = models.Answer
+
+# Exportable columns by name, in default order.
+CANDIDATE_COLUMNS = {
+    'id': _cand.id,
+    'name': _cand.name,
+    'phone': _cand.phone,
+    'created_at': _cand.created_at,
+    'evaluation_status': _cand.evaluation_status,
+    'answers_evaluated': _cand.answers_evaluated,
+    'answers_total': _cand.answers_total,
+    'mc_correct_count': _cand.mc_correct_count,
+    'text_score_sum': _cand.text_score_sum,
+    'overall_score': _cand.overall_score,
+    'completed_at': _cand.completed_at,
+}
+ANSWER_COLUMNS = {
+    'question_id': _answer.question_id,
+    'question': _answer.question,
+    'type': _answer.type,
+    'selected': _answer.selected,
+    'answer_text': _answer.answer_text,
+    'answer_score': _answer.evaluation_score,
+    'answer_feedback': _answer.evaluation_feedback,
+    'answer_status': _answer.evaluation_status,
+    'answer_stage': _answer.evaluation_stage,
+    'answer_latency_ms': _answer.evaluation_latency_ms,
+    'answer_prompt_tokens': _answer.evaluation_prompt_tokens,
+    'answer_completion_tokens': _answer.evaluation_completion_tokens,
+    'answer_key_version': _answer.answer_key_version,
+}
+
+# XLSX cells are limited to 32767 characters.
+_XLSX_MAX_CELL = 32767
+
+
+class ExportError(ValueError):
+    """Raised for an export that cannot be produced (bad columns, missing openpyxl)."""
+
+
+def available_columns(rows: str = 'candidates') -> List[str]:
+    if rows == 'answers':
+        return list(CANDIDATE_COLUMNS) + list(ANSWER_COLUMNS)
+    return list(CANDIDATE_COLUMNS)
+
+
+def resolve_columns(rows: str = 'candidates', columns: Optional[Sequence[str]] = None) -> List[str]:
+    """Validate a column selection (default: every column of the row level)."""
+    if rows not in ROW_LEVELS:
+        raise ExportError(f"Unknown row level '{rows}'; expected one of {', '.join(ROW_LEVELS)}")
+    allowed = available_columns(rows)
+    if not columns:
+        return allowed
+    unknown = [name for name in columns if name not in allowed]
+    if unknown:
+        raise ExportError(f"Unknown column(s) {', '.join(unknown)}; available: {', '.join(allowed)}")
+    return list(dict.fromkeys(columns))
+
+
+def check_format(fmt: str):
+    """Fail early, before any response is started, if ``fmt`` cannot be produced."""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'; expected one of {', '.join(FORMATS)}")
+    if fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ExportError("XLSX export requires openpyxl (pip install openpyxl)")
+
+
+def export_query(
+    rows: str,
+    columns: Sequence[str],
+    evaluation_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    """Build the SELECT of the export: candidates (and answers) in id order."""
+    expressions = {**CANDIDATE_COLUMNS, **ANSWER_COLUMNS}
+    stmt = select(*[expressions[name].label(name) for name in columns])
+    if rows == 'answers':
+        stmt = stmt.select_from(_cand).join(_answer, _answer.candidate_id == _cand.id)
+        order = (_cand.id, _answer.question_id, _answer.id)
+    else:
+        stmt = stmt.select_from(_cand)
+        order = (_cand.id,)
+    stmt = stmt.where(*queries.candidate_filters(evaluation_status, created_from, created_to))
+    return stmt.order_by(*order)
+
+
+def iter_rows(stmt, chunk_size: int = EXPORT_CHUNK_SIZE, engine=None) -> Iterator[tuple]:
+    """Yield the rows of ``stmt`` fetched ``chunk_size`` at a time on a dedicated connection."""
+    engine = engine if engine is not None else database.engine
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(stmt)
+        for row in result:
+            yield tuple(row)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _xlsx_value(value):
+    if isinstance(value, str) and len(value) > _XLSX_MAX_CELL:
+        return value[:_XLSX_MAX_CELL]
+    return value
+
+
+def encode_csv(columns: Sequence[str], rows: Iterable[tuple], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    first = True
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue().encode('utf-8-sig' if first else 'utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+            first = False
+    yield buffer.getvalue().encode('utf-8-sig' if first else 'utf-8')
+
+
+def encode_jsonl(columns: Sequence[str], rows: Iterable[tuple], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(
+            {name: _json_value(value) for name, value in zip(columns, row)}, ensure_ascii=False
+        ))
+        if len(lines) >= chunk_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def encode_xlsx(columns: Sequence[str], rows: Iterable[tuple], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('export')
+    sheet.append(list(columns))
+    for row in rows:
+        sheet.append([_xlsx_value(value) for value in row])
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            data = f.read(64 * 1024)
+            if not data:
+                break
+            yield data
+
+
+ENCODERS = {'csv': encode_csv, 'jsonl': encode_jsonl, 'xlsx': encode_xlsx}
+
+
+def stream(
+    fmt: str = 'csv',
+    rows: str = 'candidates',
+    columns: Optional[Sequence[str]] = None,
+    evaluation_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+    engine=None,
+) -> Iterator[bytes]:
+    """
+    Validate the export and return an iterator over the encoded file.
+
+    Validation happens immediately; the query runs when iteration starts,
+    so the iterator can be handed to a ``StreamingResponse`` as is.
+    """
+    check_format(fmt)
+    names = resolve_columns(rows, columns)
+    stmt = export_query(rows, names, evaluation_status, created_from, created_to)
+    return ENCODERS[fmt](names, iter_rows(stmt, chunk_size, engine), chunk_size)
+
+
+def filename(fmt: str, rows: str = 'candidates') -> str:
+    return f"{rows}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
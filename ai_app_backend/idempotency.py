@@ -0,0 +1,113 @@
+"""
+Deduplication of retried candidate submissions.
+
+When a candidate's connection is flaky the frontend retries
+``POST /candidates``.  A submission is taken to be a retry of an earlier
+one when
+
+  - it has the same ``Idempotency-Key`` header, or
+  - it has no key and the same submission hash (a SHA-256 of the phone
+    number and the answers, see :func:`submission_hash`) as a submission
+    stored less than IDEMPOTENCY_WINDOW_SECONDS ago whose evaluation has
+    not failed, so that a candidate can submit again after a failure.
+
+A retry gets the original submission's response; nothing is written and no
+evaluation is started.  Reusing a key for a different submission is an
+error (:class:`IdempotencyConflict`).
+
+The key column has a unique index, so two copies of a request that pass the
+lookup at the same time, in any API process, cannot both be stored: the
+second insert fails and is answered as a replay.  The hash is indexed
+together with ``created_at`` and is not unique, since the same answers may
+be submitted again after the window; its deduplication is best effort.
+
+Environment variables:
+  - IDEMPOTENCY_WINDOW_SECONDS: how long after a submission a retry without
+    a key is recognised by its hash (default 86400; 0 turns that off).
+"""
+
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+
+IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv('IDEMPOTENCY_WINDOW_SECONDS', '86400'))
+
+# Longest Idempotency-Key accepted (a UUID is 36 characters).
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused for a different submission."""
+
+
+def normalize_phone(phone: str) -> str:
+    """Drop spaces, dots, dashes and brackets so that formatting differences do not matter."""
+    return re.sub(r'[^\d+]', '', phone or '')
+
+
+def submission_hash(phone: str, answers: Sequence) -> str:
+    """
+    SHA-256 of the phone number and the answers.
+
+    ``answers`` are ``schemas.AnswerCreate`` objects or dicts of the same
+    shape.  Question texts are left out (they come from the form, not the
+    candidate) and answers are taken in question order, so the hash only
+    changes when what the candidate entered changes.
+    """
+    entries = []
+    for answer in answers:
+        if not isinstance(answer, dict):
+            answer = answer.model_dump()
+        entries.append([
+            answer.get('type'), answer.get('id'),
+            (answer.get('selected') or '').strip().upper(),
+            (answer.get('answer') or '').strip(),
+        ])
+    entries.sort(key=lambda entry: (str(entry[0]), entry[1] if entry[1] is not None else -1))
+    payload = json.dumps([normalize_phone(phone), entries], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def original_query(key: Optional[str], digest: str, now: Optional[datetime] = None):
+    """
+    SELECT the id and hash of the submission this one repeats: the one with
+    ``key``, or without a key the latest one inside the window with the same
+    hash whose evaluation has not failed.
+    """
+    cand = models.Candidate
+    if key:
+        return select(cand.id, cand.submission_hash).where(cand.idempotency_key == key)
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=IDEMPOTENCY_WINDOW_SECONDS)
+    return (
+        select(cand.id, cand.submission_hash)
+        .where(cand.submission_hash == digest, cand.created_at >= cutoff,
+               cand.evaluation_status != 'failed')
+        .order_by(cand.created_at.desc())
+        .limit(1)
+    )
+
+
+async def find_original(db: AsyncSession, key: Optional[str], digest: str) -> Optional[int]:
+    """
+    Return the id of the submission this one is a retry of, or None.
+
+    Raises :class:`IdempotencyConflict` when ``key`` was used for a
+    submission with different answers.
+    """
+    if not key and IDEMPOTENCY_WINDOW_SECONDS <= 0:
+        return None
+    row = (await db.execute(original_query(key, digest))).first()
+    if row is None:
+        return None
+    if key and row.submission_hash != digest:
+        raise IdempotencyConflict("Idempotency-Key was already used for a different submission")
+    return row.id
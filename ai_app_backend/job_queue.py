@@ -0,0 +1,284 @@
+"""
+Durable evaluation job queue backed by the ``evaluation_jobs`` table.
+
+Every submission gets one job row in the same transaction as the candidate.
+Workers (the API process itself, or standalone ``python -m worker``
+processes) claim jobs in batches with a lease.  A job whose lease expires
+without being completed is claimable again, so evaluations survive process
+restarts and crashed workers.  A job whose lease expires on its last
+attempt is failed by the next dispatcher sweep (:func:`fail_expired`).
+
+A claim returns a :class:`Lease` carrying the lease token.  The worker
+renews the lease while the evaluation runs (:func:`renew`) and passes the
+token to :func:`complete`, :func:`fail` or :func:`release`; those only act
+while the token still holds the lease, so a worker whose lease expired and
+was taken over cannot overwrite the new holder's state.
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import and_, case, or_, select, update, func, true
+from sqlalchemy.orm import Session
+
+import models
+
+
+# How long a claimed job stays invisible to other workers.
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '300'))
+
+# Number of claims after which a failing job is given up on.
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+
+
+class Lease(NamedTuple):
+    """A claimed job: its id, its candidate and the token that holds the lease."""
+
+    job_id: int
+    candidate_id: int
+    token: str
+
+
+class LeaseLost(Exception):
+    """Raised when a job's lease has expired and was taken over by another worker."""
+
+
+def make_worker_id(prefix: str = "worker") -> str:
+    """Return a unique identifier for the current worker process."""
+    return f"{prefix}@{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue(db: Session, candidate_id: int) -> models.EvaluationJob:
+    """Add a queued job for ``candidate_id``.  The caller commits."""
+    job = models.EvaluationJob(candidate_id=candidate_id, status='queued')
+    db.add(job)
+    return job
+
+
+def queued_count_query():
+    """Query counting the jobs waiting for a worker."""
+    return select(func.count()).select_from(models.EvaluationJob).where(models.EvaluationJob.status == 'queued')
+
+
+def queued_count(db: Session) -> int:
+    """Return the number of jobs waiting for a worker."""
+    return db.scalar(queued_count_query())
+
+
+def _claimable(now: datetime):
+    job = models.EvaluationJob
+    return or_(
+        job.status == 'queued',
+        and_(job.status == 'leased', job.lease_expires_at < now, job.attempts < JOB_MAX_ATTEMPTS),
+    )
+
+
+def _lease(db: Session, condition, worker_id: str, limit: int, lease_seconds: int) -> List[Lease]:
+    job = models.EvaluationJob
+    now = datetime.utcnow()
+    ids = db.scalars(
+        select(job.id).where(condition, _claimable(now)).order_by(job.id).limit(limit)
+    ).all()
+    if not ids:
+        return []
+
+    # Re-check the claimable condition in the UPDATE so that two workers
+    # racing for the same rows cannot both win; the lease token tells us
+    # which rows are ours afterwards.
+    token = f"{worker_id}/{uuid.uuid4().hex[:8]}"
+    db.execute(
+        update(job)
+        .where(job.id.in_(ids), _claimable(now))
+        .values(
+            status='leased',
+            leased_by=token,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=job.attempts + 1,
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    rows = db.execute(
+        select(job.id, job.candidate_id).where(job.leased_by == token).order_by(job.id)
+    ).all()
+    return [Lease(row.id, row.candidate_id, token) for row in rows]
+
+
+def claim_batch(
+    db: Session, worker_id: str, batch_size: int, lease_seconds: int = JOB_LEASE_SECONDS
+) -> List[Lease]:
+    """Lease up to ``batch_size`` jobs."""
+    if batch_size <= 0:
+        return []
+    return _lease(db, true(), worker_id, batch_size, lease_seconds)
+
+
+def claim_candidate(
+    db: Session, candidate_id: int, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS
+) -> Optional[Lease]:
+    """Lease the job of a specific candidate, if claimable."""
+    claimed = _lease(
+        db, models.EvaluationJob.candidate_id == candidate_id, worker_id, 1, lease_seconds
+    )
+    return claimed[0] if claimed else None
+
+
+def _held(lease: Lease):
+    job = models.EvaluationJob
+    return and_(job.id == lease.job_id, job.status == 'leased', job.leased_by == lease.token)
+
+
+def renew(db: Session, lease: Lease, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """Extend a lease by ``lease_seconds`` from now.  Returns False if it was lost."""
+    now = datetime.utcnow()
+    renewed = db.execute(
+        update(models.EvaluationJob)
+        .where(_held(lease))
+        .values(lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return renewed == 1
+
+
+def release(db: Session, lease: Lease):
+    """Give a leased job back to the queue without counting the attempt."""
+    job = models.EvaluationJob
+    db.execute(
+        update(job)
+        .where(_held(lease))
+        .values(status='queued', leased_by=None, lease_expires_at=None,
+                attempts=case((job.attempts > 0, job.attempts - 1), else_=0))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def complete(db: Session, lease: Lease):
+    """Mark a job as done.  Raises :class:`LeaseLost` if ``lease`` no longer holds it."""
+    done = db.execute(
+        update(models.EvaluationJob)
+        .where(_held(lease))
+        .values(status='done', lease_expires_at=None, last_error=None, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if not done:
+        raise LeaseLost(f"Lease on job {lease.job_id} was lost")
+
+
+def fail(db: Session, lease: Lease, error: str, max_attempts: int = JOB_MAX_ATTEMPTS) -> bool:
+    """
+    Record a failed attempt.
+
+    The job is re-queued (and its candidate put back to 'pending') while it
+    has attempts left.  Returns True if the job will be retried.  Raises
+    :class:`LeaseLost`, changing nothing, if ``lease`` no longer holds the
+    job.
+    """
+    job = models.EvaluationJob
+    failed = db.execute(
+        update(job)
+        .where(_held(lease))
+        .values(
+            status=case((job.attempts < max_attempts, 'queued'), else_='failed'),
+            leased_by=None,
+            lease_expires_at=None,
+            last_error=error[:1000],
+            updated_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not failed:
+        db.rollback()
+        raise LeaseLost(f"Lease on job {lease.job_id} was lost")
+    retry = db.scalar(select(job.status).where(job.id == lease.job_id)) == 'queued'
+    db.execute(
+        update(models.Candidate)
+        .where(models.Candidate.id == lease.candidate_id)
+        .values(evaluation_status='pending' if retry else 'failed')
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return retry
+
+
+def fail_expired(db: Session, max_attempts: int = JOB_MAX_ATTEMPTS) -> List[int]:
+    """
+    Mark as failed the jobs whose lease expired on their last attempt, i.e.
+    whose worker died and which will never be claimed again.
+
+    Each job is failed with a guarded UPDATE, so a lease renewed in the
+    meantime or a job failed by another process at the same time is left
+    alone.  Returns the candidate ids of the jobs failed here; the caller
+    updates those candidates and commits.
+    """
+    job = models.EvaluationJob
+    now = datetime.utcnow()
+    exhausted = and_(job.status == 'leased', job.lease_expires_at < now, job.attempts >= max_attempts)
+    failed = []
+    for job_id, candidate_id in db.execute(select(job.id, job.candidate_id).where(exhausted)).all():
+        updated = db.execute(
+            update(job).where(job.id == job_id, exhausted)
+            .values(status='failed', last_error='lease expired', leased_by=None, lease_expires_at=None,
+                    updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            failed.append(candidate_id)
+    return failed
+
+
+def recover_orphans(db: Session, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """
+    Requeue work left behind by dead processes.
+
+    - candidates still 'pending'/'processing' without a job row (submitted
+      before the job table existed) get a fresh job;
+    - jobs whose lease has expired go back to 'queued', or to 'failed' once
+      they have used up their attempts;
+    - 'processing' candidates whose job is no longer leased are reset to
+      'pending'.
+
+    Returns the number of jobs (re)queued.
+    """
+    job = models.EvaluationJob
+    cand = models.Candidate
+    now = datetime.utcnow()
+
+    jobless = db.scalars(
+        select(cand.id)
+        .outerjoin(job, job.candidate_id == cand.id)
+        .where(cand.evaluation_status.in_(('pending', 'processing')), job.id.is_(None))
+    ).all()
+    for candidate_id in jobless:
+        enqueue(db, candidate_id)
+
+    expired = and_(job.status == 'leased', job.lease_expires_at < now)
+    exhausted = fail_expired(db, max_attempts)
+    if exhausted:
+        db.execute(
+            update(cand).where(cand.id.in_(exhausted)).values(evaluation_status='failed')
+            .execution_options(synchronize_session=False)
+        )
+    requeued = db.execute(
+        update(job).where(expired)
+        .values(status='queued', leased_by=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    db.execute(
+        update(cand)
+        .where(
+            cand.evaluation_status == 'processing',
+            cand.id.in_(select(job.candidate_id).where(job.status == 'queued')),
+        )
+        .values(evaluation_status='pending')
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return len(jobless) + requeued
@@ -0,0 +1,185 @@
+"""
+Process-wide registry of LLM chat clients.
+
+Chat models are created lazily on first use and reused afterwards, so
+importing the backend does not need an API key and grading an answer does
+not build a new client.  All models share keep-alive HTTP connection pools
+with configurable limits and timeouts:
+
+  - one ``httpx.Client`` per process for synchronous calls;
+  - one ``httpx.AsyncClient`` per event loop for async calls.  Async
+    connections belong to the loop that opened them, so each evaluation
+    thread runs its coroutines on a persistent loop (:func:`run`) instead
+    of a new one per candidate, and keeps its pool warm between candidates.
+
+Environment variables:
+  - OPENAI_BASE_URL: OpenAI-compatible endpoint (default: the OpenAI API).
+  - LLM_TIMEOUT_SECONDS / LLM_CONNECT_TIMEOUT_SECONDS: request and connect
+    timeouts.
+  - LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE_CONNECTIONS: pool size per
+    client; LLM_KEEPALIVE_EXPIRY_SECONDS: idle time before a pooled
+    connection is closed.
+  - LLM_MAX_RETRIES: retries done by the OpenAI client itself (default 0:
+    ``rate_limiter`` retries with backoff and adapts concurrency).
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Callable, Dict, Optional
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv('LLM_CONNECT_TIMEOUT_SECONDS', '10'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', str(LLM_MAX_CONNECTIONS)))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('LLM_KEEPALIVE_EXPIRY_SECONDS', '60'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '0'))
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.Client] = None
+_openai_client: Optional[openai.OpenAI] = None
+_async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+# Models used outside an event loop, and per loop (each bound to that
+# loop's async client).
+_models: Dict[str, ChatOpenAI] = {}
+_loop_models: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, ChatOpenAI]]" = weakref.WeakKeyDictionary()
+_thread_state = threading.local()
+
+# Test and benchmark hook: when set, returns the chat model to use for a
+# model name instead of a real ChatOpenAI.
+_override: Optional[Callable[[str], object]] = None
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def http_client() -> httpx.Client:
+    """Return the process-wide HTTP client for synchronous model calls."""
+    global _http_client
+    with _lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.Client(timeout=_timeout(), limits=_limits())
+        return _http_client
+
+
+def async_http_client(loop: Optional[asyncio.AbstractEventLoop] = None) -> httpx.AsyncClient:
+    """Return the HTTP client for async model calls on ``loop`` (default: the running loop)."""
+    loop = loop or asyncio.get_running_loop()
+    with _lock:
+        client = _async_http_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(timeout=_timeout(), limits=_limits())
+            _async_http_clients[loop] = client
+        return client
+
+
+def openai_client() -> openai.OpenAI:
+    """Return the process-wide OpenAI SDK client (files and batches), on the shared HTTP pool."""
+    global _openai_client
+    if not os.getenv('OPENAI_API_KEY'):
+        raise RuntimeError(
+            'OPENAI_API_KEY environment variable is not set. Please set your OpenAI API key.'
+        )
+    pool = http_client()
+    with _lock:
+        if _openai_client is None:
+            _openai_client = openai.OpenAI(
+                base_url=OPENAI_BASE_URL, timeout=_timeout(), max_retries=LLM_MAX_RETRIES, http_client=pool
+            )
+        return _openai_client
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def chat_model(model_name: str):
+    """
+    Return the shared chat model for ``model_name`` (temperature 0).
+
+    Inside a running event loop the model's async calls use that loop's
+    connection pool; elsewhere only its synchronous client is meant to be
+    used.  Raises RuntimeError if OPENAI_API_KEY is not set.
+    """
+    if _override is not None:
+        return _override(model_name)
+    loop = _current_loop()
+    with _lock:
+        models = _loop_models.setdefault(loop, {}) if loop else _models
+        model = models.get(model_name)
+    if model is not None:
+        return model
+
+    if not os.getenv('OPENAI_API_KEY'):
+        raise RuntimeError(
+            'OPENAI_API_KEY environment variable is not set. Please set your OpenAI API key.'
+        )
+    if loop:
+        async_client = async_http_client(loop)
+    else:
+        # Never used outside a loop, but must not be langchain's default
+        # client, which is shared by every loop in the process.
+        async_client = httpx.AsyncClient(timeout=_timeout(), limits=_limits())
+    model = ChatOpenAI(
+        model=model_name,
+        temperature=0,
+        base_url=OPENAI_BASE_URL,
+        timeout=_timeout(),
+        max_retries=LLM_MAX_RETRIES,
+        http_client=http_client(),
+        http_async_client=async_client,
+    )
+    with _lock:
+        return models.setdefault(model_name, model)
+
+
+def run(coro):
+    """
+    Run ``coro`` to completion on this thread's persistent event loop.
+
+    Used instead of ``asyncio.run`` by evaluation threads so that pooled
+    async connections survive from one candidate to the next.
+    """
+    loop = getattr(_thread_state, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_state.loop = loop
+    return loop.run_until_complete(coro)
+
+
+def set_override(factory: Optional[Callable[[str], object]]):
+    """Route :func:`chat_model` to ``factory(model_name)``; pass None to undo."""
+    global _override
+    _override = factory
+
+
+def reset():
+    """Forget every cached model and close the synchronous client."""
+    global _http_client, _openai_client
+    with _lock:
+        _openai_client = None
+        _models.clear()
+        _loop_models.clear()
+        _async_http_clients.clear()
+        client, _http_client = _http_client, None
+    if client is not None:
+        client.close()
@@ -11,30 +11,55 @@ Environment variables:
   - EMPLOYER_PASSWORD: password for employer login (default 'password').
   - EMPLOYER_TOKEN: static token issued to authenticated employers.  If not
     provided, a random UUID is generated at startup.
+  - METRICS_TOKEN: bearer token a Prometheus scraper may use for
+    ``GET /metrics`` instead of the employer token (default: none).
+  - EVALUATION_MAX_WORKERS / EVALUATION_QUEUE_SIZE: size of the background
+    evaluation pool and of its backlog (see ``background_tasks``).
+  - EVALUATION_MODE: 'inline' (default) to evaluate in the API process, or
+    'worker' to leave queued jobs to ``python -m worker`` processes.
+  - IDEMPOTENCY_WINDOW_SECONDS: how long retried submissions are recognised
+    (see ``idempotency``).
 """
 
+import asyncio
+import json
 import os
+import time
 import uuid
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Literal, Optional, Union
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Load environment variables from .env file
 load_dotenv()
 
-import models, schemas, database, evaluation
-from ideal_answers import ideal_answers
+import models, schemas, database, answer_keys, evaluation, evaluation_cache, exports, idempotency, job_queue, metrics, prescoring, queries, rate_limiter, status_cache, status_events
 import background_tasks
 
 
-# Create database tables on application startup
-models.Base.metadata.create_all(bind=database.engine)
+# Create database tables (and any columns added since) on application startup
+database.ensure_schema(models.Base.metadata)
 
 
-app = FastAPI(title="AI Candidate Evaluation Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Latest answer keys and ideal answers, read once; also builds the prompt registry.
+    answer_keys.load()
+    background_tasks.startup_background_evaluation()
+    yield
+    # Let queued and in-flight evaluations finish instead of dropping them.
+    await asyncio.to_thread(background_tasks.shutdown_background_evaluation)
+
+
+app = FastAPI(title="AI Candidate Evaluation Backend", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -43,90 +68,278 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    # Lets the dashboard read pagination cursors and the form see replayed submissions
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record the latency of every request in ``metrics``, labelled by route template."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe_http_request(
+        request.method, route.path if route is not None else "unmatched",
+        response.status_code, time.perf_counter() - started,
+    )
+    return response
+
+
 # Read employer credentials from environment or use defaults
 EMPLOYER_USERNAME = os.getenv('EMPLOYER_USERNAME', 'admin')
 EMPLOYER_PASSWORD = os.getenv('EMPLOYER_PASSWORD', 'password')
 EMPLOYER_TOKEN = os.getenv('EMPLOYER_TOKEN', str(uuid.uuid4()))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
 
 
-def get_db():
-    """Dependency injection for obtaining a database session."""
-    db = database.SessionLocal()
-    try:
+async def get_async_db():
+    """Dependency injection for obtaining an async database session."""
+    async with database.AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def _evaluation_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Hệ thống đang quá tải, vui lòng thử lại sau ít phút.",
+        headers={"Retry-After": "30"},
+    )
+
+
+def _submission_response(candidate_id: int) -> schemas.SubmissionResponse:
+    return schemas.SubmissionResponse(
+        id=candidate_id,
+        message="Đơn ứng tuyển đã được gửi thành công! Hệ thống đang đánh giá câu trả lời của bạn.",
+        status="pending"
+    )
+
+
+async def _original_submission(db: AsyncSession, key: Optional[str], digest: str) -> Optional[int]:
+    try:
+        return await idempotency.find_original(db, key, digest)
+    except idempotency.IdempotencyConflict as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
 
 
 @app.post("/candidates", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.SubmissionResponse)
-def create_candidate(candidate: schemas.CandidateCreate, db: Session = Depends(get_db)):
+async def create_candidate(
+    candidate: schemas.CandidateCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Create a new candidate submission with immediate response.
     
     The submission is saved immediately and evaluation is processed in the background.
-    Returns submission ID and status immediately.
+    Returns submission ID and status immediately.  When the evaluation
+    backlog is full the submission is rejected with 503 so the client can
+    retry later.
+
+    A retry (same ``Idempotency-Key`` header or, without one, the same phone
+    and answers as a recent submission whose evaluation has not failed) gets
+    the original response, marked with ``Idempotent-Replayed: true``, and is
+    neither stored nor evaluated again.  See ``idempotency``.
     """
-    # Create candidate record
-    cand = models.Candidate(name=candidate.name, phone=candidate.phone, evaluation_status='pending')
-    db.add(cand)
-    db.commit()
-    db.refresh(cand)
+    if idempotency_key is not None:
+        idempotency_key = idempotency_key.strip() or None
+    if idempotency_key and len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be at most {idempotency.MAX_KEY_LENGTH} characters",
+        )
+    digest = idempotency.submission_hash(candidate.phone, candidate.answers)
+    match = 'key' if idempotency_key else 'hash'
+
+    # A retry is answered even when the backlog is full.
+    original_id = await _original_submission(db, idempotency_key, digest)
+    if original_id is not None:
+        metrics.observe_deduplicated(match)
+        response.headers["Idempotent-Replayed"] = "true"
+        return _submission_response(original_id)
+
+    if await background_tasks.abacklog_full(db):
+        raise _evaluation_busy()
 
-    # Save answers without evaluation initially
+    # Multiple choice answers are scored right away against the answer key;
+    # the others are saved without evaluation and left to the background task.
     answers_data = []
+    answer_rows = []
     for ans_data in candidate.answers:
         # Get ideal answer for text questions
         ideal_answer = None
-        if ans_data.type == 'text' and ans_data.id in ideal_answers:
-            ideal_answer = ideal_answers[ans_data.id]['ideal_answer']
-        
-        answer_record = models.Answer(
-            candidate_id=cand.id,
-            question_id=ans_data.id,
-            question=ans_data.question,
-            type=ans_data.type,
-            selected=ans_data.selected,
-            answer_text=ans_data.answer,
-            evaluation_status='pending',
-            ideal_answer=ideal_answer,
-        )
-        db.add(answer_record)
-        answers_data.append(ans_data.model_dump())
-    
-    db.commit()
+        ideal = answer_keys.ideal_answer(ans_data.id) if ans_data.type == 'text' else None
+        if ideal:
+            ideal_answer = ideal['ideal_answer']
+
+        row = {
+            'question_id': ans_data.id,
+            'question': ans_data.question,
+            'type': ans_data.type,
+            'selected': ans_data.selected,
+            'answer_text': ans_data.answer,
+            'evaluation_status': 'pending',
+            'ideal_answer': ideal_answer,
+            'evaluation_score': None,
+            'evaluation_feedback': None,
+            'evaluation_stage': None,
+            'evaluation_latency_ms': None,
+            'evaluation_prompt_tokens': None,
+            'evaluation_completion_tokens': None,
+            'answer_key_version': None,
+        }
+        result = evaluation.score_locally(ans_data.model_dump(), prescore=False) if ans_data.type == 'mc' else None
+        if result is not None:
+            row.update({
+                'evaluation_status': result['status'],
+                'evaluation_score': result['score'],
+                'evaluation_feedback': result['feedback'],
+                'evaluation_stage': result['stage'],
+                'evaluation_latency_ms': result['latency_ms'],
+                'evaluation_prompt_tokens': result['prompt_tokens'],
+                'evaluation_completion_tokens': result['completion_tokens'],
+                'answer_key_version': result.get('key_version'),
+            })
+        else:
+            answers_data.append(ans_data.model_dump())
+        answer_rows.append(row)
+    answers_evaluated = len(answer_rows) - len(answers_data)
+
+    # Everything below is written in one transaction: the candidate row
+    # (its id comes back via RETURNING), all answers in one executemany
+    # INSERT, and the evaluation job.
+    async with database.async_write_lock():
+        # Checked again under the lock, so that two copies of a request
+        # arriving together at this process do not both get past the lookup
+        # above.  Across processes the unique Idempotency-Key index decides.
+        original_id = await _original_submission(db, idempotency_key, digest)
+        if original_id is not None:
+            metrics.observe_deduplicated(match)
+            response.headers["Idempotent-Replayed"] = "true"
+            return _submission_response(original_id)
+
+        try:
+            candidate_id = await db.scalar(
+                insert(models.Candidate)
+                .values(
+                    name=candidate.name, phone=candidate.phone, evaluation_status='pending',
+                    answers_evaluated=answers_evaluated, answers_total=len(answer_rows),
+                    idempotency_key=idempotency_key, submission_hash=digest,
+                )
+                .returning(models.Candidate.id)
+            )
+        except IntegrityError:
+            # Another process stored a submission with the same key since
+            # the lookup; the unique index turned this one away.
+            await db.rollback()
+            original_id = await _original_submission(db, idempotency_key, digest) if idempotency_key else None
+            if original_id is None:
+                raise
+            metrics.observe_deduplicated(match)
+            response.headers["Idempotent-Replayed"] = "true"
+            return _submission_response(original_id)
+        for row in answer_rows:
+            row['candidate_id'] = candidate_id
+        if answer_rows:
+            await db.execute(insert(models.Answer), answer_rows)
+
+        # Record the evaluation job together with the answers so it survives restarts
+        job_queue.enqueue(db, candidate_id)
+        await db.commit()
+    status_cache.put(candidate_id, 'pending', answers_evaluated, len(answer_rows))
     
-    # Start background evaluation
-    background_tasks.start_background_evaluation(cand.id, answers_data)
+    # Start background evaluation of the answers still to score
+    background_tasks.start_background_evaluation(candidate_id, answers_data)
     
-    return schemas.SubmissionResponse(
-        id=cand.id,
-        message="Đơn ứng tuyển đã được gửi thành công! Hệ thống đang đánh giá câu trả lời của bạn.",
-        status="pending"
-    )
+    return _submission_response(candidate_id)
+
+
+async def _current_status(candidate_id: int) -> Optional[status_cache.Status]:
+    """Return a candidate's status and progress from the status cache, or the database on a miss."""
+    current = status_cache.get(candidate_id)
+    if current is None:
+        async with database.AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(
+                    models.Candidate.evaluation_status, models.Candidate.answers_evaluated,
+                    models.Candidate.answers_total,
+                ).where(models.Candidate.id == candidate_id)
+            )).first()
+        if row is not None:
+            current = status_cache.Status(*row)
+            status_cache.put(candidate_id, *current)
+    return current
 
 
 @app.get("/candidates/{candidate_id}/status")
-def get_evaluation_status(candidate_id: int, db: Session = Depends(get_db)):
+async def get_evaluation_status(
+    candidate_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Get the evaluation status for a specific candidate submission.
+
+    Served from the status cache when possible.  ``completed`` and ``total``
+    give the "N of M answers evaluated" progress.  The response carries an
+    ETag, which changes with the progress; a request whose If-None-Match
+    matches it gets 304 Not Modified with no body.
     """
-    candidate = db.query(models.Candidate).filter(models.Candidate.id == candidate_id).first()
-    if not candidate:
+    current = await _current_status(candidate_id)
+    if current is None:
         raise HTTPException(status_code=404, detail="Candidate not found")
-    
-    return {
-        "id": candidate.id,
-        "status": candidate.evaluation_status,
-        "message": {
-            "pending": "Đang chờ đánh giá...",
-            "processing": "Đang đánh giá câu trả lời...",
-            "completed": "Đánh giá hoàn thành!",
-            "failed": "Có lỗi xảy ra trong quá trình đánh giá."
-        }.get(candidate.evaluation_status, "Trạng thái không xác định")
-    }
+
+    etag = status_cache.etag(candidate_id, current)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return status_events.status_event(candidate_id, current.status, **current.progress())
+
+
+@app.get("/candidates/{candidate_id}/events")
+async def stream_evaluation_status(candidate_id: int):
+    """
+    Stream evaluation status changes as server-sent events.
+
+    The first event carries the current status; later events are pushed as
+    the evaluation moves on (``processing`` events include ``completed``
+    and ``total`` answer counts).  The stream ends after ``completed`` or
+    ``failed``.  Use this instead of polling ``/candidates/{id}/status``.
+    """
+    # Subscribe before reading the current status so no transition is missed.
+    subscription = status_events.broker.subscribe(candidate_id)
+    current = await _current_status(candidate_id)
+    if current is None:
+        status_events.broker.unsubscribe(subscription)
+        raise HTTPException(status_code=404, detail="Candidate not found")
+    status_events.broker.remember(candidate_id, current.status, current.progress().get('completed'))
+
+    def format_event(event: dict) -> str:
+        return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    async def stream():
+        try:
+            yield format_event(status_events.status_event(candidate_id, current.status, **current.progress()))
+            if current.status in status_events.TERMINAL_STATUSES:
+                return
+            while True:
+                event = await subscription.get(timeout=status_events.STATUS_EVENTS_KEEPALIVE)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event)
+                if event["status"] in status_events.TERMINAL_STATUSES:
+                    return
+        finally:
+            status_events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/employer/login")
@@ -145,24 +358,173 @@ def employer_login(credentials: dict):
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
 
-@app.get("/candidates", response_model=List[schemas.CandidateOut])
-def list_candidates(
+def require_employer(
     authorization: str = Header(None, description="Bearer token for employer authentication"),
-    db: Session = Depends(get_db),
 ):
     """
-    Return all candidate submissions with their evaluated answers.
+    Dependency that checks the employer bearer token.
 
-    This endpoint requires an Authorization header with a valid bearer token.
-    If the token is invalid or missing, a 401 error is returned.
+    If the Authorization header is invalid or missing, a 401 error is returned.
     """
+    if _bearer_token(authorization) != EMPLOYER_TOKEN:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+
+def require_metrics_reader(
+    authorization: str = Header(None, description="Bearer token for the metrics scraper"),
+):
+    """Dependency that accepts the metrics token (if configured) or the employer token."""
+    token = _bearer_token(authorization)
+    if token != EMPLOYER_TOKEN and (METRICS_TOKEN is None or token != METRICS_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+
+
+def _bearer_token(authorization: Optional[str]) -> str:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing or invalid authorization header",
         )
-    token = authorization.split(" ", 1)[1]
-    if token != EMPLOYER_TOKEN:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    candidates = db.query(models.Candidate).all()
-    return candidates
\ No newline at end of file
+    return authorization.split(" ", 1)[1]
+
+
+@app.get(
+    "/candidates",
+    response_model=List[Union[schemas.CandidateOut, schemas.CandidateSummaryOut]],
+    dependencies=[Depends(require_employer)],
+)
+async def list_candidates(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit to return every candidate"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    evaluation_status: Optional[str] = Query(None, description="pending, processing, completed or failed"),
+    created_from: Optional[datetime] = Query(None, description="Only candidates created at or after this time (UTC)"),
+    created_to: Optional[datetime] = Query(None, description="Only candidates created before this time (UTC)"),
+    sort: Literal[queries.SORT_FIELDS] = Query('created_at', description="Sort key; prefix with '-' for descending"),
+    fields: Literal['full', 'summary'] = Query('full', description="'summary' leaves out the answers"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Return candidate submissions, optionally paginated and filtered.
+
+    With ``limit`` set, results are paginated by keyset on the sort key and
+    id; when more rows follow, the ``X-Next-Cursor`` response header holds
+    the cursor for the next page.  ``fields=summary`` omits answer bodies so
+    list views stay small; use ``GET /candidates/{id}`` for the details.
+
+    This endpoint requires an Authorization header with a valid bearer token.
+    If the token is invalid or missing, a 401 error is returned.
+    """
+    try:
+        stmt = queries.candidate_page(
+            sort, limit, cursor, evaluation_status, created_from, created_to,
+            with_answers=(fields == 'full'),
+        )
+    except queries.InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    rows = (await db.execute(stmt)).all()
+
+    if limit is not None and len(rows) == limit:
+        last_candidate, last_key = rows[-1]
+        response.headers["X-Next-Cursor"] = queries.encode_cursor(sort, last_key, last_candidate.id)
+
+    schema = schemas.CandidateOut if fields == 'full' else schemas.CandidateSummaryOut
+    return [schema.model_validate(candidate) for candidate, _ in rows]
+
+
+@app.get("/candidates/export", dependencies=[Depends(require_employer)])
+def export_candidates(
+    format: Literal[exports.FORMATS] = Query('csv', description="csv, jsonl or xlsx"),
+    rows: Literal[exports.ROW_LEVELS] = Query('candidates', description="One row per candidate or per answer"),
+    columns: Optional[str] = Query(None, description="Comma-separated column names; omit for all"),
+    evaluation_status: Optional[str] = Query(None, description="pending, processing, completed or failed"),
+    created_from: Optional[datetime] = Query(None, description="Only candidates created at or after this time (UTC)"),
+    created_to: Optional[datetime] = Query(None, description="Only candidates created before this time (UTC)"),
+):
+    """
+    Download candidates (or their answers) as a CSV, JSONL or XLSX file.
+
+    Rows are streamed from a database cursor as they are encoded, so memory
+    use stays flat however many candidates match.  Unknown columns, or
+    ``format=xlsx`` without openpyxl installed, return 400 before anything
+    is streamed.
+
+    Requires the employer bearer token.
+    """
+    selected = [name.strip() for name in columns.split(',') if name.strip()] if columns else None
+    try:
+        body = exports.stream(format, rows, selected, evaluation_status, created_from, created_to)
+    except exports.ExportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return StreamingResponse(
+        body,
+        media_type=exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{exports.filename(format, rows)}"'},
+    )
+
+
+@app.get(
+    "/candidates/leaderboard",
+    response_model=List[schemas.LeaderboardEntry],
+    dependencies=[Depends(require_employer)],
+)
+async def candidate_leaderboard(
+    response: Response,
+    limit: int = Query(20, ge=1, le=500, description="Number of candidates per page"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Return evaluated candidates ranked by their stored overall score.
+
+    Only completed candidates are ranked.  Uses the precomputed aggregates
+    and the (evaluation_status, overall_score, id) index, so no answers are
+    read.  Pagination works as for ``GET /candidates``.
+    """
+    try:
+        stmt = queries.leaderboard_page(limit, cursor)
+    except queries.InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    candidates = (await db.scalars(stmt)).all()
+    if len(candidates) == limit:
+        last = candidates[-1]
+        response.headers["X-Next-Cursor"] = queries.encode_cursor('leaderboard', last.overall_score, last.id)
+    return candidates
+
+
+@app.get("/candidates/{candidate_id}", response_model=schemas.CandidateOut, dependencies=[Depends(require_employer)])
+async def get_candidate(candidate_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Return one candidate with their evaluated answers (requires auth)."""
+    candidate = (await db.scalars(queries.candidate_detail(candidate_id))).first()
+    if not candidate:
+        raise HTTPException(status_code=404, detail="Candidate not found")
+    return candidate
+
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_reader)])
+def prometheus_metrics():
+    """
+    Prometheus metrics of this API process: evaluation stage timings, model
+    latency and tokens, fallback counts and HTTP request latency (see
+    ``metrics``).  Requires ``METRICS_TOKEN`` or the employer token.
+    """
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/admin/metrics", dependencies=[Depends(require_employer)])
+def admin_metrics():
+    """
+    Return runtime counters of this API process, e.g. evaluation cache hits,
+    the share of LLM calls avoided by pre-scoring and the state of the
+    OpenAI rate limiter.
+
+    Requires the employer bearer token.
+    """
+    return {
+        "evaluation_cache": evaluation_cache.stats(),
+        "prescoring": prescoring.stats(),
+        "status_cache": status_cache.cache.stats(),
+        "status_event_subscribers": status_events.broker.subscriber_count(),
+        "llm_rate_limiter": rate_limiter.stats(),
+    }
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Maintenance commands for the backend.
+
+Run from the ``ai_app_backend`` directory::
+
+    python manage.py backfill-scores [--all]
+    python manage.py reevaluate prepare --workdir DIR [--question-id N ...]
+    python manage.py reevaluate submit --workdir DIR [--runner local]
+    python manage.py reevaluate ingest --workdir DIR
+    python manage.py export [--format csv|jsonl|xlsx] [--rows answers] [--output FILE]
+    python manage.py answer-key list
+    python manage.py answer-key set QUESTION_ID OPTION [--rescore]
+    python manage.py ideal-answer set QUESTION_ID TEXT [--question TEXT]
+    python manage.py rescore-mc [--question-id N ...] [--all]
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import models, database, answer_keys, exports, scores
+import batch_reevaluation
+
+
+def backfill_scores(args):
+    db = database.SessionLocal()
+    try:
+        updated = scores.backfill(db, only_missing=not args.all)
+    finally:
+        db.close()
+    print(f"Stored aggregate scores for {updated} candidates")
+
+
+def reevaluate(args):
+    try:
+        summary = _reevaluate_step(args)
+    except batch_reevaluation.BatchError as e:
+        raise SystemExit(str(e))
+    print(json.dumps(summary, indent=2))
+
+
+def _reevaluate_step(args):
+    if args.step == 'submit':
+        summary = batch_reevaluation.submit(args.workdir, runner=args.runner, concurrency=args.concurrency)
+    else:
+        db = database.SessionLocal()
+        try:
+            if args.step == 'prepare':
+                summary = batch_reevaluation.prepare(
+                    db, args.workdir, question_ids=args.question_id,
+                    candidate_status=None if args.candidate_status == 'any' else args.candidate_status,
+                    chunk_size=args.chunk_size,
+                )
+            else:
+                summary = batch_reevaluation.ingest(db, args.workdir, chunk_size=args.chunk_size)
+        finally:
+            db.close()
+    return summary
+
+
+def export(args):
+    columns = [name.strip() for name in args.columns.split(',') if name.strip()] if args.columns else None
+    try:
+        body = exports.stream(
+            args.format, args.rows, columns, args.status, args.created_from, args.created_to,
+            chunk_size=args.chunk_size,
+        )
+    except exports.ExportError as e:
+        raise SystemExit(str(e))
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in body:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+        else:
+            out.flush()
+
+
+def _running_processes_notice(what: str, follow_up: str):
+    refresh = answer_keys.ANSWER_KEYS_REFRESH_SECONDS
+    if refresh > 0:
+        when = f"switch to the new {what} within {refresh:g} seconds"
+    else:
+        when = f"keep the old {what} until they are restarted (ANSWER_KEYS_REFRESH_SECONDS=0)"
+    print(f"Running API and worker processes {when}; answers they score before that keep the old version. "
+          f"{follow_up}")
+
+
+def answer_key(args):
+    db = database.SessionLocal()
+    try:
+        answer_keys.load(db)
+        if args.action == 'set':
+            try:
+                version = answer_keys.set_answer_key(db, args.question_id, args.option)
+            except answer_keys.AnswerKeyError as e:
+                raise SystemExit(str(e))
+            print(f"Question {args.question_id}: answer key version {version}")
+            if args.rescore:
+                print(json.dumps(answer_keys.rescore_mc(db, [args.question_id]), indent=2))
+            _running_processes_notice(
+                "key", f"Run `manage.py rescore-mc --question-id {args.question_id}` after that to re-score them."
+            )
+            return
+        keys = dict(sorted(answer_keys.mc_answer_keys().items()))
+        ideal = {
+            question_id: {'version': entry['version'], 'question': entry['question']}
+            for question_id, entry in sorted(answer_keys.ideal_answers().items())
+        }
+        print(json.dumps({'mc': keys, 'text': ideal}, indent=2, ensure_ascii=False))
+    finally:
+        db.close()
+
+
+def ideal_answer(args):
+    db = database.SessionLocal()
+    try:
+        answer_keys.load(db)
+        version = answer_keys.set_ideal_answer(db, args.question_id, args.text, question=args.question)
+    except answer_keys.AnswerKeyError as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
+    print(f"Question {args.question_id}: ideal answer version {version}")
+    _running_processes_notice("ideal answer", "Re-evaluate them with `manage.py reevaluate` if needed.")
+
+
+def rescore_mc(args):
+    db = database.SessionLocal()
+    try:
+        answer_keys.load(db)
+        summary = answer_keys.rescore_mc(db, args.question_id, only_stale=not args.all)
+    except answer_keys.AnswerKeyError as e:
+        raise SystemExit(str(e))
+    finally:
+        db.close()
+    print(json.dumps(summary, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend maintenance commands.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill-scores", help="store aggregate scores for evaluated candidates")
+    backfill.add_argument("--all", action="store_true",
+                          help="recompute every completed candidate, not only those without aggregates")
+    backfill.set_defaults(func=backfill_scores)
+
+    reeval = commands.add_parser("reevaluate", help="re-score stored text answers with the Batch API")
+    steps = reeval.add_subparsers(dest="step", required=True)
+    prepare = steps.add_parser("prepare", help="write batch request files for the selected answers")
+    prepare.add_argument("--question-id", type=int, action="append",
+                         help="only this question (repeatable; default: all text questions)")
+    prepare.add_argument("--candidate-status", default="completed",
+                         help="only candidates with this evaluation status, or 'any' (default: completed)")
+    submit = steps.add_parser("submit", help="submit the request files that were not submitted yet")
+    submit.add_argument("--runner", choices=("openai", "local"), default="openai",
+                        help="'local' runs the requests with the chat client instead of the Batch API")
+    submit.add_argument("--concurrency", type=int, default=8, help="requests in flight with the local runner")
+    ingest = steps.add_parser("ingest", help="download finished batches and apply their results")
+    for step in (prepare, submit, ingest):
+        step.add_argument("--workdir", required=True, help="directory holding the batch files")
+    for step in (prepare, ingest):
+        step.add_argument("--chunk-size", type=int, default=batch_reevaluation.BATCH_CHUNK_SIZE,
+                          help="answers read or results applied per chunk")
+    reeval.set_defaults(func=reevaluate)
+
+    export_cmd = commands.add_parser("export", help="write candidates or answers as CSV, JSONL or XLSX")
+    export_cmd.add_argument("--format", choices=exports.FORMATS, default="csv")
+    export_cmd.add_argument("--rows", choices=exports.ROW_LEVELS, default="candidates",
+                            help="one row per candidate (default) or per answer")
+    export_cmd.add_argument("--columns", help="comma-separated column names (default: all)")
+    export_cmd.add_argument("--status", help="only candidates with this evaluation status")
+    export_cmd.add_argument("--created-from", type=datetime.fromisoformat,
+                            help="only candidates created at or after this time (UTC, ISO 8601)")
+    export_cmd.add_argument("--created-to", type=datetime.fromisoformat,
+                            help="only candidates created before this time (UTC, ISO 8601)")
+    export_cmd.add_argument("--output", help="file to write (default: standard output)")
+    export_cmd.add_argument("--chunk-size", type=int, default=exports.EXPORT_CHUNK_SIZE,
+                            help="rows fetched and encoded per chunk")
+    export_cmd.set_defaults(func=export)
+
+    key_cmd = commands.add_parser("answer-key", help="show or correct the multiple choice answer keys")
+    key_actions = key_cmd.add_subparsers(dest="action", required=True)
+    key_actions.add_parser("list", help="show the current keys and ideal answer versions")
+    key_set = key_actions.add_parser("set", help="store a new version of a question's key")
+    key_set.add_argument("question_id", type=int)
+    key_set.add_argument("option", help="correct option letter")
+    key_set.add_argument("--rescore", action="store_true", help="re-score the question's stored answers")
+    key_cmd.set_defaults(func=answer_key)
+
+    ideal_cmd = commands.add_parser("ideal-answer", help="correct the ideal answer of a text question")
+    ideal_actions = ideal_cmd.add_subparsers(dest="action", required=True)
+    ideal_set = ideal_actions.add_parser("set", help="store a new version of a question's ideal answer")
+    ideal_set.add_argument("question_id", type=int)
+    ideal_set.add_argument("text", help="the new ideal answer")
+    ideal_set.add_argument("--question", help="new question text (default: unchanged)")
+    ideal_cmd.set_defaults(func=ideal_answer)
+
+    rescore = commands.add_parser("rescore-mc", help="re-score stored multiple choice answers against the current keys")
+    rescore.add_argument("--question-id", type=int, action="append",
+                         help="only this question (repeatable; default: all with a key)")
+    rescore.add_argument("--all", action="store_true",
+                         help="also answers already scored with the current key version")
+    rescore.set_defaults(func=rescore_mc)
+
+    args = parser.parse_args(argv)
+    database.ensure_schema(models.Base.metadata)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
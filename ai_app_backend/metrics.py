@@ -0,0 +1,179 @@
+"""
+Prometheus metrics for the evaluation pipeline and the API.
+
+The hooks below are called by ``evaluation`` and ``background_tasks`` around
+each stage of an evaluation, by ``main`` for every HTTP request, and record
+into the process-wide ``prometheus_client`` registry:
+
+  - evaluation_stage_seconds{stage}: time spent per pipeline stage, from
+    ``queue_wait`` (submission to start of evaluation) through local
+    scoring, model grading and ``db_write`` to ``total``;
+  - evaluation_answer_seconds{stage} / evaluation_answers_total{stage,
+    status}: per-answer latency and count by the step that scored it;
+  - llm_request_seconds / llm_requests_total{grader, model, outcome} and
+    llm_tokens_total{grader, model, kind}: every model call, including the
+    wait for the rate limiter, and the tokens the model reported;
+  - evaluation_fallbacks_total{reason}: answers that fell back from the
+    structured grader to the plain one (or from combined to per-answer
+    grading);
+  - evaluation_candidates_total{outcome}, http_request_duration_seconds
+    {method, route, status};
+  - submissions_deduplicated_total{match}: retried submissions answered
+    with the original response, by ``key`` or ``hash`` match.
+
+Model usage is also attributed to the answer being graded: while a
+:class:`Usage` is active (see :func:`track_usage`) every call made from the
+same asyncio task adds its tokens to it, and the totals are stored with the
+answer.
+
+``GET /metrics`` serves the registry of the API process; a standalone worker
+serves its own with ``python -m worker --metrics-port``.
+"""
+
+import contextlib
+import contextvars
+import time
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest, start_http_server
+
+
+# Pipeline stages timed by evaluation_stage_seconds.
+STAGE_QUEUE_WAIT = 'queue_wait'
+STAGE_LOCAL_SCORING = 'local_scoring'
+STAGE_COMBINED_GRADING = 'combined_grading'
+STAGE_LLM_GRADING = 'llm_grading'
+STAGE_DB_WRITE = 'db_write'
+STAGE_TOTAL = 'total'
+
+# Graders, i.e. the prompts a model call was made with.
+GRADER_STRUCTURED = 'structured'
+GRADER_FALLBACK = 'fallback'
+GRADER_COMBINED = 'combined'
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_QUEUE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_SECONDS = Histogram(
+    'evaluation_stage_seconds', "Time spent in each stage of a candidate evaluation",
+    ['stage'], buckets=_QUEUE_BUCKETS,
+)
+ANSWER_SECONDS = Histogram(
+    'evaluation_answer_seconds', "Time to score one answer, by the step that scored it",
+    ['stage'], buckets=_LATENCY_BUCKETS,
+)
+ANSWERS = Counter('evaluation_answers_total', "Answers evaluated", ['stage', 'status'])
+CANDIDATES = Counter('evaluation_candidates_total', "Candidate evaluations finished", ['outcome'])
+FALLBACKS = Counter('evaluation_fallbacks_total', "Answers graded by a fallback path", ['reason'])
+LLM_SECONDS = Histogram(
+    'llm_request_seconds', "Model call latency, including rate limiter waits and retries",
+    ['grader', 'model'], buckets=_LATENCY_BUCKETS,
+)
+LLM_REQUESTS = Counter('llm_requests_total', "Model calls", ['grader', 'model', 'outcome'])
+LLM_TOKENS = Counter('llm_tokens_total', "Tokens reported by the model", ['grader', 'model', 'kind'])
+HTTP_SECONDS = Histogram(
+    'http_request_duration_seconds', "HTTP request latency until the response starts",
+    ['method', 'route', 'status'], buckets=_LATENCY_BUCKETS,
+)
+DEDUPLICATED = Counter(
+    'submissions_deduplicated_total', "Retried submissions answered with the original response", ['match'],
+)
+EVALUATIONS_PENDING = Gauge('evaluation_executor_pending', "Evaluations running or queued in this process")
+
+
+class Usage:
+    """Model calls, tokens and seconds accumulated for one answer."""
+
+    __slots__ = ('calls', 'prompt_tokens', 'completion_tokens', 'seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, seconds: float):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.seconds += seconds
+
+
+_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar('evaluation_usage', default=None)
+
+
+@contextlib.contextmanager
+def track_usage():
+    """Collect the model usage of the current task into a fresh :class:`Usage`."""
+    usage = Usage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def _token_counts(response) -> tuple:
+    usage = getattr(response, 'usage_metadata', None) or {}
+    return int(usage.get('input_tokens') or 0), int(usage.get('output_tokens') or 0)
+
+
+def observe_llm_call(grader: str, model, seconds: float, response=None, error: Optional[BaseException] = None):
+    """Record one model call (``response`` on success, ``error`` on failure)."""
+    model_name = getattr(model, 'model_name', None) or type(model).__name__
+    LLM_SECONDS.labels(grader, model_name).observe(seconds)
+    LLM_REQUESTS.labels(grader, model_name, 'error' if error is not None else 'ok').inc()
+    prompt_tokens, completion_tokens = _token_counts(response) if response is not None else (0, 0)
+    if prompt_tokens:
+        LLM_TOKENS.labels(grader, model_name, 'prompt').inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(grader, model_name, 'completion').inc(completion_tokens)
+    usage = _usage.get()
+    if usage is not None:
+        usage.add(prompt_tokens, completion_tokens, seconds)
+
+
+def observe_answer(stage: str, status: str, seconds: Optional[float]):
+    ANSWERS.labels(stage, status).inc()
+    if seconds is not None:
+        ANSWER_SECONDS.labels(stage).observe(seconds)
+
+
+def observe_fallback(reason: str):
+    FALLBACKS.labels(reason).inc()
+
+
+def observe_candidate(outcome: str):
+    CANDIDATES.labels(outcome).inc()
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Time the enclosed block as pipeline stage ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(max(seconds, 0.0))
+
+
+def observe_deduplicated(match: str):
+    DEDUPLICATED.labels(match).inc()
+
+
+def observe_http_request(method: str, route: str, status: int, seconds: float):
+    HTTP_SECONDS.labels(method, route, str(status)).observe(seconds)
+
+
+def render() -> tuple:
+    """Return (body, content type) of the Prometheus text exposition."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def serve(port: int):
+    """Serve the registry on ``port`` from a background thread (for workers)."""
+    start_http_server(port)
@@ -6,7 +6,7 @@ candidate's response and any evaluation generated by the AI system.
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from database import Base
@@ -22,12 +22,40 @@ class Candidate(Base):
     phone = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     evaluation_status = Column(String, default='pending')  # pending, processing, completed, failed
+    # Progress: answers scored so far (written as each one is) out of all answers
+    answers_evaluated = Column(Integer, nullable=True)
+    answers_total = Column(Integer, nullable=True)
+
+    # Aggregate scores, stored when background evaluation finishes (see scores.py)
+    mc_correct_count = Column(Integer, nullable=True)
+    text_score_sum = Column(Float, nullable=True)
+    overall_score = Column(Float, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    # Deduplication of retried submissions (see idempotency.py): the client's
+    # Idempotency-Key, if it sent one, and a hash of the phone and answers
+    idempotency_key = Column(String, nullable=True)
+    submission_hash = Column(String(64), nullable=True)
 
     # One-to-many relationship to answers
     answers = relationship(
         "Answer", back_populates="candidate", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Serves GET /candidates?sort=total_score: ORDER BY overall_score, id
+        Index("ix_candidates_overall_score_id", "overall_score", "id"),
+        # Serves the leaderboard: WHERE evaluation_status = 'completed'
+        # ORDER BY overall_score DESC, id DESC
+        Index("ix_candidates_status_overall_score_id", "evaluation_status", "overall_score", "id"),
+        # Serve idempotency.original_query.  An Idempotency-Key identifies
+        # one submission for good, so the database rejects a second insert
+        # with it whichever process does it; the hash only deduplicates
+        # within a window, so equality on it is followed by created_at.
+        Index("uq_candidates_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_candidates_submission_hash_created", "submission_hash", "created_at"),
+    )
+
 
 class Answer(Base):
     """Stores an individual answer to a question from a candidate."""
@@ -55,6 +83,100 @@ class Answer(Base):
     
     # Evaluation status tracking
     evaluation_status = Column(String, default='pending')  # pending, processing, completed, failed
+    # Step that produced the score: answer_key, prescore, cache, llm or batch
+    evaluation_stage = Column(String, nullable=True)
+    # Time taken to score the answer and tokens the model reported for it
+    # (0 when no model was called)
+    evaluation_latency_ms = Column(Float, nullable=True)
+    evaluation_prompt_tokens = Column(Integer, nullable=True)
+    evaluation_completion_tokens = Column(Integer, nullable=True)
+    # Version of the answer key (multiple choice) or ideal answer (text)
+    # the answer was scored against (see answer_keys.py)
+    answer_key_version = Column(Integer, nullable=True)
 
     # Relationship back to candidate
-    candidate = relationship("Candidate", back_populates="answers")
\ No newline at end of file
+    candidate = relationship("Candidate", back_populates="answers")
+
+    __table_args__ = (
+        # Evaluation write-back and lookups address answers by candidate and question
+        Index("ix_answers_candidate_question", "candidate_id", "question_id"),
+    )
+
+
+class EvaluationJob(Base):
+    """
+    Durable evaluation work item for a candidate.
+
+    Jobs are claimed by workers with a time-limited lease.  A job whose lease
+    expires (e.g. because its worker died) becomes claimable again.
+    """
+
+    __tablename__ = "evaluation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    candidate_id = Column(Integer, ForeignKey("candidates.id"), nullable=False, unique=True)
+    status = Column(String, nullable=False, default='queued')  # queued, leased, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    leased_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_evaluation_jobs_status_lease", "status", "lease_expires_at"),
+    )
+
+
+class AnswerKey(Base):
+    """
+    Correct option of a multiple choice question.  Corrections add a new
+    version; the highest version of each question is the one in use.
+    """
+
+    __tablename__ = "answer_keys"
+
+    id = Column(Integer, primary_key=True)
+    question_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    correct_option = Column(String(1), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("question_id", "version", name="uq_answer_keys_question_version"),
+    )
+
+
+class IdealAnswer(Base):
+    """Question text and ideal answer of a text question, versioned like :class:`AnswerKey`."""
+
+    __tablename__ = "ideal_answers"
+
+    id = Column(Integer, primary_key=True)
+    question_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    question = Column(String, nullable=False)
+    ideal_answer = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("question_id", "version", name="uq_ideal_answers_question_version"),
+    )
+
+
+class EvaluationCacheEntry(Base):
+    """
+    Cached LLM grading result, keyed by a hash of everything that determines
+    the model's output (see ``evaluation_cache.make_key``).
+    """
+
+    __tablename__ = "evaluation_cache"
+
+    key = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False)
+    score = Column(Float, nullable=True)
+    feedback = Column(String, nullable=True)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
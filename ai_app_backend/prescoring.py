@@ -0,0 +1,173 @@
+"""
+Local pre-scoring of text answers.
+
+Many answers need no model to be graded: blank answers, "không biết", a
+word or two, or the question pasted back.  :func:`prescore` settles those
+with deterministic rules, and answers that are near-copies of the ideal
+answer, using a TF-IDF weighted character n-gram similarity computed with
+NumPy.  Everything else returns None and goes to the LLM.
+
+The IDF weights come from the current questions and ideal answers (see
+``answer_keys``), so n-grams shared by every question ("khách", "bạn")
+count little and the similarity follows the content of the answer.
+
+Environment variables:
+  - PRESCORING_ENABLED: set to "false" to send every answer to the LLM.
+  - PRESCORING_MIN_WORDS: answers with fewer words score 0 (default 3).
+  - PRESCORING_COPY_SIMILARITY: similarity to the question above which an
+    answer counts as a copy of it and scores 0 (default 0.9).
+  - PRESCORING_IDEAL_SIMILARITY: similarity to the ideal answer above which
+    an answer gets the full score (default 0.9).
+"""
+
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+PRESCORING_ENABLED = os.getenv('PRESCORING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PRESCORING_MIN_WORDS = int(os.getenv('PRESCORING_MIN_WORDS', '3'))
+PRESCORING_COPY_SIMILARITY = float(os.getenv('PRESCORING_COPY_SIMILARITY', '0.9'))
+PRESCORING_IDEAL_SIMILARITY = float(os.getenv('PRESCORING_IDEAL_SIMILARITY', '0.9'))
+
+MAX_SCORE = 2.0
+NGRAM_RANGE = (3, 5)
+
+FEEDBACK_EMPTY = "Ứng viên chưa trả lời câu hỏi này."
+FEEDBACK_UNKNOWN = "Ứng viên cho biết không biết câu trả lời. Hãy tìm hiểu thêm về công việc và thử đưa ra cách xử lý của mình."
+FEEDBACK_TOO_SHORT = "Câu trả lời quá ngắn để đánh giá. Hãy trình bày cụ thể suy nghĩ và cách làm của bạn."
+FEEDBACK_COPY = "Câu trả lời chỉ lặp lại câu hỏi, chưa nêu ý kiến của ứng viên."
+FEEDBACK_IDEAL = "Câu trả lời đầy đủ, đúng trọng tâm và phù hợp với yêu cầu công việc."
+
+# "I don't know" answers, without diacritics, once filler words are removed.
+_UNKNOWN_PHRASES = {
+    'khong biet', 'ko biet', 'k biet', 'kh biet', 'hong biet', 'chua biet', 'khong ro', 'chua ro',
+    'khong co', 'khong y kien', 'khong co y kien', 'chua nghi ra', 'khong tra loi', 'bo qua',
+    'pass', 'idk', 'n/a', 'na', 'none',
+}
+_FILLER_WORDS = {'em', 'toi', 'minh', 'da', 'a', 'thi', 'that su', 'la', 'cung', 'nua', 'luc nay', 'hien tai'}
+
+_lock = threading.Lock()
+_counters = {'checked': 0, 'settled': 0, 'empty': 0, 'unknown': 0, 'too_short': 0, 'copy': 0, 'ideal': 0}
+
+
+def normalize(text: Optional[str]) -> str:
+    """Unicode NFC, lower case, punctuation removed, collapsed whitespace."""
+    text = unicodedata.normalize('NFC', text or '').lower()
+    text = re.sub(r'[^\w\s/]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def strip_accents(text: str) -> str:
+    text = unicodedata.normalize('NFD', text.replace('đ', 'd').replace('Đ', 'D'))
+    return ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+
+
+def _is_unknown(normalized: str) -> bool:
+    words = strip_accents(normalized)
+    for filler in sorted(_FILLER_WORDS, key=len, reverse=True):
+        words = re.sub(rf'\b{re.escape(filler)}\b', ' ', words)
+    words = re.sub(r'\s+', ' ', words).strip()
+    return words in _UNKNOWN_PHRASES
+
+
+def _ngrams(normalized: str) -> Counter:
+    padded = f' {normalized} '
+    low, high = NGRAM_RANGE
+    return Counter(
+        padded[i:i + n] for n in range(low, high + 1) for i in range(len(padded) - n + 1)
+    )
+
+
+class NgramSimilarity:
+    """Cosine similarity of TF-IDF weighted character n-gram vectors."""
+
+    def __init__(self, documents):
+        counts = [_ngrams(normalize(doc)) for doc in documents]
+        document_frequency = Counter(gram for grams in counts for gram in grams)
+        total = len(counts)
+        # Smoothed IDF as in scikit-learn; n-grams never seen get the
+        # highest weight.
+        self.idf = {gram: math.log((1 + total) / (1 + df)) + 1 for gram, df in document_frequency.items()}
+        self.unseen_idf = math.log(1 + total) + 1
+
+    def similarity(self, a: str, b: str) -> float:
+        grams_a, grams_b = _ngrams(normalize(a)), _ngrams(normalize(b))
+        if not grams_a or not grams_b:
+            return 0.0
+        vocabulary = list(grams_a.keys() | grams_b.keys())
+        idf = np.array([self.idf.get(gram, self.unseen_idf) for gram in vocabulary])
+        vector_a = np.array([grams_a.get(gram, 0) for gram in vocabulary]) * idf
+        vector_b = np.array([grams_b.get(gram, 0) for gram in vocabulary]) * idf
+        norm = np.linalg.norm(vector_a) * np.linalg.norm(vector_b)
+        return float(vector_a @ vector_b / norm) if norm else 0.0
+
+
+_similarity: Optional[NgramSimilarity] = None
+
+
+def _get_similarity() -> NgramSimilarity:
+    global _similarity
+    if _similarity is None:
+        import answer_keys
+        documents = [
+            entry[field] for entry in answer_keys.ideal_answers().values() for field in ('question', 'ideal_answer')
+        ]
+        _similarity = NgramSimilarity(documents)
+    return _similarity
+
+
+def reset():
+    """Drop the IDF weights so they are rebuilt from the current ideal answers."""
+    global _similarity
+    _similarity = None
+
+
+def _settle(rule: str, score: float, feedback: str) -> Tuple[float, str]:
+    with _lock:
+        _counters['settled'] += 1
+        _counters[rule] += 1
+    return score, feedback
+
+
+def prescore(question: str, answer: Optional[str], ideal_answer: str = '') -> Optional[Tuple[float, str]]:
+    """
+    Return (score, feedback) for an answer that needs no model, else None.
+
+    Rules, in order: blank, "don't know", fewer than PRESCORING_MIN_WORDS
+    words, a copy of the question, a near-copy of the ideal answer.
+    """
+    if not PRESCORING_ENABLED:
+        return None
+    with _lock:
+        _counters['checked'] += 1
+    normalized = normalize(answer)
+    if not normalized:
+        return _settle('empty', 0.0, FEEDBACK_EMPTY)
+    if _is_unknown(normalized):
+        return _settle('unknown', 0.0, FEEDBACK_UNKNOWN)
+    if len(normalized.split()) < PRESCORING_MIN_WORDS:
+        return _settle('too_short', 0.0, FEEDBACK_TOO_SHORT)
+    similarity = _get_similarity()
+    if question and similarity.similarity(answer, question) >= PRESCORING_COPY_SIMILARITY:
+        return _settle('copy', 0.0, FEEDBACK_COPY)
+    if ideal_answer and similarity.similarity(answer, ideal_answer) >= PRESCORING_IDEAL_SIMILARITY:
+        return _settle('ideal', MAX_SCORE, FEEDBACK_IDEAL)
+    return None
+
+
+def stats() -> Dict:
+    """Return how many text answers were settled locally, by rule, in this process."""
+    with _lock:
+        counters = dict(_counters)
+    counters['llm_calls_avoided_share'] = (
+        round(counters['settled'] / counters['checked'], 4) if counters['checked'] else 0.0
+    )
+    counters['enabled'] = PRESCORING_ENABLED
+    return counters
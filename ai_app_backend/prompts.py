@@ -0,0 +1,123 @@
+"""
+Registry of pre-rendered grading prompts, one per question.
+
+Every text answer to a question is graded with the same instructions, the
+same output format description, the same question and the same ideal
+answer; only the candidate's answer differs.  The registry renders that
+static part once per question (when the process starts, from the current
+ideal answers in ``answer_keys``) and a prompt is then the prefix followed by the answer:
+
+  - no template rendering and no format instructions rebuilt per call;
+  - every request for a question starts with byte-identical text, with the
+    candidate's answer last, so the provider's prompt caching can reuse the
+    prefix.
+
+The output parser of the structured grader is shared by all entries.
+"""
+
+import threading
+from typing import Dict, Mapping, Optional, Tuple
+
+from langchain.output_parsers import ResponseSchema, StructuredOutputParser
+from langchain_core.messages import HumanMessage, SystemMessage
+
+
+# Structured grading output: {"score": ..., "feedback": ...}
+schema = [
+    ResponseSchema(name="score", description="Score between 0 and 2"),
+    ResponseSchema(name="feedback", description="Short feedback on the answer"),
+]
+parser = StructuredOutputParser.from_response_schemas(schema)
+
+# Per-answer grading prompt: the static instructions come first, the
+# candidate's answer last.
+PER_ANSWER_INSTRUCTIONS = (
+    "Bạn là một trợ lý nhân sự chuyên đánh giá câu trả lời phỏng vấn cho vị trí chăm sóc khách hàng "
+    "tại cửa hàng trang sức bạc.\n\n"
+    "Hãy chấm điểm câu trả lời của ứng viên từ 0 đến 2, dựa trên mức độ phù hợp, đầy đủ và chuyên nghiệp.\n"
+    "Sau đó, đưa ra **nhận xét ngắn gọn bằng tiếng Việt** giúp ứng viên hiểu mình đã làm tốt gì "
+    "và cần cải thiện gì.\n\n"
+    "Phản hồi của bạn phải đúng định dạng JSON sau:\n"
+    f"{parser.get_format_instructions()}\n\n"
+)
+PER_ANSWER_QUESTION = "Câu hỏi: {question}\n\nCâu trả lời mẫu (tốt nhất): {ideal_answer}\n\n"
+ANSWER_LABEL = "Câu trả lời của ứng viên: "
+
+# Fallback grader for answers without an ideal answer (plain JSON reply).
+SHORT_ANSWER_SYSTEM_MESSAGE = SystemMessage(content=(
+    "Bạn là trợ lý nhân sự đánh giá câu trả lời phỏng vấn. "
+    "Chấm điểm câu trả lời của ứng viên từ 0 đến 2 dựa trên mức độ đầy đủ, phù hợp "
+    "và thái độ chuyên nghiệp cho vị trí chăm sóc khách hàng và bán hàng tại cửa hàng trang sức vàng bạc. "
+    "Hãy trả về kết quả ở dạng JSON với hai trường 'score' (một số nguyên 0–2) và 'feedback' (hai câu nhận xét ngắn)."
+))
+
+
+class QuestionPrompt:
+    """Pre-rendered per-answer grading prompt for one question."""
+
+    __slots__ = ('question_id', 'question', 'ideal_answer', 'prefix', 'parser')
+
+    def __init__(self, question_id: Optional[int], question: str, ideal_answer: str):
+        self.question_id = question_id
+        self.question = question
+        self.ideal_answer = ideal_answer
+        self.prefix = (
+            PER_ANSWER_INSTRUCTIONS
+            + PER_ANSWER_QUESTION.format(question=question, ideal_answer=ideal_answer)
+            + ANSWER_LABEL
+        )
+        self.parser = parser
+
+    def render(self, candidate_answer: str) -> str:
+        return self.prefix + candidate_answer
+
+    def messages(self, candidate_answer: str) -> list:
+        return [HumanMessage(content=self.render(candidate_answer))]
+
+
+def short_answer_messages(question: str, answer: str) -> list:
+    """Messages for the fallback grader: the shared system message, then question and answer."""
+    return [
+        SHORT_ANSWER_SYSTEM_MESSAGE,
+        HumanMessage(content=f"Câu hỏi: {question}\nCâu trả lời của ứng viên: {answer}"),
+    ]
+
+
+_lock = threading.Lock()
+_by_id: Dict[int, QuestionPrompt] = {}
+_by_text: Dict[Tuple[str, str], QuestionPrompt] = {}
+_loaded = False
+
+
+def load(ideal_answers: Optional[Mapping[int, dict]] = None):
+    """(Re)build the registry from ``ideal_answers`` (default: the current ones in ``answer_keys``)."""
+    global _by_id, _by_text, _loaded
+    if ideal_answers is None:
+        import answer_keys
+        ideal_answers = answer_keys.ideal_answers()
+    by_id = {
+        question_id: QuestionPrompt(question_id, entry['question'], entry['ideal_answer'])
+        for question_id, entry in ideal_answers.items()
+    }
+    with _lock:
+        _by_id = by_id
+        _by_text = {(entry.question, entry.ideal_answer): entry for entry in by_id.values()}
+        _loaded = True
+
+
+def _ensure_loaded():
+    if not _loaded:
+        load()
+
+
+def get(question_id) -> Optional[QuestionPrompt]:
+    """Return the prompt of question ``question_id``, or None if it has no ideal answer."""
+    _ensure_loaded()
+    return _by_id.get(question_id)
+
+
+def for_question(question: str, ideal_answer: str) -> QuestionPrompt:
+    """Return the registered prompt for this question and ideal answer, or render one."""
+    _ensure_loaded()
+    entry = _by_text.get((question, ideal_answer))
+    return entry if entry is not None else QuestionPrompt(None, question, ideal_answer)
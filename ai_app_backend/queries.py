@@ -0,0 +1,152 @@
+"""
+Query builders for the employer read endpoints.
+
+The functions here return SQLAlchemy ``Select`` statements so the same
+filtering, sorting and keyset pagination logic can be executed by any
+session.  Pagination is keyset based: a cursor encodes the sort key and id
+of the last row of a page, and the next page starts strictly after it, so
+deep pages cost the same as the first one.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import Select
+
+import models
+
+
+# Allowed values of the ``sort`` query parameter.  A leading '-' means
+# descending order.
+SORT_FIELDS = ('created_at', '-created_at', 'total_score', '-total_score')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(sort: str, key, candidate_id: int) -> str:
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    payload = json.dumps([sort, key, candidate_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[object, int]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(payload, list) or len(payload) != 3:
+            raise ValueError(payload)
+        cursor_sort, key, candidate_id = payload
+        if cursor_sort != sort:
+            raise InvalidCursor("Cursor was issued for a different sort order")
+        if sort.lstrip('-') == 'created_at':
+            if key is not None:
+                key = datetime.fromisoformat(key)
+        elif key is not None and (isinstance(key, bool) or not isinstance(key, (int, float))):
+            raise ValueError(key)
+        if isinstance(candidate_id, bool) or not isinstance(candidate_id, int):
+            raise ValueError(candidate_id)
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    return key, candidate_id
+
+
+def candidate_filters(
+    evaluation_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> list:
+    """Return WHERE clauses for the candidate list filters."""
+    cand = models.Candidate
+    clauses = []
+    if evaluation_status:
+        clauses.append(cand.evaluation_status == evaluation_status)
+    if created_from:
+        clauses.append(cand.created_at >= created_from)
+    if created_to:
+        clauses.append(cand.created_at < created_to)
+    return clauses
+
+
+def _after(key, last_key, last_id: int, descending: bool):
+    """
+    Keyset condition for the rows after (last_key, last_id) in ``key`` order,
+    with NULL keys lowest: first when ascending, last when descending.
+    """
+    cand = models.Candidate
+    if descending:
+        if last_key is None:
+            return and_(key.is_(None), cand.id < last_id)
+        return or_(key < last_key, and_(key == last_key, cand.id < last_id), key.is_(None))
+    if last_key is None:
+        return or_(and_(key.is_(None), cand.id > last_id), key.is_not(None))
+    return or_(key > last_key, and_(key == last_key, cand.id > last_id))
+
+
+def candidate_page(
+    sort: str = 'created_at',
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    evaluation_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    with_answers: bool = False,
+) -> Select:
+    """
+    Build the query for one page of candidates.
+
+    Rows are ``(Candidate, sort_key)`` tuples so the caller can build the
+    cursor of the next page from the last row.  ``total_score`` sorts on the
+    stored ``overall_score`` through its (overall_score, id) index;
+    candidates that are not completed have none and come first in
+    ascending order and last in descending order.  ``limit`` of None returns
+    every matching candidate.  With ``with_answers`` the answers of the
+    whole page are loaded in one extra SELECT instead of one per candidate.
+    """
+    cand = models.Candidate
+    descending = sort.startswith('-')
+    key = cand.overall_score if sort.lstrip('-') == 'total_score' else cand.created_at
+    stmt = select(cand, key).where(*candidate_filters(evaluation_status, created_from, created_to))
+
+    if cursor:
+        last_key, last_id = decode_cursor(cursor, sort)
+        stmt = stmt.where(_after(key, last_key, last_id, descending))
+
+    if descending:
+        stmt = stmt.order_by(key.desc().nulls_last(), cand.id.desc())
+    else:
+        stmt = stmt.order_by(key.asc().nulls_first(), cand.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    if with_answers:
+        stmt = stmt.options(selectinload(cand.answers))
+    return stmt
+
+
+def leaderboard_page(limit: int, cursor: Optional[str] = None) -> Select:
+    """
+    Build the query for one leaderboard page: completed candidates, highest
+    ``overall_score`` first, ties broken by newest id.  Served by the
+    (evaluation_status, overall_score, id) index.
+    """
+    cand = models.Candidate
+    stmt = select(cand).where(cand.evaluation_status == 'completed', cand.overall_score.is_not(None))
+    if cursor:
+        last_score, last_id = decode_cursor(cursor, 'leaderboard')
+        stmt = stmt.where(
+            or_(cand.overall_score < last_score, and_(cand.overall_score == last_score, cand.id < last_id))
+        )
+    return stmt.order_by(cand.overall_score.desc(), cand.id.desc()).limit(limit)
+
+
+def candidate_detail(candidate_id: int) -> Select:
+    """Build the query for one candidate with their answers eagerly loaded."""
+    cand = models.Candidate
+    return select(cand).where(cand.id == candidate_id).options(selectinload(cand.answers))
@@ -0,0 +1,396 @@
+"""
+Client-side rate limiting for OpenAI calls.
+
+Every model call made by ``evaluation`` goes through the process-wide
+:data:`limiter`, shared by all evaluation threads and their event loops:
+
+  - two token buckets budget requests per minute and tokens per minute.  A
+    call reserves one request and its estimated tokens (prompt length plus
+    ``LLM_ESTIMATED_COMPLETION_TOKENS``) and waits until the budget allows
+    it; the estimate is corrected with the usage reported by the model;
+  - an AIMD concurrency limit bounds the calls in flight.  It grows by one
+    call per window of successful calls and is halved when OpenAI answers
+    429, so throughput settles just below the account's real limits;
+  - throttled and transient failures (429, 5xx, connection errors) are
+    retried with exponential backoff and full jitter.  A ``Retry-After``
+    from the server is honoured and pauses every caller, not only the one
+    that was throttled.  429s for an exhausted quota are not retried.
+
+The limits apply per process: with several API processes or workers,
+divide the account's limits between them.
+
+Environment variables:
+  - LLM_RATE_LIMIT_ENABLED: set to "false" to call the model directly.
+  - LLM_RATE_LIMIT_RPM / LLM_RATE_LIMIT_TPM: requests and tokens per minute
+    (0 disables that budget).
+  - LLM_ESTIMATED_COMPLETION_TOKENS: tokens reserved for each reply.
+  - LLM_CONCURRENCY_INITIAL / LLM_CONCURRENCY_MIN / LLM_CONCURRENCY_MAX:
+    bounds of the adaptive concurrency limit.
+  - LLM_RETRY_MAX_ATTEMPTS: attempts per call, including the first.
+  - LLM_BACKOFF_BASE_SECONDS / LLM_BACKOFF_MAX_SECONDS: backoff range.
+"""
+
+import asyncio
+import collections
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import openai
+
+LLM_RATE_LIMIT_ENABLED = os.getenv('LLM_RATE_LIMIT_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+LLM_RATE_LIMIT_RPM = int(os.getenv('LLM_RATE_LIMIT_RPM', '500'))
+LLM_RATE_LIMIT_TPM = int(os.getenv('LLM_RATE_LIMIT_TPM', '30000'))
+LLM_ESTIMATED_COMPLETION_TOKENS = int(os.getenv('LLM_ESTIMATED_COMPLETION_TOKENS', '300'))
+LLM_CONCURRENCY_MAX = int(os.getenv('LLM_CONCURRENCY_MAX', '32'))
+LLM_CONCURRENCY_MIN = int(os.getenv('LLM_CONCURRENCY_MIN', '1'))
+LLM_CONCURRENCY_INITIAL = int(os.getenv('LLM_CONCURRENCY_INITIAL', '8'))
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv('LLM_RETRY_MAX_ATTEMPTS', '6'))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', '1'))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '60'))
+
+# Errors worth retrying: throttling, server errors and network failures
+# (APITimeoutError is an APIConnectionError).
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+def is_throttled(error: BaseException) -> bool:
+    """True if ``error`` is a 429 that waiting can fix (not an exhausted quota)."""
+    return isinstance(error, openai.RateLimitError) and getattr(error, 'code', None) != 'insufficient_quota'
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, openai.RateLimitError):
+        return is_throttled(error)
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to wait according to the response of ``error``, if it says."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(moment.timestamp() - time.time(), 0.0)
+
+
+def _text_of(model_input) -> str:
+    if hasattr(model_input, 'to_string'):
+        return model_input.to_string()
+    if isinstance(model_input, (list, tuple)):
+        return "\n".join(str(getattr(m, 'content', m)) for m in model_input)
+    return str(model_input)
+
+
+def estimate_tokens(model_input) -> int:
+    """Tokens a call is expected to use: the prompt plus a reserved reply."""
+    # About three characters per token for Vietnamese text.
+    return len(_text_of(model_input)) // 3 + LLM_ESTIMATED_COMPLETION_TOKENS
+
+
+def _used_tokens(response) -> Optional[int]:
+    usage = getattr(response, 'usage_metadata', None)
+    if usage and usage.get('total_tokens'):
+        return int(usage['total_tokens'])
+    return None
+
+
+class TokenBucket:
+    """
+    Thread-safe budget of ``per_minute`` units, refilled continuously.
+
+    Callers reserve what they need up front and are told how long to wait;
+    the level may go negative, which makes later callers wait in turn.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` and return the seconds to wait before using it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # A single call larger than the whole budget still goes through
+            # once the bucket is full.
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, amount: float):
+        """Correct an earlier reservation by ``amount`` (negative gives back)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level - amount)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.level
+
+
+class AdaptiveConcurrency:
+    """
+    Limit on calls in flight, adjusted by additive increase / multiplicative
+    decrease.  Slots can be awaited from any thread's event loop or waited
+    for synchronously.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, decrease_factor: float = 0.5):
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < max(int(self.limit), self.minimum)
+
+    def _wake_waiters(self):
+        # Called with the lock held: hand free slots to waiters in order.
+        while self._waiters and self._has_room():
+            wake = self._waiters.popleft()
+            self.in_flight += 1
+            wake()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self._has_room():
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+
+            def wake():
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+            self._waiters.append(wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(wake)
+                    handed = False
+                except ValueError:
+                    handed = True
+            if handed:
+                self.release()
+            raise
+
+    def acquire_sync(self):
+        event = threading.Event()
+        with self._lock:
+            if not self._waiters and self._has_room():
+                self.in_flight += 1
+                return
+            self._waiters.append(event.set)
+        event.wait()
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    def on_success(self):
+        with self._lock:
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self.increases += 1
+                self._wake_waiters()
+
+    def on_throttle(self, started_at: float):
+        """Cut the limit, once per burst: calls started before the last cut don't cut again."""
+        with self._lock:
+            if started_at < self._last_decrease:
+                return
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self._last_decrease = time.monotonic()
+            self.decreases += 1
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+class RateLimiter:
+    """Request/token budgets, adaptive concurrency and retries for model calls."""
+
+    def __init__(
+        self,
+        rpm: int = LLM_RATE_LIMIT_RPM,
+        tpm: int = LLM_RATE_LIMIT_TPM,
+        initial_concurrency: int = LLM_CONCURRENCY_INITIAL,
+        min_concurrency: int = LLM_CONCURRENCY_MIN,
+        max_concurrency: int = LLM_CONCURRENCY_MAX,
+        max_attempts: int = LLM_RETRY_MAX_ATTEMPTS,
+        backoff_base: float = LLM_BACKOFF_BASE_SECONDS,
+        backoff_max: float = LLM_BACKOFF_MAX_SECONDS,
+        enabled: bool = LLM_RATE_LIMIT_ENABLED,
+    ):
+        self.enabled = enabled
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, min_concurrency, max_concurrency)
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._counters = {'calls': 0, 'throttled': 0, 'retries': 0, 'gave_up': 0, 'wait_seconds': 0.0}
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _reserve(self, tokens: int) -> float:
+        """Reserve one request and ``tokens``; return the seconds to wait."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self._lock:
+            wait = max(wait, self._paused_until - time.monotonic())
+            if wait > 0:
+                self._counters['wait_seconds'] += wait
+        return max(wait, 0.0)
+
+    def _succeeded(self, estimate: int, response):
+        used = _used_tokens(response)
+        if used is not None and self.tokens is not None:
+            self.tokens.adjust(used - estimate)
+        self.concurrency.on_success()
+
+    def _failed(self, error: Exception, attempt: int, started_at: float) -> Optional[float]:
+        """Return the delay before retrying ``error``, or None to give up."""
+        if not is_retryable(error):
+            return None
+        if is_throttled(error):
+            self._count('throttled')
+            self.concurrency.on_throttle(started_at)
+        if attempt >= self.max_attempts:
+            self._count('gave_up')
+            return None
+        self._count('retries')
+        # Full jitter: spreads out callers that were throttled together.
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.backoff_max))
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    async def ainvoke(self, model, model_input, **kwargs):
+        """``await model.ainvoke(model_input)`` within the limits, with retries."""
+        if not self.enabled:
+            return await model.ainvoke(model_input, **kwargs)
+        estimate = estimate_tokens(model_input)
+        for attempt in range(1, self.max_attempts + 1):
+            wait = self._reserve(estimate)
+            if wait:
+                await asyncio.sleep(wait)
+            await self.concurrency.acquire()
+            started_at = time.monotonic()
+            self._count('calls')
+            try:
+                response = await model.ainvoke(model_input, **kwargs)
+            except Exception as e:
+                delay = self._failed(e, attempt, started_at)
+                if delay is None:
+                    raise
+            else:
+                self._succeeded(estimate, response)
+                return response
+            finally:
+                self.concurrency.release()
+            await asyncio.sleep(delay)
+
+    def invoke(self, model, model_input, **kwargs):
+        """Blocking variant of :meth:`ainvoke`."""
+        if not self.enabled:
+            return model.invoke(model_input, **kwargs)
+        estimate = estimate_tokens(model_input)
+        for attempt in range(1, self.max_attempts + 1):
+            wait = self._reserve(estimate)
+            if wait:
+                time.sleep(wait)
+            self.concurrency.acquire_sync()
+            started_at = time.monotonic()
+            self._count('calls')
+            try:
+                response = model.invoke(model_input, **kwargs)
+            except Exception as e:
+                delay = self._failed(e, attempt, started_at)
+                if delay is None:
+                    raise
+            else:
+                self._succeeded(estimate, response)
+                return response
+            finally:
+                self.concurrency.release()
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            paused_for = max(self._paused_until - time.monotonic(), 0.0)
+        counters['wait_seconds'] = round(counters['wait_seconds'], 3)
+        counters.update({
+            'enabled': self.enabled,
+            'requests_available': round(self.requests.available(), 1) if self.requests else None,
+            'tokens_available': round(self.tokens.available(), 1) if self.tokens else None,
+            'concurrency_limit': round(self.concurrency.limit, 2),
+            'in_flight': self.concurrency.in_flight,
+            'waiting': self.concurrency.waiting(),
+            'concurrency_increases': self.concurrency.increases,
+            'concurrency_decreases': self.concurrency.decreases,
+            'paused_for_seconds': round(paused_for, 3),
+        })
+        return counters
+
+
+limiter = RateLimiter()
+
+
+async def ainvoke(model, model_input, **kwargs):
+    return await limiter.ainvoke(model, model_input, **kwargs)
+
+
+def invoke(model, model_input, **kwargs):
+    return limiter.invoke(model, model_input, **kwargs)
+
+
+def stats() -> dict:
+    return limiter.stats()
@@ -38,21 +38,53 @@ class AnswerOut(BaseModel):
     evaluation_feedback: Optional[str] = None
     ideal_answer: Optional[str] = None
     evaluation_status: Optional[str] = None
+    evaluation_stage: Optional[str] = None
+    evaluation_latency_ms: Optional[float] = None
+    evaluation_prompt_tokens: Optional[int] = None
+    evaluation_completion_tokens: Optional[int] = None
+    answer_key_version: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
-class CandidateOut(BaseModel):
-    """Schema for returning a candidate with their answers."""
+class CandidateSummaryOut(BaseModel):
+    """Schema for returning a candidate without their answers."""
 
     id: int
     name: str
     phone: str
     created_at: datetime
     evaluation_status: str
+    answers_evaluated: Optional[int] = None
+    answers_total: Optional[int] = None
+    mc_correct_count: Optional[int] = None
+    text_score_sum: Optional[float] = None
+    overall_score: Optional[float] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class CandidateOut(CandidateSummaryOut):
+    """Schema for returning a candidate with their answers."""
+
     answers: List[AnswerOut]
 
+
+class LeaderboardEntry(BaseModel):
+    """Schema for a candidate ranked by aggregate score."""
+
+    id: int
+    name: str
+    phone: str
+    evaluation_status: str
+    mc_correct_count: Optional[int] = None
+    text_score_sum: Optional[float] = None
+    overall_score: Optional[float] = None
+    completed_at: Optional[datetime] = None
+
     class Config:
         from_attributes = True
 
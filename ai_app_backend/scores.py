@@ -0,0 +1,123 @@
+"""
+Per-candidate aggregate scores.
+
+The employer dashboard ranks candidates by total score.  Instead of summing
+every answer on each request, the aggregates are stored on the candidate
+row when background evaluation completes; candidates that are pending,
+processing or failed have none, so they are never ranked on a partial
+score:
+
+  - mc_correct_count: number of multiple choice answers scored as correct;
+  - text_score_sum: sum of the text answer scores;
+  - overall_score: sum of all answer scores (what the dashboard shows);
+  - completed_at: when evaluation finished.
+"""
+
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+import models
+
+
+def _aggregate_columns(candidate_id):
+    """Correlated subqueries computing the aggregates of ``candidate_id``."""
+    answer = models.Answer
+
+    def aggregate(expression):
+        return select(expression).where(answer.candidate_id == candidate_id).scalar_subquery()
+
+    return {
+        'mc_correct_count': aggregate(
+            func.coalesce(func.sum(case(((answer.type == 'mc') & (answer.evaluation_score >= 1), 1), else_=0)), 0)
+        ),
+        'text_score_sum': aggregate(
+            func.coalesce(func.sum(case((answer.type == 'text', answer.evaluation_score), else_=0.0)), 0.0)
+        ),
+        'overall_score': aggregate(func.coalesce(func.sum(answer.evaluation_score), 0.0)),
+    }
+
+
+def update_candidate_scores(db: Session, candidate_id: int, completed_at: Optional[datetime] = None):
+    """
+    Recompute and store the aggregates of one candidate.
+
+    Pending changes in ``db`` are flushed first so they are included.  The
+    caller commits.
+    """
+    db.flush()
+    values = _aggregate_columns(candidate_id)
+    if completed_at is not None:
+        values['completed_at'] = completed_at
+    db.execute(
+        update(models.Candidate)
+        .where(models.Candidate.id == candidate_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def clear_candidate_scores(db: Session, candidate_id: int):
+    """Remove the aggregates of a candidate that is not completed.  The caller commits."""
+    db.execute(
+        update(models.Candidate)
+        .where(models.Candidate.id == candidate_id)
+        .values(mc_correct_count=None, text_score_sum=None, overall_score=None, completed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def update_scores(db: Session, candidate_ids: Iterable[int]) -> int:
+    """
+    Recompute the aggregates of several candidates in one UPDATE, e.g. after
+    their answers were re-scored.  Only completed candidates are updated;
+    the others keep having none until their evaluation finishes.
+    ``completed_at`` is left alone.  The caller commits; returns the number
+    of candidates updated.
+    """
+    candidate_ids = list(candidate_ids)
+    if not candidate_ids:
+        return 0
+    cand = models.Candidate
+    return db.execute(
+        update(cand)
+        .where(cand.id.in_(candidate_ids), cand.evaluation_status == 'completed')
+        .values(**_aggregate_columns(cand.id))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def update_scores_where(db: Session, candidate_ids) -> int:
+    """
+    Like :func:`update_scores`, for the candidates selected by a
+    ``SELECT candidate_id`` statement, so that the ids never leave the
+    database.  Only completed candidates are updated.  The caller commits.
+    """
+    cand = models.Candidate
+    return db.execute(
+        update(cand)
+        .where(cand.id.in_(candidate_ids), cand.evaluation_status == 'completed')
+        .values(**_aggregate_columns(cand.id))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def backfill(db: Session, only_missing: bool = True) -> int:
+    """
+    Compute aggregates for existing completed candidates in one UPDATE.
+
+    Candidates evaluated before aggregates were stored have no completion
+    time on record, so ``completed_at`` falls back to ``created_at``.
+    Returns the number of candidates updated.
+    """
+    cand = models.Candidate
+    stmt = update(cand).where(cand.evaluation_status == 'completed')
+    if only_missing:
+        stmt = stmt.where(cand.overall_score.is_(None))
+    values = _aggregate_columns(cand.id)
+    values['completed_at'] = func.coalesce(cand.completed_at, cand.created_at)
+    updated = db.execute(stmt.values(**values).execution_options(synchronize_session=False)).rowcount
+    db.commit()
+    return updated
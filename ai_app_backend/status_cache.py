@@ -0,0 +1,238 @@
+"""
+Cache of candidate evaluation status for the status endpoints.
+
+A candidate's status changes three or four times, yet the submission page
+asks for it every couple of seconds.  Statuses are kept in a bounded
+in-process TTL/LRU cache and, optionally, in a shared backend (Redis) so
+that several API processes and workers see each other's transitions.
+
+Every status transition, and every step of a candidate's "N of M answers
+evaluated" progress, writes through to the cache (see
+``background_tasks.announce_status``), so the cache is exact for work
+done in this process.  Transitions made elsewhere without a shared backend
+become visible once the entry expires: ``STATUS_CACHE_TTL_SECONDS`` for
+pending/processing, ``STATUS_CACHE_FINAL_TTL_SECONDS`` for completed and
+failed, which only change on re-evaluation.
+
+Environment variables:
+  - STATUS_CACHE_MAX_ENTRIES: statuses kept per process (default 10000).
+  - STATUS_CACHE_TTL_SECONDS / STATUS_CACHE_FINAL_TTL_SECONDS: lifetimes.
+  - STATUS_CACHE_REDIS_URL: optional Redis URL for the shared backend
+    (requires the ``redis`` package).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+STATUS_CACHE_MAX_ENTRIES = int(os.getenv('STATUS_CACHE_MAX_ENTRIES', '10000'))
+STATUS_CACHE_TTL_SECONDS = float(os.getenv('STATUS_CACHE_TTL_SECONDS', '5'))
+STATUS_CACHE_FINAL_TTL_SECONDS = float(os.getenv('STATUS_CACHE_FINAL_TTL_SECONDS', '3600'))
+STATUS_CACHE_REDIS_URL = os.getenv('STATUS_CACHE_REDIS_URL')
+
+FINAL_STATUSES = ('completed', 'failed')
+
+
+class Status(NamedTuple):
+    """A candidate's status and, when known, how many of its answers are evaluated."""
+
+    status: str
+    completed: Optional[int] = None
+    total: Optional[int] = None
+
+    def progress(self) -> dict:
+        """The ``completed``/``total`` fields of status responses (empty when unknown)."""
+        if self.total is None:
+            return {}
+        return {'completed': self.completed or 0, 'total': self.total}
+
+
+def encode(status: Status) -> str:
+    """Cached form of ``status``: 'processing' or, with progress, 'processing:3/16'."""
+    if status.total is None:
+        return status.status
+    return f"{status.status}:{status.completed or 0}/{status.total}"
+
+
+def decode(value: str) -> Status:
+    name, _, progress = value.partition(':')
+    if not progress:
+        return Status(name)
+    completed, _, total = progress.partition('/')
+    return Status(name, int(completed), int(total))
+
+
+def ttl_for(value: str) -> float:
+    status = value.partition(':')[0]
+    return STATUS_CACHE_FINAL_TTL_SECONDS if status in FINAL_STATUSES else STATUS_CACHE_TTL_SECONDS
+
+
+class LRUCache:
+    """Thread-safe mapping with a per-entry TTL and a bound on its size."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Shared backend on top of a Redis-like client.
+
+    Any object with ``get(key)`` and ``set(key, value, ex=seconds)`` and
+    ``delete(key)`` works, so a plain stand-in can replace Redis locally.
+    """
+
+    def __init__(self, client, prefix: str = 'candidate-status:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value
+
+    def set(self, key: str, value: str, ttl: float):
+        self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+class StatusCache:
+    """Two-level status cache: in-process LRU in front of an optional shared backend."""
+
+    def __init__(self, local: LRUCache, shared=None):
+        self.local = local
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'writes': 0, 'errors': 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, candidate_id: int) -> Optional[str]:
+        """Return the cached status of ``candidate_id``, or None on a miss."""
+        key = str(candidate_id)
+        status = self.local.get(key)
+        if status is not None:
+            self._count('hits')
+            return status
+        if self.shared is not None:
+            try:
+                status = self.shared.get(key)
+            except Exception as e:
+                # The database is still there; a broken cache must not fail requests.
+                self._count('errors')
+                print(f"Status cache backend error: {e}")
+                status = None
+            if status is not None:
+                self.local.set(key, status, ttl_for(status))
+                self._count('shared_hits')
+                return status
+        self._count('misses')
+        return None
+
+    def set(self, candidate_id: int, status: str):
+        """Store ``status`` (write-through to the shared backend)."""
+        key = str(candidate_id)
+        ttl = ttl_for(status)
+        self.local.set(key, status, ttl)
+        self._count('writes')
+        if self.shared is not None:
+            try:
+                self.shared.set(key, status, ttl)
+            except Exception as e:
+                self._count('errors')
+                print(f"Status cache backend error: {e}")
+
+    def invalidate(self, candidate_id: int):
+        key = str(candidate_id)
+        self.local.delete(key)
+        if self.shared is not None:
+            try:
+                self.shared.delete(key)
+            except Exception as e:
+                self._count('errors')
+                print(f"Status cache backend error: {e}")
+
+    def clear_local(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['hits'] + counters['shared_hits'] + counters['misses']
+        counters['hit_rate'] = round((counters['hits'] + counters['shared_hits']) / lookups, 4) if lookups else 0.0
+        counters['entries'] = len(self.local)
+        counters['evictions'] = self.local.evictions
+        counters['shared_backend'] = self.shared is not None
+        return counters
+
+
+def _shared_backend_from_env():
+    if not STATUS_CACHE_REDIS_URL:
+        return None
+    try:
+        import redis
+    except ImportError:
+        print("STATUS_CACHE_REDIS_URL is set but the redis package is not installed; "
+              "using the in-process status cache only")
+        return None
+    return RedisBackend(redis.Redis.from_url(STATUS_CACHE_REDIS_URL, socket_timeout=0.5))
+
+
+cache = StatusCache(LRUCache(STATUS_CACHE_MAX_ENTRIES), shared=_shared_backend_from_env())
+
+
+def get(candidate_id: int) -> Optional[Status]:
+    value = cache.get(candidate_id)
+    return decode(value) if value is not None else None
+
+
+def put(candidate_id: int, status: str, completed: Optional[int] = None, total: Optional[int] = None):
+    cache.set(candidate_id, encode(Status(status, completed, total)))
+
+
+def etag(candidate_id: int, status: Status) -> str:
+    """ETag of the status response for ``candidate_id`` in ``status`` (changes with the progress)."""
+    if status.total is None:
+        return f'"{candidate_id}-{status.status}"'
+    return f'"{candidate_id}-{status.status}-{status.completed or 0}"'
@@ -0,0 +1,201 @@
+"""
+In-process publish/subscribe for candidate evaluation status.
+
+``GET /candidates/{id}/events`` subscribes to a candidate's status stream
+instead of polling the status endpoint.  Evaluation threads in this process
+publish transitions (processing, per-answer progress, completed/failed)
+directly; subscribers receive them on their event loop without touching the
+database.
+
+Evaluations running in other processes (``EVALUATION_MODE=worker``) cannot
+publish here, so while anyone is subscribed a single poller reads the
+status of *all* subscribed candidates in one query every
+``STATUS_EVENTS_POLL_INTERVAL`` seconds and publishes what changed
+(status or number of answers evaluated).  The
+number of queries therefore does not grow with the number of subscribers.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+import models, database
+
+
+# Seconds between reads of subscribed candidates' status from the database.
+STATUS_EVENTS_POLL_INTERVAL = float(os.getenv('STATUS_EVENTS_POLL_INTERVAL', '5'))
+
+# Seconds of silence after which a stream sends a keep-alive comment.
+STATUS_EVENTS_KEEPALIVE = float(os.getenv('STATUS_EVENTS_KEEPALIVE', '15'))
+
+# Events buffered per subscriber; the oldest are dropped beyond this.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Largest IN (...) list used by the poller.
+POLL_CHUNK_SIZE = 500
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+STATUS_MESSAGES = {
+    "pending": "Đang chờ đánh giá...",
+    "processing": "Đang đánh giá câu trả lời...",
+    "completed": "Đánh giá hoàn thành!",
+    "failed": "Có lỗi xảy ra trong quá trình đánh giá.",
+}
+
+
+def status_event(candidate_id: int, status: str, **extra) -> dict:
+    """
+    Build the event payload sent to subscribers.  ``completed`` and
+    ``total`` answer counts, when given, are included and shown in the
+    message while the evaluation is processing.
+    """
+    message = STATUS_MESSAGES.get(status, "Trạng thái không xác định")
+    if status == "processing" and extra.get("total"):
+        message = f"Đã đánh giá {extra.get('completed') or 0}/{extra['total']} câu trả lời..."
+    event = {
+        "id": candidate_id,
+        "status": status,
+        "message": message,
+    }
+    event.update(extra)
+    return event
+
+
+class Subscription:
+    """One subscriber's queue of events, owned by its event loop."""
+
+    def __init__(self, candidate_id: int, loop: asyncio.AbstractEventLoop):
+        self.candidate_id = candidate_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def _put(self, event: dict):
+        # Runs on the subscriber's loop.  A slow client loses the oldest
+        # progress events rather than blocking publishers.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Wait for the next event; return None if ``timeout`` passes first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class StatusBroker:
+    """
+    Routes status events to the subscribers of each candidate.
+
+    :meth:`publish` may be called from any thread; :meth:`subscribe` and
+    :meth:`unsubscribe` are called from the event loop serving the stream.
+    """
+
+    def __init__(self, poll_interval: float = STATUS_EVENTS_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        # Last (status, answers completed) sent per subscribed candidate, so
+        # the poller only publishes changes.
+        self._last_status: Dict[int, tuple] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    def subscribe(self, candidate_id: int) -> Subscription:
+        subscription = Subscription(candidate_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(candidate_id, set()).add(subscription)
+        if self.poll_interval > 0 and (self._poller is None or self._poller.done()):
+            self._poller = asyncio.get_running_loop().create_task(self._poll_loop())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.candidate_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.candidate_id]
+                self._last_status.pop(subscription.candidate_id, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def remember(self, candidate_id: int, status: str, completed: Optional[int] = None):
+        """Record ``status`` (and progress) as already known to subscribers of ``candidate_id``."""
+        with self._lock:
+            if candidate_id in self._subscribers:
+                self._last_status[candidate_id] = (status, completed)
+
+    def publish(self, candidate_id: int, status: str, **extra):
+        """Send a status event to every subscriber of ``candidate_id``."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(candidate_id, ()))
+            if not subscribers:
+                return
+            self._last_status[candidate_id] = (status, extra.get('completed'))
+        event = status_event(candidate_id, status, **extra)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                pass
+
+    async def poll_once(self) -> int:
+        """
+        Read the status of every subscribed candidate and publish changes.
+
+        Returns the number of queries issued (one per ``POLL_CHUNK_SIZE``
+        subscribed candidates).
+        """
+        with self._lock:
+            known = dict(self._last_status)
+            candidate_ids: List[int] = list(self._subscribers)
+        queries = 0
+        async with database.AsyncSessionLocal() as db:
+            for start in range(0, len(candidate_ids), POLL_CHUNK_SIZE):
+                chunk = candidate_ids[start:start + POLL_CHUNK_SIZE]
+                rows = (await db.execute(
+                    select(
+                        models.Candidate.id, models.Candidate.evaluation_status,
+                        models.Candidate.answers_evaluated, models.Candidate.answers_total,
+                    )
+                    .where(models.Candidate.id.in_(chunk))
+                )).all()
+                queries += 1
+                for candidate_id, status, completed, total in rows:
+                    with self._lock:
+                        # Skip if an in-process publish happened meanwhile;
+                        # it is newer than what we just read.
+                        stale = self._last_status.get(candidate_id) != known.get(candidate_id)
+                    progress = {'completed': completed or 0, 'total': total} if total is not None else {}
+                    if not stale and (status, progress.get('completed')) != known.get(candidate_id):
+                        self.publish(candidate_id, status, **progress)
+        return queries
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            with self._lock:
+                if not self._subscribers:
+                    return
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"Status poll failed: {e}")
+
+
+# Shared by the API endpoints and the evaluation threads of this process.
+broker = StatusBroker()
+
+
+def publish(candidate_id: int, status: str, **extra):
+    """Publish a status event on the process-wide broker."""
+    broker.publish(candidate_id, status, **extra)
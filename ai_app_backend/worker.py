@@ -0,0 +1,57 @@
+"""
+Standalone evaluation worker.
+
+Run ``python -m worker`` to process queued evaluation jobs outside the API
+process.  Any number of workers can run against the same database; jobs
+are claimed in batches with a lease (see ``job_queue``), so a worker that
+dies simply lets its jobs become claimable again.  Set
+``EVALUATION_MODE=worker`` on the API to leave all evaluation to workers.
+"""
+
+import argparse
+import os
+import signal
+
+import models, database, answer_keys, job_queue, metrics
+import background_tasks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process queued candidate evaluations.")
+    parser.add_argument("--concurrency", type=int, default=background_tasks.EVALUATION_MAX_WORKERS,
+                        help="number of evaluations to run at once")
+    parser.add_argument("--batch-size", type=int, default=background_tasks.JOB_BATCH_SIZE,
+                        help="maximum number of jobs claimed per poll")
+    parser.add_argument("--poll-interval", type=float, default=background_tasks.JOB_POLL_INTERVAL,
+                        help="seconds to wait when the queue is empty")
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv('WORKER_METRICS_PORT', '0')),
+                        help="serve Prometheus metrics on this port (default: off)")
+    args = parser.parse_args(argv)
+
+    database.ensure_schema(models.Base.metadata)
+    answer_keys.load()
+
+    executor = background_tasks.EvaluationExecutor(args.concurrency, 0)
+    metrics.EVALUATIONS_PENDING.set_function(lambda: executor.pending)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    worker_id = job_queue.make_worker_id()
+    dispatcher = background_tasks.JobDispatcher(
+        executor, worker_id, batch_size=args.batch_size, poll_interval=args.poll_interval
+    )
+
+    def handle_signal(signum, frame):
+        print(f"Received signal {signum}, finishing in-flight evaluations...")
+        dispatcher.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    requeued = background_tasks.recover_jobs()
+    print(f"Evaluation worker {worker_id} started ({requeued} orphaned jobs requeued)")
+    dispatcher.run()
+    executor.shutdown(background_tasks.EVALUATION_DRAIN_TIMEOUT)
+
+
+if __name__ == "__main__":
+    main()
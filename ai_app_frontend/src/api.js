@@ -6,18 +6,35 @@
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+/**
+ * Return a new random key for the Idempotency-Key header.
+ */
+export function newIdempotencyKey() {
+  if (window.crypto && window.crypto.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 /**
  * Submit a candidate's application.  Expects an object containing name,
  * phone and an array of answers.  Returns the JSON response from the server.
+ * Retries of the same submission should pass the same idempotencyKey, so the
+ * server answers them with the original submission instead of storing it twice.
  *
  * @param {Object} payload
+ * @param {string} [idempotencyKey]
  */
-export async function submitCandidate(payload) {
+export async function submitCandidate(payload, idempotencyKey) {
+  const headers = {
+    'Content-Type': 'application/json'
+  };
+  if (idempotencyKey) {
+    headers['Idempotency-Key'] = idempotencyKey;
+  }
   const response = await fetch(`${API_BASE_URL}/candidates`, {
     method: 'POST',
-    headers: {
-      'Content-Type': 'application/json'
-    },
+    headers,
     body: JSON.stringify(payload)
   });
   if (!response.ok) {
@@ -46,6 +63,38 @@ export async function getEvaluationStatus(candidateId) {
   return response.json();
 }
 
+/**
+ * Subscribe to evaluation status updates pushed by the server (server-sent
+ * events).  ``onStatus`` receives each status object; ``onError`` is called
+ * if the stream cannot be used, e.g. when the browser lacks EventSource or
+ * the connection drops, so the caller can fall back to polling.  Returns a
+ * function that closes the stream.
+ *
+ * @param {number} candidateId
+ * @param {(status: Object) => void} onStatus
+ * @param {() => void} onError
+ */
+export function subscribeEvaluationStatus(candidateId, onStatus, onError) {
+  if (typeof window === 'undefined' || !window.EventSource) {
+    onError();
+    return () => {};
+  }
+  const source = new EventSource(`${API_BASE_URL}/candidates/${candidateId}/events`);
+  source.onmessage = (event) => {
+    const status = JSON.parse(event.data);
+    onStatus(status);
+    if (status.status === 'completed' || status.status === 'failed') {
+      source.close();
+    }
+  };
+  source.onerror = () => {
+    // EventSource would reconnect on its own; let the caller decide instead.
+    source.close();
+    onError();
+  };
+  return () => source.close();
+}
+
 /**
  * Authenticate an employer using a username and password.  Returns a token
  * which should be stored by the client for subsequent authenticated calls.
@@ -1,6 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { submitCandidate, getEvaluationStatus } from '../api';
+import { submitCandidate, getEvaluationStatus, subscribeEvaluationStatus, newIdempotencyKey } from '../api';
 import { MULTIPLE_CHOICE_QUESTIONS, SHORT_ANSWER_QUESTIONS } from '../questionBank';
 
 /**
@@ -25,7 +25,11 @@ const CandidateForm = () => {
   const [submitted, setSubmitted] = useState(false);
   const [submissionId, setSubmissionId] = useState(null);
   const [evaluationStatus, setEvaluationStatus] = useState('pending');
+  const [evaluationProgress, setEvaluationProgress] = useState(null);
   const [error, setError] = useState(null);
+  // Idempotency key of the last attempted submission, reused while the
+  // candidate retries the same answers after an error.
+  const lastAttempt = useRef({ body: null, key: null });
 
   // Handle change for multiple choice answers
   const handleMcChange = (index, value) => {
@@ -73,8 +77,14 @@ const CandidateForm = () => {
           })),
         ],
       };
-      const response = await submitCandidate(payload);
+      const body = JSON.stringify(payload);
+      if (lastAttempt.current.body !== body) {
+        lastAttempt.current = { body, key: newIdempotencyKey() };
+      }
+      const response = await submitCandidate(payload, lastAttempt.current.key);
+      lastAttempt.current = { body: null, key: null };
       setSubmissionId(response.id);
+      setEvaluationProgress(null);
       setSubmitted(true);
       // Optionally reset form after submission
       setName('');
@@ -89,24 +99,48 @@ const CandidateForm = () => {
     }
   };
 
-  // Check evaluation status periodically
+  // Follow the evaluation status: pushed by the server when possible,
+  // otherwise checked every 2 seconds.
   useEffect(() => {
-    if (!submissionId || evaluationStatus === 'completed' || evaluationStatus === 'failed') {
+    if (!submissionId) {
       return;
     }
 
+    let interval = null;
+    const isFinal = (status) => status === 'completed' || status === 'failed';
+
+    const applyStatus = (statusResponse) => {
+      setEvaluationStatus(statusResponse.status);
+      if (statusResponse.total) {
+        setEvaluationProgress({ completed: statusResponse.completed, total: statusResponse.total });
+      }
+      if (isFinal(statusResponse.status) && interval) {
+        clearInterval(interval);
+      }
+    };
+
     const checkStatus = async () => {
       try {
-        const statusResponse = await getEvaluationStatus(submissionId);
-        setEvaluationStatus(statusResponse.status);
+        applyStatus(await getEvaluationStatus(submissionId));
       } catch (err) {
         console.error('Error checking status:', err);
       }
     };
 
-    const interval = setInterval(checkStatus, 2000); // Check every 2 seconds
-    return () => clearInterval(interval);
-  }, [submissionId, evaluationStatus]);
+    const startPolling = () => {
+      if (!interval) {
+        interval = setInterval(checkStatus, 2000);
+      }
+    };
+
+    const unsubscribe = subscribeEvaluationStatus(submissionId, applyStatus, startPolling);
+    return () => {
+      unsubscribe();
+      if (interval) {
+        clearInterval(interval);
+      }
+    };
+  }, [submissionId]);
 
   if (submitted) {
     return (
@@ -121,7 +155,11 @@ const CandidateForm = () => {
           </p>
           {evaluationStatus !== 'completed' && evaluationStatus !== 'failed' && (
             <div className="evaluation-status">
-              <p>Trạng thái đánh giá: {evaluationStatus === 'pending' ? 'Đang chờ...' : 'Đang xử lý...'}</p>
+              <p>
+                Trạng thái đánh giá: {evaluationStatus === 'pending' ? 'Đang chờ...' : 'Đang xử lý...'}
+                {evaluationStatus === 'processing' && evaluationProgress &&
+                  ` (${evaluationProgress.completed}/${evaluationProgress.total})`}
+              </p>
             </div>
           )}
           <button className="thank-you-button" onClick={() => setSubmitted(false)}>
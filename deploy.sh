@@ -28,13 +28,30 @@ mkdir -p $TEMP_DIR
 # Copy backend files
 echo "📁 Copying backend files..."
 # Copy Python files from ai_app_backend directory
+cp ai_app_backend/answer_keys.py $TEMP_DIR/
 cp ai_app_backend/background_tasks.py $TEMP_DIR/
+cp ai_app_backend/batch_reevaluation.py $TEMP_DIR/
 cp ai_app_backend/database.py $TEMP_DIR/
 cp ai_app_backend/evaluation.py $TEMP_DIR/
+cp ai_app_backend/evaluation_cache.py $TEMP_DIR/
+cp ai_app_backend/exports.py $TEMP_DIR/
 cp ai_app_backend/ideal_answers.py $TEMP_DIR/
+cp ai_app_backend/idempotency.py $TEMP_DIR/
+cp ai_app_backend/job_queue.py $TEMP_DIR/
+cp ai_app_backend/llm_clients.py $TEMP_DIR/
 cp ai_app_backend/main.py $TEMP_DIR/
+cp ai_app_backend/manage.py $TEMP_DIR/
+cp ai_app_backend/metrics.py $TEMP_DIR/
 cp ai_app_backend/models.py $TEMP_DIR/
+cp ai_app_backend/prescoring.py $TEMP_DIR/
+cp ai_app_backend/prompts.py $TEMP_DIR/
+cp ai_app_backend/queries.py $TEMP_DIR/
+cp ai_app_backend/rate_limiter.py $TEMP_DIR/
 cp ai_app_backend/schemas.py $TEMP_DIR/
+cp ai_app_backend/scores.py $TEMP_DIR/
+cp ai_app_backend/status_cache.py $TEMP_DIR/
+cp ai_app_backend/status_events.py $TEMP_DIR/
+cp ai_app_backend/worker.py $TEMP_DIR/
 
 cp ai_app_backend/requirements.txt $TEMP_DIR/
 cp ai_app_backend/README.md $TEMP_DIR/
@@ -50,6 +67,7 @@ OPENAI_API_KEY=your_openai_api_key_here
 EMPLOYER_USERNAME=admin
 EMPLOYER_PASSWORD=password
 EMPLOYER_TOKEN=your_custom_token_here
+METRICS_TOKEN=your_metrics_scraper_token_here
 
 # Database Configuration
 DATABASE_URL=sqlite:///./database.db
@@ -183,6 +201,7 @@ OPENAI_API_KEY=your_openai_api_key_here
 EMPLOYER_USERNAME=admin
 EMPLOYER_PASSWORD=password
 EMPLOYER_TOKEN=your_custom_token_here
+METRICS_TOKEN=your_metrics_scraper_token_here
 
 # Database Configuration
 DATABASE_URL=sqlite:///./database.db